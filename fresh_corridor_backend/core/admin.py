@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     CityZone, WeatherLog, Hospital, TrafficStats, RealTimeTraffic,
-    HealthStats, AgriSupply, CitizenReport
+    HealthStats, AgriSupply, CitizenReport, ZoneResilience, SimulationJob
 )
 
 @admin.register(CityZone)
@@ -22,6 +22,11 @@ class HospitalAdmin(admin.ModelAdmin):
     list_filter = ['zone', 'is_live_data']
     search_fields = ['name']
 
+@admin.register(ZoneResilience)
+class ZoneResilienceAdmin(admin.ModelAdmin):
+    list_display = ['zone', 'overall_resilience_score', 'aqi_score', 'medical_capacity_score', 'updated_at']
+    readonly_fields = ['updated_at']
+
 @admin.register(TrafficStats)
 class TrafficStatsAdmin(admin.ModelAdmin):
     list_display = ['zone', 'timestamp', 'congestion_level', 'is_road_closed']
@@ -54,3 +59,8 @@ class CitizenReportAdmin(admin.ModelAdmin):
     date_hierarchy = 'timestamp'
     search_fields = ['description']
 
+@admin.register(SimulationJob)
+class SimulationJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'progress', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
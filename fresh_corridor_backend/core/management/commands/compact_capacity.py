@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from core.services.capacity_service import CapacityHistoryService
+from core.services.forecast_service import IcuForecastService
+
+class Command(BaseCommand):
+    help = 'Rolls HospitalCapacityLog up into 1-minute, 1-hour and 1-day buckets and prunes expired rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep compacting in the background')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **kwargs):
+        while True:
+            written = CapacityHistoryService.compact()
+            IcuForecastService.update() # feeds any newly completed hours to the ICU forecast models
+            self.stdout.write(self.style.SUCCESS(
+                "Compacted capacity log: " + ", ".join(f"{k}={v}" for k, v in written.items())
+            ))
+            if not kwargs['loop']:
+                break
+            try:
+                time.sleep(kwargs['interval'])
+            except KeyboardInterrupt:
+                break
@@ -0,0 +1,62 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import WeatherLog
+from core.services.aqi_engine import AQIEngine
+from core.services.cache_service import ScenarioCache
+from core.services.simulation_service import SimulationService
+from core.services.tile_service import HeatmapTiles
+
+class Command(BaseCommand):
+    help = 'Recomputes WeatherLog.air_quality_index from pollutant_details with the CPCB breakpoint tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Only logs from the last N days (default: all)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows computed and updated per step')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without writing')
+
+    def handle(self, *args, **kwargs):
+        rows = WeatherLog.objects.order_by('pk')
+        if kwargs['days']:
+            rows = rows.filter(timestamp__gte=timezone.now() - timedelta(days=kwargs['days']))
+
+        scanned = computable = 0
+        changed_zones = set()
+        updated = 0
+        last_pk = 0
+        while True:
+            # Keyset pagination: each batch is one query and one vectorized AQIEngine pass
+            batch = list(rows.filter(pk__gt=last_pk).values_list(
+                'pk', 'zone_id', 'pollutant_details', 'air_quality_index'
+            )[:kwargs['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            scanned += len(batch)
+
+            aqi, dominant, _ = AQIEngine.from_details([r[2] for r in batch])
+            valid = dominant >= 0
+            computable += int(valid.sum())
+            changes = []
+            for (pk, zone_id, _, old), value, ok in zip(batch, aqi, valid):
+                if ok and int(value) != old:
+                    changes.append(WeatherLog(pk=pk, air_quality_index=int(value)))
+                    changed_zones.add(zone_id)
+            if changes and not kwargs['dry_run']:
+                WeatherLog.objects.bulk_update(changes, ['air_quality_index'], batch_size=1000)
+            updated += len(changes)
+
+        if updated and not kwargs['dry_run']:
+            # bulk_update skips core.signals, so do what weather_changed would have done
+            ScenarioCache.bump('epidemiology')
+            ScenarioCache.bump('health_deserts')
+            HeatmapTiles.clear_layer('aqi')
+            for zone_id in changed_zones:
+                SimulationService.refresh_resilience(zone_id)
+                ScenarioCache.bump(f"zone:{zone_id}")
+
+        verb = "Would update" if kwargs['dry_run'] else "Updated"
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {scanned} weather logs, {computable} with enough pollutant data. "
+            f"{verb} {updated} AQI values across {len(changed_zones)} zones."
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from core.models import CityZone
+from core.services.simulation_service import SimulationService
+
+class Command(BaseCommand):
+    help = 'Rebuilds the materialized ZoneResilience scores for every zone (e.g. after bulk imports)'
+
+    def handle(self, *args, **kwargs):
+        count = 0
+        for zone_id in CityZone.objects.values_list('pk', flat=True):
+            SimulationService.refresh_resilience(zone_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Refreshed resilience scores for {count} zones."))
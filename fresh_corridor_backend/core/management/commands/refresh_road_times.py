@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core.services.road_network import RoadNetwork
+
+class Command(BaseCommand):
+    help = 'Reweights the road graph by current congestion and publishes the hospital x zone travel-time matrix'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep rebuilding in the background')
+        parser.add_argument('--interval', type=float, default=RoadNetwork.REWEIGHT_INTERVAL,
+                            help='Seconds between runs with --loop')
+
+    def handle(self, *args, **kwargs):
+        if not RoadNetwork.graph_path():
+            raise CommandError("ROAD_GRAPH_PATH is not set")
+        failures = 0
+        while True:
+            try:
+                RoadNetwork.build()
+                failures = 0
+            except Exception as e:
+                if not kwargs['loop']:
+                    raise CommandError(f"Build failed: {e}")
+                failures += 1
+                self.stderr.write(f"Build failed ({failures} in a row): {e}")
+            if not kwargs['loop']:
+                break
+            # Back off while builds keep failing (e.g. a bad ROAD_GRAPH_PATH) instead of retrying at full rate
+            delay = min(kwargs['interval'] * 2 ** failures, RoadNetwork.MAX_BACKOFF)
+            try:
+                time.sleep(delay)
+            except KeyboardInterrupt:
+                break
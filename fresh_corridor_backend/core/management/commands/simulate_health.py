@@ -2,6 +2,7 @@ import time
 import random
 import json
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from core.models import Hospital, WeatherLog, HealthStats, CityZone
 
 class Command(BaseCommand):
@@ -42,57 +43,60 @@ class Command(BaseCommand):
                     self.stdout.write(self.style.SUCCESS(f"Created {len(hospital_names)} simulated hospitals."))
                     hospitals = Hospital.objects.all()
 
-                for h in hospitals:
-                    # Randomly discharge or admit patient
-                    fluctuation = random.choice([-1, 0, 1, 2])
-                    h.occupied_beds_icu = max(0, min(h.total_beds_icu, h.occupied_beds_icu + fluctuation))
+                # One transaction per tick: signal work (resilience, cache bumps, tiles)
+                # runs once on commit instead of after every save
+                with transaction.atomic():
+                    for h in hospitals:
+                        # Randomly discharge or admit patient
+                        fluctuation = random.choice([-1, 0, 1, 2])
+                        h.occupied_beds_icu = max(0, min(h.total_beds_icu, h.occupied_beds_icu + fluctuation))
                     
-                    gen_flux = random.choice([-2, -1, 0, 1, 2, 3])
-                    h.occupied_beds_general = max(0, min(h.total_beds_general, h.occupied_beds_general + gen_flux))
+                        gen_flux = random.choice([-2, -1, 0, 1, 2, 3])
+                        h.occupied_beds_general = max(0, min(h.total_beds_general, h.occupied_beds_general + gen_flux))
                     
-                    # AUTO-SCALE: If data is legacy (too small), boost it
-                    if h.total_beds_icu < 20: 
-                        h.total_beds_icu = random.randint(30, 80)
-                        h.occupied_beds_icu = int(h.total_beds_icu * 0.7)
-                    if h.total_beds_general < 100:
-                        h.total_beds_general = random.randint(150, 400)
-                        h.occupied_beds_general = int(h.total_beds_general * 0.8)
+                        # AUTO-SCALE: If data is legacy (too small), boost it
+                        if h.total_beds_icu < 20: 
+                            h.total_beds_icu = random.randint(30, 80)
+                            h.occupied_beds_icu = int(h.total_beds_icu * 0.7)
+                        if h.total_beds_general < 100:
+                            h.total_beds_general = random.randint(150, 400)
+                            h.occupied_beds_general = int(h.total_beds_general * 0.8)
 
-                    # Oxygen supply slight fluctuation
-                    h.oxygen_supply_level = max(0, min(100, h.oxygen_supply_level + random.uniform(-2, 2)))
-                    h.save()
+                        # Oxygen supply slight fluctuation
+                        h.oxygen_supply_level = max(0, min(100, h.oxygen_supply_level + random.uniform(-2, 2)))
+                        h.save()
                     
-                # 2. Update Environmental Factors (AQI, Temp causes Health changes)
-                zones = CityZone.objects.all()
-                for zone in zones:
-                    weather = WeatherLog.objects.filter(zone=zone).last()
-                    health = HealthStats.objects.filter(zone=zone).last()
+                    # 2. Update Environmental Factors (AQI, Temp causes Health changes)
+                    zones = CityZone.objects.all()
+                    for zone in zones:
+                        weather = WeatherLog.objects.filter(zone=zone).last()
+                        health = HealthStats.objects.filter(zone=zone).last()
                     
-                    if weather:
-                        # AQI drift
-                        weather.air_quality_index = max(0, weather.air_quality_index + random.randint(-5, 8))
+                        if weather:
+                            # AQI drift
+                            weather.air_quality_index = max(0, weather.air_quality_index + random.randint(-5, 8))
                         
-                        # Simulate Pollutant Details
-                        pm25 = int(weather.air_quality_index * random.uniform(0.7, 0.9))
-                        pm10 = int(weather.air_quality_index * random.uniform(0.8, 1.1))
-                        no2 = random.randint(20, 80)
-                        so2 = random.randint(10, 40)
-                        dummy_pollutants = [
-                            {"indexId": "PM2.5", "avg": pm25, "Hourly_sub_index": pm25},
-                            {"indexId": "PM10", "avg": pm10, "Hourly_sub_index": pm10},
-                            {"indexId": "NO2", "avg": no2, "Hourly_sub_index": no2},
-                            {"indexId": "SO2", "avg": so2, "Hourly_sub_index": so2}
-                        ]
-                        weather.pollutant_details = json.dumps(dummy_pollutants)
-                        weather.save()
+                            # Simulate Pollutant Details
+                            pm25 = int(weather.air_quality_index * random.uniform(0.7, 0.9))
+                            pm10 = int(weather.air_quality_index * random.uniform(0.8, 1.1))
+                            no2 = random.randint(20, 80)
+                            so2 = random.randint(10, 40)
+                            dummy_pollutants = [
+                                {"indexId": "PM2.5", "avg": pm25, "Hourly_sub_index": pm25},
+                                {"indexId": "PM10", "avg": pm10, "Hourly_sub_index": pm10},
+                                {"indexId": "NO2", "avg": no2, "Hourly_sub_index": no2},
+                                {"indexId": "SO2", "avg": so2, "Hourly_sub_index": so2}
+                            ]
+                            weather.pollutant_details = json.dumps(dummy_pollutants)
+                            weather.save()
                     
-                    if health and weather:
-                         # 5% chance of case spike if AQI is bad
-                        if weather.air_quality_index > 200 and random.random() > 0.95:
-                            health.respiratory_cases_active += random.randint(1, 5)
-                        elif random.random() > 0.8: # Random recovery
-                            health.respiratory_cases_active = max(0, health.respiratory_cases_active - 1)
-                        health.save()
+                        if health and weather:
+                             # 5% chance of case spike if AQI is bad
+                            if weather.air_quality_index > 200 and random.random() > 0.95:
+                                health.respiratory_cases_active += random.randint(1, 5)
+                            elif random.random() > 0.8: # Random recovery
+                                health.respiratory_cases_active = max(0, health.respiratory_cases_active - 1)
+                            health.save()
                 
                 self.stdout.write(f"Updated live stats at {time.strftime('%H:%M:%S')}")
                 time.sleep(5) # Update every 5 seconds
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from core.services.job_service import JobService
+
+class Command(BaseCommand):
+    help = 'Runs queued SimulationJobs (what-if, Monte Carlo, batch sweeps, timelines) on a local thread pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Jobs run concurrently')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between queue checks when idle')
+        parser.add_argument('--once', action='store_true', help='Drain the current queue and exit')
+
+    def handle(self, *args, **kwargs):
+        self.stdout.write(self.style.SUCCESS(f"Simulation worker started with {kwargs['workers']} threads... (Press Ctrl+C to stop)"))
+        try:
+            JobService.work(kwargs['workers'], kwargs['poll'], kwargs['once'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Worker stopped."))
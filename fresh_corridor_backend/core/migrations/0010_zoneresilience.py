@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_citizenreport_image_url_citizenreport_latitude_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZoneResilience',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('aqi_score', models.FloatField()),
+                ('medical_capacity_score', models.FloatField()),
+                ('nutrition_access_score', models.FloatField()),
+                ('overall_resilience_score', models.FloatField(db_index=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('zone', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resilience', to='core.cityzone')),
+            ],
+            options={
+                'ordering': ['-overall_resilience_score'],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_simulationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HospitalCapacityLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('occupied_beds_icu', models.IntegerField()),
+                ('total_beds_icu', models.IntegerField()),
+                ('occupied_beds_general', models.IntegerField()),
+                ('total_beds_general', models.IntegerField()),
+                ('oxygen_supply_level', models.IntegerField()),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capacity_log', to='core.hospital')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hospital', 'timestamp'], name='core_hospit_hospita_5e1b87_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='HospitalCapacityRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('bucket_start', models.DateTimeField()),
+                ('samples', models.IntegerField()),
+                ('icu_occupied_avg', models.FloatField()),
+                ('icu_occupied_max', models.IntegerField()),
+                ('icu_total', models.IntegerField()),
+                ('general_occupied_avg', models.FloatField()),
+                ('general_occupied_max', models.IntegerField()),
+                ('general_total', models.IntegerField()),
+                ('oxygen_avg', models.FloatField()),
+                ('oxygen_min', models.IntegerField()),
+                ('hospital', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='capacity_rollups', to='core.hospital')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resolution', 'bucket_start'], name='core_hospit_resolut_31e971_idx')],
+                'unique_together': {('hospital', 'resolution', 'bucket_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_hospitalcapacitylog_hospitalcapacityrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('value', models.JSONField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -55,9 +55,31 @@ class Hospital(models.Model):
     oxygen_supply_level = models.IntegerField(default=100) # Percentage
     is_live_data = models.BooleanField(default=False) # Helper for simulation vs real
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the zone the row was loaded with so signal handlers can refresh it if the hospital moves
+        instance._loaded_zone_id = instance.__dict__.get('zone_id')
+        return instance
+
     def __str__(self):
         return self.name
 
+class ZoneResilience(models.Model):
+    """Materialized output of SimulationService resilience scoring, kept current by signals."""
+    zone = models.OneToOneField(CityZone, on_delete=models.CASCADE, related_name='resilience')
+    aqi_score = models.FloatField()
+    medical_capacity_score = models.FloatField()
+    nutrition_access_score = models.FloatField()
+    overall_resilience_score = models.FloatField(db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-overall_resilience_score']
+
+    def __str__(self):
+        return f"Resilience {self.zone.name}: {self.overall_resilience_score}"
+
 class TrafficStats(models.Model):
     zone = models.ForeignKey(CityZone, on_delete=models.CASCADE)
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -133,3 +155,87 @@ class CitizenReport(models.Model):
 
     def __str__(self):
         return f"{self.report_type} in {self.zone.name}"
+
+class SimulationJob(models.Model):
+    KIND_CHOICES = [
+        ('what_if', 'What-If'),
+        ('monte_carlo', 'Monte Carlo'),
+        ('batch', 'Batch Sweep'),
+        ('timeline', 'Timeline'),
+    ]
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    params = models.TextField(default="{}") # JSON string of the request body
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    progress = models.FloatField(default=0.0) # 0.0 to 1.0
+    result = models.TextField(blank=True, default="") # JSON string, set when done
+    error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.kind} job #{self.pk} ({self.status})"
+
+class HospitalCapacityLog(models.Model):
+    """Append-only snapshot of a hospital's beds, written on every Hospital save."""
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='capacity_log')
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    occupied_beds_icu = models.IntegerField()
+    total_beds_icu = models.IntegerField()
+    occupied_beds_general = models.IntegerField()
+    total_beds_general = models.IntegerField()
+    oxygen_supply_level = models.IntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['hospital', 'timestamp'])]
+
+    def __str__(self):
+        return f"{self.hospital_id} @ {self.timestamp}"
+
+class HospitalCapacityRollup(models.Model):
+    """Per-bucket aggregates of HospitalCapacityLog, maintained by `manage.py compact_capacity`."""
+    RESOLUTION_CHOICES = [
+        ('1m', '1 minute'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+    hospital = models.ForeignKey(Hospital, on_delete=models.CASCADE, related_name='capacity_rollups')
+    resolution = models.CharField(max_length=2, choices=RESOLUTION_CHOICES)
+    bucket_start = models.DateTimeField()
+    samples = models.IntegerField()
+    icu_occupied_avg = models.FloatField()
+    icu_occupied_max = models.IntegerField()
+    icu_total = models.IntegerField()
+    general_occupied_avg = models.FloatField()
+    general_occupied_max = models.IntegerField()
+    general_total = models.IntegerField()
+    oxygen_avg = models.FloatField()
+    oxygen_min = models.IntegerField()
+
+    class Meta:
+        unique_together = ('hospital', 'resolution', 'bucket_start')
+        indexes = [models.Index(fields=['resolution', 'bucket_start'])]
+
+    def __str__(self):
+        return f"{self.hospital_id} {self.resolution} @ {self.bucket_start}"
+
+class ServiceState(models.Model):
+    """
+    Small durable state shared by every process (capacity compaction watermark, ICU forecast state).
+    Lives in the database rather than the shared cache, which culls entries when it fills up.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    value = models.JSONField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
@@ -24,6 +24,9 @@ class HospitalSerializer(serializers.ModelSerializer):
         model = Hospital
         fields = '__all__'
 
+class HospitalDistanceSerializer(HospitalSerializer):
+    distance_km = serializers.ReadOnlyField()
+
 class TrafficStatsSerializer(serializers.ModelSerializer):
     zone_name = serializers.ReadOnlyField(source='zone.name')
     class Meta:
@@ -0,0 +1,110 @@
+import json
+import numpy as np
+
+class AQIEngine:
+    """
+    CPCB National Air Quality Index from raw pollutant concentrations.
+
+    Each pollutant's sub-index is the piecewise-linear interpolation of its
+    concentration between the CPCB breakpoints (Good 0-50 ... Severe 401-500); the
+    AQI is the highest sub-index. As in the CPCB method, an AQI is only reported when
+    at least MIN_POLLUTANTS pollutants are measured and one of them is PM2.5 or PM10.
+
+    Everything works on (rows x pollutants) arrays: one np.interp per pollutant
+    covers every station or log row at once.
+    """
+    # Column order of every concentration / sub-index array
+    POLLUTANTS = ('pm25', 'pm10', 'no2', 'so2', 'co', 'o3', 'nh3')
+    LABELS = {'pm25': 'PM2.5', 'pm10': 'PM10', 'no2': 'NO2', 'so2': 'SO2', 'co': 'CO', 'o3': 'OZONE', 'nh3': 'NH3'}
+    # Feed spellings of the pollutant ids (compared lower-case, without spaces or dots)
+    ALIASES = {'pm25': 'pm25', 'pm10': 'pm10', 'no2': 'no2', 'so2': 'so2', 'co': 'co',
+               'o3': 'o3', 'ozone': 'o3', 'nh3': 'nh3'}
+
+    SUB_INDEX = (0, 50, 100, 200, 300, 400, 500)
+    # Concentration at each SUB_INDEX point: ug/m3 (CO in mg/m3). The 500 point extends
+    # the Severe band by the width of the Very Poor band; anything above caps at 500.
+    BREAKPOINTS = {
+        'pm25': (0, 30, 60, 90, 120, 250, 380),
+        'pm10': (0, 50, 100, 250, 350, 430, 510),
+        'no2': (0, 40, 80, 180, 280, 400, 520),
+        'so2': (0, 40, 80, 380, 800, 1600, 2400),
+        'co': (0, 1.0, 2.0, 10, 17, 34, 51),
+        'o3': (0, 50, 100, 168, 208, 748, 1288),
+        'nh3': (0, 200, 400, 800, 1200, 1800, 2400),
+    }
+    CATEGORIES = ('Good', 'Satisfactory', 'Moderate', 'Poor', 'Very Poor', 'Severe')
+    CATEGORY_UPPER = (50, 100, 200, 300, 400) # highest AQI of each category but Severe
+    MIN_POLLUTANTS = 3
+
+    @classmethod
+    def column(cls, index_id):
+        """Column of a feed pollutant id ('PM2.5', 'OZONE', ...), or None for ones without a breakpoint table."""
+        key = str(index_id).lower().replace('.', '').replace(' ', '').replace('_', '')
+        pollutant = cls.ALIASES.get(key)
+        return cls.POLLUTANTS.index(pollutant) if pollutant else None
+
+    @classmethod
+    def concentrations(cls, pollutant_lists):
+        """
+        (rows x pollutants) concentrations, NaN where not measured, from lists of pollutant
+        dicts as found in the CPCB feed and WeatherLog.pollutant_details ({"indexId" or "id", "avg"}).
+        """
+        out = np.full((len(pollutant_lists), len(cls.POLLUTANTS)), np.nan)
+        for row, pollutants in enumerate(pollutant_lists):
+            for p in pollutants or []:
+                if not isinstance(p, dict):
+                    continue
+                col = cls.column(p.get('indexId') or p.get('id'))
+                if col is None:
+                    continue
+                try:
+                    value = float(p.get('avg'))
+                except (TypeError, ValueError):
+                    continue
+                if value >= 0:
+                    out[row, col] = value
+        return out
+
+    @classmethod
+    def sub_indices(cls, concentrations):
+        """Sub-index of every measured concentration (same shape, NaN stays NaN)."""
+        out = np.full(concentrations.shape, np.nan)
+        for col, pollutant in enumerate(cls.POLLUTANTS):
+            c = concentrations[:, col]
+            measured = ~np.isnan(c)
+            out[measured, col] = np.interp(c[measured], cls.BREAKPOINTS[pollutant], cls.SUB_INDEX)
+        return out
+
+    @classmethod
+    def compute(cls, concentrations):
+        """
+        Returns (aqi, dominant column, sub_indices) for (rows x pollutants) concentrations.
+        aqi is NaN and dominant -1 on rows that don't meet the CPCB minimum-data rule.
+        """
+        sub = cls.sub_indices(concentrations)
+        measured = ~np.isnan(sub)
+        pm = cls.POLLUTANTS.index('pm25'), cls.POLLUTANTS.index('pm10')
+        valid = (measured.sum(axis=1) >= cls.MIN_POLLUTANTS) & measured[:, pm].any(axis=1)
+        filled = np.where(measured, sub, -1.0)
+        dominant = np.where(valid, filled.argmax(axis=1), -1)
+        aqi = np.where(valid, filled.max(axis=1), np.nan)
+        return np.round(aqi), dominant, sub
+
+    @classmethod
+    def category(cls, aqi):
+        """CPCB category name of an AQI value (None when unknown)."""
+        if aqi is None or np.isnan(aqi):
+            return None
+        return cls.CATEGORIES[int(np.searchsorted(cls.CATEGORY_UPPER, aqi, side='left'))]
+
+    @classmethod
+    def from_details(cls, details):
+        """Like compute(), for WeatherLog.pollutant_details JSON strings; unreadable rows count as empty."""
+        lists = []
+        for text in details:
+            try:
+                value = json.loads(text) if text else []
+            except (TypeError, ValueError):
+                value = []
+            lists.append(value if isinstance(value, list) else [])
+        return cls.compute(cls.concentrations(lists))
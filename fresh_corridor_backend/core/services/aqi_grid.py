@@ -0,0 +1,139 @@
+import math
+import threading
+import numpy as np
+
+class AQIGrid:
+    """
+    AQI at arbitrary points, interpolated from the current CPCB station snapshot.
+
+    Once per snapshot, inverse-distance-weighted AQI (power POWER, stations within
+    SEARCH_KM) is evaluated at every node of a regular lat/lon grid over BOUNDS, one
+    row of nodes x all stations per NumPy step. A lookup is then a bilinear read of
+    the four surrounding nodes, so its cost doesn't depend on the number of stations.
+    Nodes with no station in range are NaN; a read only averages the corners that
+    have a value. Points outside the grid fall back to the same IDW computed directly.
+    """
+    BOUNDS = (28.0, 76.7, 29.0, 77.7) # min_lat, min_lon, max_lat, max_lon (Delhi NCR)
+    STEP_KM = 0.5
+    POWER = 2
+    SEARCH_KM = 30 # stations farther than this don't contribute
+    MIN_DISTANCE_KM = 0.05 # keeps a node on top of a station finite
+    MAX_POINTS = 10000 # per batch request
+    DIRECT_CHUNK = 256 # outside points per direct IDW step
+    KM_PER_DEG_LAT = 110.57
+
+    _grid = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _readings(cls, stations):
+        """(lat, lon, aqi) arrays of the stations with a numeric AQI and coordinates."""
+        rows = []
+        for st in stations:
+            try:
+                row = (float(st['lat']), float(st['lon']), float(st['aqi']))
+            except (KeyError, TypeError, ValueError):
+                continue
+            if all(math.isfinite(v) for v in row):
+                rows.append(row)
+        points = np.array(rows, dtype=float).reshape(-1, 3)
+        return points[:, 0], points[:, 1], points[:, 2]
+
+    @classmethod
+    def _idw(cls, lat, lon, s_lat, s_lon, s_aqi):
+        """IDW AQI at (lat, lon) arrays of the same shape from station arrays; NaN with no station in range."""
+        # Equirectangular distances are accurate to well under 1% at city scale
+        km_lon = cls.KM_PER_DEG_LAT * np.cos(np.radians(lat))[..., None]
+        d = np.hypot((lat[..., None] - s_lat) * cls.KM_PER_DEG_LAT, (lon[..., None] - s_lon) * km_lon)
+        w = np.where(d <= cls.SEARCH_KM, 1.0 / np.maximum(d, cls.MIN_DISTANCE_KM) ** cls.POWER, 0.0)
+        total = w.sum(axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(total > 0, (w * s_aqi).sum(axis=-1) / total, np.nan)
+
+    @classmethod
+    def _build(cls, stations, version):
+        min_lat, min_lon, max_lat, max_lon = cls.BOUNDS
+        d_lat = cls.STEP_KM / cls.KM_PER_DEG_LAT
+        d_lon = cls.STEP_KM / (cls.KM_PER_DEG_LAT * math.cos(math.radians((min_lat + max_lat) / 2)))
+        lats = np.arange(int(math.ceil((max_lat - min_lat) / d_lat)) + 1) * d_lat + min_lat
+        lons = np.arange(int(math.ceil((max_lon - min_lon) / d_lon)) + 1) * d_lon + min_lon
+
+        s_lat, s_lon, s_aqi = cls._readings(stations)
+        # Only stations that can reach the grid take part
+        margin_lat = cls.SEARCH_KM / cls.KM_PER_DEG_LAT
+        margin_lon = cls.SEARCH_KM / (cls.KM_PER_DEG_LAT * math.cos(math.radians(max(abs(min_lat), abs(max_lat)))))
+        near = ((s_lat >= min_lat - margin_lat) & (s_lat <= lats[-1] + margin_lat) &
+                (s_lon >= min_lon - margin_lon) & (s_lon <= lons[-1] + margin_lon))
+
+        values = np.full((len(lats), len(lons)), np.nan)
+        if near.any():
+            for i, lat in enumerate(lats):
+                values[i] = cls._idw(np.full(len(lons), lat), lons, s_lat[near], s_lon[near], s_aqi[near])
+        return {
+            "version": version,
+            "stations": stations,
+            "origin": (min_lat, min_lon),
+            "step": (d_lat, d_lon),
+            "shape": values.shape,
+            "values": values,
+            "readings": (s_lat, s_lon, s_aqi),
+            "contributing_stations": int(near.sum()),
+        }
+
+    @classmethod
+    def grid(cls):
+        from core.services.aqi_service import AQIService
+
+        stations = AQIService.get_stations() # a new snapshot is a new list
+        if cls._grid is None or cls._grid["stations"] is not stations:
+            with cls._lock:
+                if cls._grid is None or cls._grid["stations"] is not stations:
+                    cls._grid = cls._build(stations, AQIService.version)
+        return cls._grid
+
+    @classmethod
+    def _bilinear(cls, grid, lat, lon):
+        """Bilinear reads for in-grid points (arrays); NaN corners are left out of the average."""
+        (lat0, lon0), (d_lat, d_lon), (rows, cols) = grid["origin"], grid["step"], grid["shape"]
+        y = np.clip((lat - lat0) / d_lat, 0, rows - 1)
+        x = np.clip((lon - lon0) / d_lon, 0, cols - 1)
+        i = np.minimum(np.floor(y).astype(int), max(rows - 2, 0))
+        j = np.minimum(np.floor(x).astype(int), max(cols - 2, 0))
+        fy, fx = y - i, x - j
+        i1, j1 = np.minimum(i + 1, rows - 1), np.minimum(j + 1, cols - 1)
+
+        v = grid["values"]
+        corners = np.stack([v[i, j], v[i, j1], v[i1, j], v[i1, j1]])
+        weights = np.stack([(1 - fy) * (1 - fx), (1 - fy) * fx, fy * (1 - fx), fy * fx])
+        known = ~np.isnan(corners)
+        weights = np.where(known, weights, 0.0)
+        total = weights.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(total > 0, (weights * np.where(known, corners, 0.0)).sum(axis=0) / total, np.nan)
+
+    @classmethod
+    def at(cls, lat, lon, grid=None):
+        """
+        Interpolated AQI at many points: returns (aqi, source) arrays where source is
+        'grid', 'stations' (outside the grid, direct IDW) or None (no station within SEARCH_KM).
+        Pass the result of grid() to read a specific snapshot (e.g. to report its version).
+        """
+        lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+        if not (np.isfinite(lat).all() and np.isfinite(lon).all()):
+            raise ValueError("lat and lon must be finite numbers")
+        if (np.abs(lat) > 90).any() or (np.abs(lon) > 180).any():
+            raise ValueError("lat must be within +-90 and lon within +-180")
+
+        grid = grid or cls.grid()
+        min_lat, min_lon, max_lat, max_lon = cls.BOUNDS
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        aqi = np.full(lat.shape, np.nan)
+        if inside.any():
+            aqi[inside] = cls._bilinear(grid, lat[inside], lon[inside])
+        outside = np.flatnonzero(~inside)
+        for k in range(0, len(outside), cls.DIRECT_CHUNK): # bounds the points x stations temporaries
+            chunk = outside[k:k + cls.DIRECT_CHUNK]
+            aqi[chunk] = cls._idw(lat[chunk], lon[chunk], *grid["readings"])
+
+        source = np.where(np.isnan(aqi), None, np.where(inside, 'grid', 'stations'))
+        return aqi, source
@@ -1,12 +1,54 @@
+import gzip
+import json
+import os
+import threading
+import time
 import requests
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
 from datetime import datetime, timezone
 import math
+from django.conf import settings
+from django.db import connection
 
 class AQIService:
+    """
+    Live CPCB station readings, served stale-while-revalidate.
+
+    The snapshot lives in one gzipped JSON file shared by every worker process;
+    each worker keeps a parsed copy in STATIONS and reloads it when the file's
+    mtime changes, so requests never wait on CPCB. Every worker runs a background
+    refresher, but fetching goes through a lock file: when the data goes stale,
+    one process fetches and parses the feed and the others pick up its snapshot.
+
+    Snapshots are numbered (`version`, +1 per fetch) and remember, per station, the
+    versions it was added and last changed in, plus which stations were removed in
+    the last DELTA_HISTORY versions, so polling clients can ask for changes only.
+    """
     _instance = None
     CPCB_FEED_URL = "https://airquality.cpcb.gov.in/caaqms/iit_rss_feed_with_coordinates"
     STATION_POLLUTANTS_LIVE = {}
     STATIONS = [] # In-memory cache of stations with AQI
+    REFRESH_INTERVAL = 600 # seconds between fetches
+    RETRY_INTERVAL = 60 # seconds before retrying a failed fetch
+    MANUAL_REFRESH_INTERVAL = 60 # ?refresh is ignored on snapshots younger than this
+    LOCK_POLL = 5 # seconds between snapshot checks while another process fetches
+    DELTA_HISTORY = 144 # versions a ?since= delta can reach back (a day at REFRESH_INTERVAL)
+    IGNORED_FOR_CHANGES = ('live_ts',) # a new feed timestamp alone doesn't make a station changed
+
+    fetched_at = 0.0 # unix time of the snapshot in STATIONS
+    version = 0
+    # {"history_from": oldest answerable since, "stations": {key: [added_in, changed_in]}, "removed": [[version, key]]}
+    _deltas = {"history_from": 0, "stations": {}, "removed": []}
+    _snapshot_mtime = None
+    _retry_at = 0.0 # no fetch before this after a failure
+    _manual = False
+    _refresher = None
+    _wake = threading.Event()
+    _lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
@@ -32,101 +74,316 @@ class AQIService:
         est_raw = 400 + (factor / 20.0)
         return round(cls._sanitize_co2(est_raw), 2)
 
+    @classmethod
+    def _station_record(cls, st, context):
+        """
+        One feed station (plus the state / city fields around it) in the shape served by
+        the API, or None when it has no usable coordinates.
+        """
+        try:
+            lat = float(st.get("latitude") or st.get("lat"))
+            lon = float(st.get("longitude") or st.get("lon") or st.get("lng"))
+        except (TypeError, ValueError):
+            return None
+
+        # Pollutants
+        pollutants_detail = []
+        pm25 = pm10 = no2 = co = None
+        for p in st.get("pollutants") or []:
+            if not isinstance(p, dict): continue
+            idx = str(p.get("indexId")).lower()
+            avg = p.get("avg")
+
+            pollutants_detail.append({
+                "id": p.get("indexId"),
+                "min": p.get("min"),
+                "max": p.get("max"),
+                "avg": avg,
+                "sub_index": p.get("Hourly_sub_index")
+            })
+
+            try: avg_f = float(avg)
+            except: avg_f = None
+
+            if "pm2" in idx: pm25 = pm25 or avg_f
+            elif "pm10" in idx: pm10 = pm10 or avg_f
+            elif "no2" in idx: no2 = no2 or avg_f
+            elif "co" in idx: co = co or avg_f
+
+        return {
+            "name": st.get("stationName") or st.get("Station"),
+            "city": context.get("cityId") or st.get("city"),
+            "state": context.get("stateId"),
+            "lat": lat,
+            "lon": lon,
+            "aqi": st.get("airQualityIndexValue"),
+            "predominant_parameter": st.get("predominantParameter"),
+            "pollutants": pollutants_detail,
+            "co2_estimated": cls.estimate_co2_from_pollutants(pm25, pm10, no2, co),
+            "live_ts": st.get("lastUpdate") or datetime.now(timezone.utc).isoformat()
+        }
+
+    @classmethod
+    def _apply_aqi(cls, stations):
+        """
+        Recomputes every station's AQI from its pollutant concentrations in one vectorized
+        AQIEngine pass. Stations without enough data keep the feed's value (aqi_source tells which).
+        """
+        from core.services.aqi_engine import AQIEngine
+
+        aqi, dominant, _ = AQIEngine.compute(AQIEngine.concentrations([st["pollutants"] for st in stations]))
+        for st, value, col in zip(stations, aqi, dominant):
+            st["aqi_feed"] = st["aqi"]
+            if col >= 0:
+                st["aqi"] = int(value)
+                st["predominant_parameter"] = AQIEngine.LABELS[AQIEngine.POLLUTANTS[col]]
+                st["aqi_source"] = "computed"
+            else:
+                st["aqi_source"] = "feed"
+            try:
+                st["aqi_category"] = AQIEngine.category(float(st["aqi"]))
+            except (TypeError, ValueError):
+                st["aqi_category"] = None
+
     @classmethod
     def fetch_live_data(cls):
-        """Fetch and parse CPCB data."""
+        """Fetch and parse CPCB data, streaming the feed one station at a time."""
+        from core.services.cpcb_parser import CPCBFeedParser
+
         try:
-            resp = requests.get(cls.CPCB_FEED_URL, timeout=15)
-            resp.raise_for_status()
-            payload = resp.json()
+            with requests.get(cls.CPCB_FEED_URL, timeout=15, stream=True) as resp:
+                resp.raise_for_status()
+                records = (cls._station_record(st, context) for st, context in CPCBFeedParser.iter_response(resp))
+                new_stations = [r for r in records if r is not None]
         except Exception as e:
             print(f"[AQI Service] Fetch failed: {e}")
             return False
 
-        # Normalize payload
-        if isinstance(payload, list): state_objs = payload
-        elif isinstance(payload, dict):
-            # Try to find list in common keys
-            for k in ["data", "results", "stations", "feeds"]:
-                if isinstance(payload.get(k), list):
-                    state_objs = payload[k]
-                    break
-            else:
-                 # heuristic
-                 for v in payload.values():
-                    if isinstance(v, list) and v:
-                         if isinstance(v[0], dict) and ("stateId" in v[0] or "citiesInState" in v[0]):
-                             state_objs = v
-                             break
-                 else:
-                     state_objs = []
-        else: state_objs = []
-
-        new_stations = []
-
-        for state in state_objs:
-             cities = state.get("citiesInState") or state.get("cities") or state.get("stations") or []
-             # Flatten if needed
-             if not isinstance(cities, list) and isinstance(state.get("stations"), list):
-                 cities = [{"cityId": state.get("cityId"), "stationsInCity": state.get("stations")}]
-             
-             for city in cities:
-                 stations_list = city.get("stationsInCity") or city.get("stations") or []
-                 for st in stations_list:
-                     if not isinstance(st, dict): continue
-                     
-                     st_name = st.get("stationName") or st.get("Station")
-                     try:
-                         lat = float(st.get("latitude") or st.get("lat"))
-                         lon = float(st.get("longitude") or st.get("lon"))
-                     except: continue
-
-                     # Pollutants
-                     pollutants_detail = []
-                     pm25 = pm10 = no2 = co = None
-                     
-                     raw_p = st.get("pollutants") or []
-                     for p in raw_p:
-                         idx = str(p.get("indexId")).lower()
-                         avg = p.get("avg")
-                         
-                         pollutants_detail.append({
-                             "id": p.get("indexId"),
-                             "min": p.get("min"),
-                             "max": p.get("max"),
-                             "avg": avg,
-                             "sub_index": p.get("Hourly_sub_index")
-                         })
-
-                         try: avg_f = float(avg)
-                         except: avg_f = None
-                         
-                         if "pm2" in idx: pm25 = pm25 or avg_f
-                         elif "pm10" in idx: pm10 = pm10 or avg_f
-                         elif "no2" in idx: no2 = no2 or avg_f
-                         elif "co" in idx: co = co or avg_f
-                     
-                     est_co2 = cls.estimate_co2_from_pollutants(pm25, pm10, no2, co)
-                     
-                     new_stations.append({
-                         "name": st_name,
-                         "city": city.get("cityId") or st.get("city"),
-                         "state": state.get("stateId"),
-                         "lat": lat,
-                         "lon": lon,
-                         "aqi": st.get("airQualityIndexValue"),
-                         "predominant_parameter": st.get("predominantParameter"),
-                         "pollutants": pollutants_detail,
-                         "co2_estimated": est_co2,
-                         "live_ts": st.get("lastUpdate") or datetime.now(timezone.utc).isoformat()
-                     })
-        
-        cls.STATIONS = new_stations
+        from core.services.tile_service import HeatmapTiles
+        cls._apply_aqi(new_stations)
+        new_stations = cls._apply_versions(new_stations)
+        old_stations, cls.STATIONS = cls.STATIONS, new_stations
+        cls.fetched_at = time.time()
+        # Snapshot first: tiles rendered after the invalidation bump (in any process)
+        # sync to this snapshot before reading stations
+        cls._save_snapshot()
+        HeatmapTiles.invalidate_stations(old_stations, new_stations)
         print(f"[AQI Service] Updated {len(new_stations)} stations.")
         return True
 
+    # --- Versions and deltas ---
+
+    @staticmethod
+    def station_key(station):
+        return f"{station.get('state') or ''}|{station.get('city') or ''}|{station.get('name') or ''}"
+
+    @classmethod
+    def _apply_versions(cls, new_stations):
+        """
+        Numbers a freshly fetched station list as the next version: tags each station with
+        its `key`, drops repeated keys and records what was added, changed and removed.
+        Runs inside the single-flight refresh, after syncing, so versions never fork.
+        """
+        def content(st):
+            return {k: v for k, v in st.items() if k not in cls.IGNORED_FOR_CHANGES}
+
+        version = cls.version + 1
+        old = {st.get("key") or cls.station_key(st): st for st in cls.STATIONS}
+        old_versions = cls._deltas["stations"]
+        stations, versions = [], {}
+        for st in new_stations:
+            key = cls.station_key(st)
+            if key in versions:
+                continue
+            st = {"key": key, **st}
+            previous = old.get(key)
+            if previous is None:
+                versions[key] = [version, version]
+            elif content(previous) != content(st):
+                versions[key] = [old_versions.get(key, [version])[0], version]
+            else:
+                versions[key] = old_versions.get(key) or [version, version]
+            stations.append(st)
+
+        history_from = max(cls._deltas["history_from"], version - cls.DELTA_HISTORY)
+        removed = [r for r in cls._deltas["removed"] if r[0] > history_from]
+        removed += [[version, key] for key in old if key not in versions]
+        cls._deltas = {"history_from": history_from, "stations": versions, "removed": removed}
+        cls.version = version
+        return stations
+
+    @classmethod
+    def changes_since(cls, since):
+        """
+        Stations added, changed or removed after version `since`. When that version is
+        too old (or unknown) to answer with a delta, the whole list comes back with full=True.
+        """
+        since = int(since)
+        cls._sync_snapshot()
+        cls.ensure_refresher()
+        stations, deltas, version = cls.STATIONS, cls._deltas, cls.version
+        if since < deltas["history_from"] or since > version:
+            return {"version": version, "since": since, "full": True, "stations": stations}
+
+        added, changed = [], []
+        for st in stations:
+            added_in, changed_in = deltas["stations"].get(st.get("key"), (version, version))
+            if added_in > since:
+                added.append(st)
+            elif changed_in > since:
+                changed.append(st)
+        present = deltas["stations"]
+        removed = sorted({key for v, key in deltas["removed"] if v > since and key not in present})
+        return {"version": version, "since": since, "full": False, "added": added, "changed": changed, "removed": removed}
+
+    # --- Shared snapshot on disk ---
+
+    @classmethod
+    def snapshot_path(cls):
+        return str(getattr(settings, 'AQI_SNAPSHOT_PATH', settings.BASE_DIR / '.cache' / 'aqi_stations.json.gz'))
+
+    @classmethod
+    def _save_snapshot(cls):
+        path = cls.snapshot_path()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with gzip.open(tmp, 'wt', encoding='utf-8', compresslevel=6) as f:
+                json.dump({"fetched_at": cls.fetched_at, "version": cls.version, "deltas": cls._deltas,
+                           "stations": cls.STATIONS}, f, separators=(',', ':'))
+            os.replace(tmp, path) # readers never see a half-written file
+            cls._snapshot_mtime = os.stat(path).st_mtime_ns
+        except OSError as e:
+            print(f"[AQI Service] Could not write snapshot: {e}")
+
+    @classmethod
+    def _sync_snapshot(cls):
+        """Reloads STATIONS when another process has written a newer snapshot (one stat() otherwise)."""
+        path = cls.snapshot_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == cls._snapshot_mtime:
+            return
+        with cls._lock:
+            if mtime == cls._snapshot_mtime:
+                return
+            try:
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"[AQI Service] Ignoring unreadable snapshot: {e}")
+                return
+            cls._snapshot_mtime = mtime
+            if float(snapshot.get("fetched_at") or 0.0) >= cls.fetched_at:
+                cls._deltas = snapshot.get("deltas") or {"history_from": 0, "stations": {}, "removed": []}
+                cls.version = int(snapshot.get("version") or 0)
+                cls.STATIONS = snapshot.get("stations") or []
+                cls.fetched_at = float(snapshot.get("fetched_at") or 0.0)
+
+    # --- Single-flight refresh ---
+
+    @classmethod
+    def _lock_path(cls):
+        return f"{cls.snapshot_path()}.lock"
+
+    @classmethod
+    def _acquire_fetch_lock(cls):
+        """
+        Takes an exclusive lock on the lock file (flock, or msvcrt.locking on its first byte
+        on Windows) and returns its descriptor (close it to release), or None while another
+        process holds it. The file itself stays in place and the OS drops the lock when its
+        holder exits, so a crashed fetch can't leave it stuck.
+        """
+        path = cls._lock_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            return None
+        return fd
+
+    @classmethod
+    def refresh(cls, min_age=None):
+        """
+        Fetches the feed unless another process is already doing so or the shared
+        snapshot is younger than min_age (default REFRESH_INTERVAL) seconds.
+        Returns True when this call fetched a new snapshot, None when it didn't try.
+        """
+        min_age = cls.REFRESH_INTERVAL if min_age is None else min_age
+        lock = cls._acquire_fetch_lock()
+        if lock is None:
+            return None
+        try:
+            # Whoever held the lock before us may have just written a snapshot
+            cls._sync_snapshot()
+            if time.time() - cls.fetched_at < min_age:
+                return None
+            return cls.fetch_live_data()
+        finally:
+            os.close(lock)
+
+    @classmethod
+    def is_stale(cls):
+        return time.time() - cls.fetched_at >= cls.REFRESH_INTERVAL
+
+    @classmethod
+    def _refresh_loop(cls):
+        while True:
+            cls._sync_snapshot()
+            manual, cls._manual = cls._manual, False
+            wait = None
+            if manual or (cls.is_stale() and time.time() >= cls._retry_at):
+                try:
+                    fetched = cls.refresh(cls.MANUAL_REFRESH_INTERVAL if manual else None)
+                except Exception as e:
+                    print(f"[AQI Service] Refresh failed: {e}")
+                    fetched = False
+                finally:
+                    connection.close()
+                if fetched is False:
+                    cls._retry_at = time.time() + cls.RETRY_INTERVAL
+                elif fetched is None and cls.is_stale():
+                    wait = cls.LOCK_POLL # another process is fetching, pick up its snapshot soon
+            if wait is None:
+                wait = max(cls.REFRESH_INTERVAL - (time.time() - cls.fetched_at), cls._retry_at - time.time(), 1)
+            cls._wake.wait(wait)
+            cls._wake.clear()
+
+    @classmethod
+    def ensure_refresher(cls):
+        """Starts the background refresher once per process; wakes it early when the data is stale."""
+        if cls._refresher is None or not cls._refresher.is_alive():
+            with cls._lock:
+                if cls._refresher is None or not cls._refresher.is_alive():
+                    cls._refresher = threading.Thread(target=cls._refresh_loop, name='aqi-refresher', daemon=True)
+                    cls._refresher.start()
+        elif cls.is_stale() and time.time() >= cls._retry_at:
+            cls._wake.set()
+
+    @classmethod
+    def request_refresh(cls):
+        """
+        Asks the refresher for an early fetch without waiting for it. Throttled: a snapshot
+        younger than MANUAL_REFRESH_INTERVAL is kept. Returns whether a fetch was requested.
+        """
+        cls._sync_snapshot()
+        if time.time() - cls.fetched_at < cls.MANUAL_REFRESH_INTERVAL:
+            return False
+        cls._manual = True
+        cls.ensure_refresher()
+        cls._wake.set()
+        return True
+
     @classmethod
     def get_stations(cls):
-        if not cls.STATIONS:
-            cls.fetch_live_data()
+        """The latest shared snapshot, without waiting on the feed (empty until the very first fetch lands)."""
+        cls._sync_snapshot()
+        cls.ensure_refresher()
         return cls.STATIONS
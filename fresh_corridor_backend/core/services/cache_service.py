@@ -0,0 +1,51 @@
+import json
+import time
+import hashlib
+from django.core.cache import cache, caches
+
+class ScenarioCache:
+    """
+    Memoizes simulation results keyed by zone, normalized parameters and a data version.
+    Versions live in the cross-process 'shared' cache and are bumped by core.signals
+    whenever rows feeding a zone change, so outdated results are never read again and
+    simply expire from the in-memory result cache. settings.CACHES['shared'] is sized
+    for one token per zone; an evicted token only costs a recompute.
+    """
+    VERSION_CACHE = 'shared'
+    RESULT_TTL = 3600 # seconds
+
+    @classmethod
+    def data_version(cls, scope):
+        """Current version token for a scope such as 'zone:4'."""
+        versions = caches[cls.VERSION_CACHE]
+        key = f"data_version:{scope}"
+        version = versions.get(key)
+        if version is None:
+            # Tokens are timestamps rather than counters: if a version is ever evicted,
+            # the new one can't collide with a key that is still cached.
+            versions.add(key, time.time_ns(), None)
+            version = versions.get(key)
+        return version
+
+    @classmethod
+    def bump(cls, scope):
+        caches[cls.VERSION_CACHE].set(f"data_version:{scope}", time.time_ns(), None)
+
+    @classmethod
+    def key(cls, name, zone_id, params=None):
+        """Read the key *before* computing, so a bump mid-computation can't be masked."""
+        return cls.scope_key(name, f'zone:{zone_id}', params)
+
+    @classmethod
+    def scope_key(cls, name, scope, params=None):
+        """Like key(), for results that depend on a wider scope such as 'epidemiology'."""
+        digest = hashlib.sha1(json.dumps(params or {}, sort_keys=True).encode()).hexdigest()
+        return f"scenario:{name}:{scope}:{cls.data_version(scope)}:{digest}"
+
+    @classmethod
+    def get(cls, key):
+        return cache.get(key)
+
+    @classmethod
+    def set(cls, key, result):
+        cache.set(key, result, cls.RESULT_TTL)
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import Avg, Count, F, FloatField, Max, Min, Sum
+from django.db.models.functions import Cast, TruncDay, TruncHour, TruncMinute
+from django.utils import timezone
+from core.models import HospitalCapacityLog, HospitalCapacityRollup, ServiceState
+
+class CapacityHistoryService:
+    """
+    Hospital bed history: an append-only HospitalCapacityLog (one row per Hospital
+    save, see core.signals) compacted into 1-minute, 1-hour and 1-day rollups.
+
+    Each level is built from the one below it (raw -> 1m -> 1h -> 1d), starting at
+    its own newest bucket, so a compaction run only touches recent rows. Range
+    queries read the finest level that keeps the answer under MAX_POINTS rows.
+    """
+    # (resolution, bucket seconds, truncation) from finest to coarsest
+    LEVELS = [('1m', 60, TruncMinute), ('1h', 3600, TruncHour), ('1d', 86400, TruncDay)]
+    RETENTION = {
+        'raw': timedelta(days=2),
+        '1m': timedelta(days=14),
+        '1h': timedelta(days=400),
+        '1d': None, # kept forever
+    }
+    RAW_MAX_WINDOW = timedelta(minutes=30)
+    MAX_POINTS = 500
+    WATERMARK_KEY = 'capacity:compacted_through'
+
+    @staticmethod
+    def _weighted(field):
+        return Cast(Sum(F(field) * F('samples')), FloatField()) / Cast(Sum('samples'), FloatField())
+
+    @classmethod
+    def _aggregate(cls, resolution, trunc, since):
+        """Rows of one level, grouped into buckets, from its source level."""
+        index = [level[0] for level in cls.LEVELS].index(resolution)
+        if index == 0:
+            rows = HospitalCapacityLog.objects.all()
+            if since:
+                rows = rows.filter(timestamp__gte=since)
+            return rows.values('hospital_id', bucket=trunc('timestamp')).annotate(
+                n=Count('id'),
+                icu_avg=Avg('occupied_beds_icu'), icu_max=Max('occupied_beds_icu'), icu_total=Max('total_beds_icu'),
+                general_avg=Avg('occupied_beds_general'), general_max=Max('occupied_beds_general'),
+                general_total=Max('total_beds_general'),
+                oxygen=Avg('oxygen_supply_level'), oxygen_low=Min('oxygen_supply_level'),
+            )
+
+        rows = HospitalCapacityRollup.objects.filter(resolution=cls.LEVELS[index - 1][0])
+        if since:
+            rows = rows.filter(bucket_start__gte=since)
+        return rows.values('hospital_id', bucket=trunc('bucket_start')).annotate(
+            n=Sum('samples'),
+            icu_avg=cls._weighted('icu_occupied_avg'), icu_max=Max('icu_occupied_max'), icu_total=Max('icu_total'),
+            general_avg=cls._weighted('general_occupied_avg'), general_max=Max('general_occupied_max'),
+            general_total=Max('general_total'),
+            oxygen=cls._weighted('oxygen_avg'), oxygen_low=Min('oxygen_min'),
+        )
+
+    @classmethod
+    def compact(cls):
+        """Brings every rollup level up to date. Returns {resolution: buckets written}."""
+        started = timezone.now()
+        written = {}
+        for resolution, _, trunc in cls.LEVELS:
+            # Rebuild from this level's newest bucket, which may still have been filling up
+            since = HospitalCapacityRollup.objects.filter(resolution=resolution).aggregate(m=Max('bucket_start'))['m']
+            buckets = [HospitalCapacityRollup(
+                hospital_id=r['hospital_id'], resolution=resolution, bucket_start=r['bucket'], samples=r['n'],
+                icu_occupied_avg=r['icu_avg'], icu_occupied_max=r['icu_max'], icu_total=r['icu_total'],
+                general_occupied_avg=r['general_avg'], general_occupied_max=r['general_max'],
+                general_total=r['general_total'], oxygen_avg=r['oxygen'], oxygen_min=r['oxygen_low'],
+            ) for r in cls._aggregate(resolution, trunc, since)]
+            with transaction.atomic():
+                stale = HospitalCapacityRollup.objects.filter(resolution=resolution)
+                if since:
+                    stale = stale.filter(bucket_start__gte=since)
+                stale.delete()
+                HospitalCapacityRollup.objects.bulk_create(buckets, batch_size=1000)
+            written[resolution] = len(buckets)
+        cls._apply_retention()
+        ServiceState.objects.update_or_create(key=cls.WATERMARK_KEY, defaults={'value': started.isoformat()})
+        return written
+
+    @classmethod
+    def compacted_through(cls):
+        """
+        Start of the last finished compact() run (None before the first one): every log
+        row saved before it is in the rollups, so buckets that ended by then are final.
+        """
+        value = ServiceState.objects.filter(key=cls.WATERMARK_KEY).values_list('value', flat=True).first()
+        return datetime.fromisoformat(value) if value else None
+
+    @classmethod
+    def _apply_retention(cls):
+        now = timezone.now()
+        # Raw rows only go once the 1-minute level has covered them
+        covered = HospitalCapacityRollup.objects.filter(resolution='1m').aggregate(m=Max('bucket_start'))['m']
+        if covered and cls.RETENTION['raw']:
+            HospitalCapacityLog.objects.filter(timestamp__lt=min(covered, now - cls.RETENTION['raw'])).delete()
+        for resolution, _, _ in cls.LEVELS:
+            keep = cls.RETENTION[resolution]
+            if keep:
+                HospitalCapacityRollup.objects.filter(resolution=resolution, bucket_start__lt=now - keep).delete()
+
+    @classmethod
+    def _retained(cls, resolution, start, now):
+        keep = cls.RETENTION[resolution]
+        return keep is None or start >= now - keep
+
+    @classmethod
+    def pick_resolution(cls, start, end):
+        """Finest level that still has data for `start` and returns at most MAX_POINTS rows."""
+        now = timezone.now()
+        window = (end - start).total_seconds()
+        if end - start <= cls.RAW_MAX_WINDOW and cls._retained('raw', start, now):
+            return 'raw'
+        for resolution, seconds, _ in cls.LEVELS:
+            if window / seconds <= cls.MAX_POINTS and cls._retained(resolution, start, now):
+                return resolution
+        return cls.LEVELS[-1][0]
+
+    @classmethod
+    def history(cls, hospital_id, start, end, resolution=None):
+        resolution = resolution or cls.pick_resolution(start, end)
+        if resolution == 'raw':
+            rows = HospitalCapacityLog.objects.filter(
+                hospital_id=hospital_id, timestamp__gte=start, timestamp__lte=end
+            ).order_by('timestamp')
+            points = [{
+                "t": r.timestamp.isoformat(),
+                "samples": 1,
+                "icu_occupied_avg": r.occupied_beds_icu, "icu_occupied_max": r.occupied_beds_icu, "icu_total": r.total_beds_icu,
+                "general_occupied_avg": r.occupied_beds_general, "general_occupied_max": r.occupied_beds_general,
+                "general_total": r.total_beds_general,
+                "oxygen_avg": r.oxygen_supply_level, "oxygen_min": r.oxygen_supply_level,
+            } for r in rows]
+        else:
+            seconds = dict((level[0], level[1]) for level in cls.LEVELS)[resolution]
+            # Include the bucket that contains `start`
+            rows = HospitalCapacityRollup.objects.filter(
+                hospital_id=hospital_id, resolution=resolution,
+                bucket_start__gt=start - timedelta(seconds=seconds), bucket_start__lte=end
+            ).order_by('bucket_start')
+            points = [{
+                "t": r.bucket_start.isoformat(),
+                "samples": r.samples,
+                "icu_occupied_avg": round(r.icu_occupied_avg, 2), "icu_occupied_max": r.icu_occupied_max, "icu_total": r.icu_total,
+                "general_occupied_avg": round(r.general_occupied_avg, 2), "general_occupied_max": r.general_occupied_max,
+                "general_total": r.general_total,
+                "oxygen_avg": round(r.oxygen_avg, 1), "oxygen_min": r.oxygen_min,
+            } for r in rows]
+        return {
+            "hospital_id": int(hospital_id),
+            "resolution": resolution,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "points": points,
+        }
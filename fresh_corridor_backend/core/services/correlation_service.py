@@ -0,0 +1,146 @@
+import threading
+from datetime import timedelta
+import numpy as np
+from django.core.cache import caches
+from django.db.models import Avg
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from core.models import CityZone, WeatherLog, HealthStats
+
+class LagCorrelationService:
+    """
+    Lagged cross-correlation between air quality and respiratory cases, per zone.
+
+    WeatherLog AQI and HealthStats active cases are averaged per zone and day into
+    two (zones x days) matrices. For every lag k, AQI on day t is paired with cases on
+    day t + k, and the Pearson r of each zone is taken over the days where both exist;
+    all lags and zones are one stacked (lags x zones x days) NumPy computation.
+
+    Only complete days (up to yesterday) are used, so a result stays valid for the
+    whole day and is cached per date and window in the shared cache. Narrowing the
+    lags or zones slices the cached arrays instead of recomputing them.
+    """
+    MAX_LAG = 14 # days
+    DEFAULT_DAYS = 90
+    MAX_DAYS = 365
+    MIN_PAIRS = 5 # fewer overlapping days than this gives no r
+    RESULT_CACHE = 'shared'
+    RESULT_TTL = 86400 # seconds
+
+    _results = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _daily(cls, model, field, zone_index, first_day, days):
+        """Zones x days matrix of the daily mean of `field` (NaN on days with no rows)."""
+        matrix = np.full((len(zone_index), days), np.nan)
+        rows = model.objects.filter(
+            timestamp__date__gte=first_day, timestamp__date__lt=first_day + timedelta(days=days)
+        ).annotate(day=TruncDate('timestamp')).values('zone_id', 'day').annotate(
+            value=Avg(field)
+        ).values_list('zone_id', 'day', 'value')
+        for zone_id, day, value in rows:
+            if zone_id in zone_index and value is not None:
+                matrix[zone_index[zone_id], (day - first_day).days] = value
+        return matrix
+
+    @classmethod
+    def _lagged_pearson(cls, aqi, cases, max_lag):
+        """
+        r and pair counts, both (lags x zones), of aqi[:, t] against cases[:, t + lag].
+        """
+        z, d = aqi.shape
+        # Aligned on the case day: x[k, :, t] is the AQI k days before cases[:, t]
+        x = np.full((max_lag + 1, z, d), np.nan)
+        for k in range(min(max_lag + 1, d)):
+            x[k, :, k:] = aqi[:, :d - k]
+        y = np.broadcast_to(cases, x.shape)
+
+        valid = ~np.isnan(x) & ~np.isnan(y)
+        n = valid.sum(axis=2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dx = np.where(valid, x - np.where(valid, x, 0).sum(axis=2, keepdims=True) / n[..., None], 0.0)
+            dy = np.where(valid, y - np.where(valid, y, 0).sum(axis=2, keepdims=True) / n[..., None], 0.0)
+            r = (dx * dy).sum(axis=2) / np.sqrt((dx ** 2).sum(axis=2) * (dy ** 2).sum(axis=2))
+        # Constant series have no defined correlation
+        r = np.where((n >= cls.MIN_PAIRS) & np.isfinite(r), r, np.nan)
+        return r, n
+
+    @classmethod
+    def _compute(cls, last_day, days):
+        first_day = last_day - timedelta(days=days - 1)
+        zones = list(CityZone.objects.order_by('pk').values_list('pk', 'name'))
+        zone_index = {pk: i for i, (pk, _) in enumerate(zones)}
+        aqi = cls._daily(WeatherLog, 'air_quality_index', zone_index, first_day, days)
+        cases = cls._daily(HealthStats, 'respiratory_cases_active', zone_index, first_day, days)
+        r, n = cls._lagged_pearson(aqi, cases, cls.MAX_LAG)
+        return {
+            "first_day": first_day,
+            "last_day": last_day,
+            "zones": zones,
+            "r": r,
+            "pairs": n,
+        }
+
+    @classmethod
+    def results(cls, days=DEFAULT_DAYS):
+        """Cached (lags x zones) arrays for the `days` complete days ending yesterday."""
+        days = int(days)
+        if not cls.MAX_LAG + cls.MIN_PAIRS <= days <= cls.MAX_DAYS:
+            raise ValueError(f"days must be between {cls.MAX_LAG + cls.MIN_PAIRS} and {cls.MAX_DAYS}")
+
+        last_day = timezone.localdate() - timedelta(days=1)
+        key = f"lag_correlation:{last_day.isoformat()}:{days}"
+        if key in cls._results:
+            return cls._results[key]
+        with cls._lock:
+            result = cls._results.get(key) or caches[cls.RESULT_CACHE].get(key)
+            if result is None:
+                result = cls._compute(last_day, days)
+                caches[cls.RESULT_CACHE].set(key, result, cls.RESULT_TTL)
+            # Yesterday's results will never be asked for again
+            cls._results = {k: v for k, v in cls._results.items() if k.split(':')[1] == last_day.isoformat()}
+            cls._results[key] = result
+            return result
+
+    @classmethod
+    def correlate(cls, days=DEFAULT_DAYS, max_lag=MAX_LAG, zone_id=None):
+        """
+        Per zone: Pearson r between AQI and respiratory cases `lag` days later for lags
+        0..max_lag, with the number of paired days and the lag with the strongest r.
+        """
+        max_lag = int(max_lag)
+        if not 0 <= max_lag <= cls.MAX_LAG:
+            raise ValueError(f"max_lag must be between 0 and {cls.MAX_LAG}")
+        result = cls.results(days)
+        r, n = result["r"][:max_lag + 1], result["pairs"][:max_lag + 1]
+
+        zones = []
+        for i, (pk, name) in enumerate(result["zones"]):
+            if zone_id is not None and str(pk) != str(zone_id):
+                continue
+            column = r[:, i]
+            best = int(np.nanargmax(column)) if not np.isnan(column).all() else None
+            zones.append({
+                "zone_id": pk,
+                "zone_name": name,
+                "correlations": [{
+                    "lag_days": k,
+                    "r": None if np.isnan(column[k]) else round(float(column[k]), 3),
+                    "pairs": int(n[k, i]),
+                } for k in range(max_lag + 1)],
+                "best_lag_days": best,
+                "best_r": None if best is None else round(float(column[best]), 3),
+            })
+
+        defined = ~np.isnan(r)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            city = np.where(defined, r, 0.0).sum(axis=1) / defined.sum(axis=1)
+        return {
+            "from": result["first_day"].isoformat(),
+            "to": result["last_day"].isoformat(),
+            "days": int(days),
+            "lags": list(range(max_lag + 1)),
+            "city_mean_r": [None if np.isnan(v) else round(float(v), 3) for v in city],
+            "zones": zones,
+        }
@@ -0,0 +1,146 @@
+import codecs
+import json
+import re
+
+class CPCBFeedParser:
+    """
+    Incremental parser for the CPCB station feed.
+
+    The feed is one large JSON document (states -> citiesInState -> stationsInCity,
+    with a few alternative wrappers). Instead of loading it whole, the parser walks
+    containers key by key over a sliding text buffer and only decodes small values:
+    scalars and the per-station `pollutants` list, each with the C json decoder.
+    Every object carrying coordinates is yielded as a station, together with the
+    scalar fields of the objects around it (stateId, cityId, ...), so memory stays
+    at one chunk plus one station however many stations the feed has.
+    """
+    CHUNK_SIZE = 64 * 1024
+    # Containers under these keys are decoded whole instead of walked
+    LEAF_KEYS = {'pollutants'}
+    LAT_KEYS = ('latitude', 'lat')
+    LON_KEYS = ('longitude', 'lon', 'lng')
+
+    _whitespace = re.compile(r'[ \t\n\r]*')
+    _number_chars = frozenset('0123456789.eE+-')
+    _decoder = json.JSONDecoder()
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    @classmethod
+    def iter_stations(cls, chunks):
+        """Yields (station, context) for every station in an iterable of bytes/str chunks."""
+        return cls(chunks)._document()
+
+    @classmethod
+    def iter_response(cls, response):
+        """Stations from a streamed requests response (requests.get(..., stream=True))."""
+        return cls.iter_stations(response.iter_content(chunk_size=cls.CHUNK_SIZE))
+
+    @classmethod
+    def iter_file(cls, f):
+        """Stations from any binary file-like object, e.g. a urllib response."""
+        return cls.iter_stations(iter(lambda: f.read(cls.CHUNK_SIZE), b''))
+
+    @classmethod
+    def is_station(cls, obj):
+        return any(k in obj for k in cls.LAT_KEYS) and any(k in obj for k in cls.LON_KEYS)
+
+    # --- Buffer ---
+
+    def _fill(self):
+        """Appends the next chunk to the buffer, dropping what has been consumed. False at EOF."""
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._eof = True
+            text = self._utf8.decode(b'', final=True)
+        else:
+            text = self._utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Next non-whitespace character ('' at the end of the document)."""
+        while True:
+            self._pos = self._whitespace.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars):
+        c = self._peek()
+        if not c or c not in chars:
+            raise ValueError(f"CPCB feed: expected {chars!r} at offset {self._pos}, got {c!r}")
+        self._pos += 1
+        return c
+
+    def _decode(self):
+        """Decodes one complete JSON value at the current position."""
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number cut by the chunk boundary ("12" of "12.5") still decodes: only trust it
+            # once a delimiter follows
+            cut = end == len(self._buf) or (
+                not isinstance(value, (str, list, dict)) and self._buf[end] in self._number_chars)
+            if cut and not self._eof and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    # --- Walking ---
+
+    def _document(self):
+        yield from self._value({})
+        if self._peek():
+            raise ValueError("CPCB feed: trailing data after the document")
+
+    def _value(self, context):
+        c = self._peek()
+        if c == '{':
+            yield from self._object(context)
+        elif c == '[':
+            self._pos += 1
+            if self._peek() == ']':
+                self._pos += 1
+                return
+            while True:
+                yield from self._value(context)
+                if self._expect(',]') == ']':
+                    return
+        else:
+            self._decode() # a bare scalar in a walked container carries nothing
+
+    def _object(self, context):
+        self._pos += 1
+        fields = {}
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            if self._peek() != '"':
+                raise ValueError(f"CPCB feed: expected a key at offset {self._pos}")
+            key = self._decode()
+            self._expect(':')
+            if self._peek() in ('[', '{') and key not in self.LEAF_KEYS:
+                # Children see the scalars read so far (CPCB puts stateId / cityId before the lists)
+                yield from self._value({**context, **fields})
+            else:
+                fields[key] = self._decode()
+            if self._expect(',}') == '}':
+                break
+        if self.is_station(fields):
+            yield fields, context
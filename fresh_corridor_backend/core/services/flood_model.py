@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from django.conf import settings
+
+class FloodModel:
+    """
+    Raster flood-risk engine.
+
+    settings.FLOOD_GRID_DIR holds one regular lat/lon grid over the city:
+        grid.json      {"min_lat": .., "max_lat": .., "min_lon": .., "max_lon": ..}
+        elevation.npy  (rows x cols) metres, row 0 at min_lat, col 0 at min_lon
+        drainage.npy   (rows x cols) drainage capacity in mm/h
+    GeoTIFF sources can be converted once with e.g. `gdal_translate -of GTiff` +
+    `numpy.save`; no raster library is needed at runtime.
+
+    Inputs are opened as memory-mapped arrays, and the static terrain term
+    (how much a cell collects water from its neighbours) is derived once per
+    version of the grid and written as a .npy file under settings.FLOOD_CACHE_DIR,
+    so repeated scenarios only do the rain-dependent array maths.
+    """
+    RAIN_MM_AT_FULL_INTENSITY = 100 # rain_intensity=100% ~ 100 mm/h
+    STORM_HOURS = 3
+    PONDING_SCALE_MM = 50 # ponding depth at which risk reaches ~63%
+    TERRAIN_WINDOW = 5 # cells, neighbourhood used to find local depressions
+    ZONE_RADIUS_KM = 1.5 # raster cells averaged into each zone's risk
+
+    _grid = None
+    _lock = threading.Lock()
+    grid_id = None # changes when the grid files change (used in cache keys)
+
+    @classmethod
+    def grid_dir(cls):
+        return getattr(settings, 'FLOOD_GRID_DIR', None)
+
+    @classmethod
+    def cache_dir(cls):
+        return str(getattr(settings, 'FLOOD_CACHE_DIR', settings.BASE_DIR / '.cache' / 'flood'))
+
+    @staticmethod
+    def _box_mean(a, size):
+        """Mean over a size x size window around each cell (edges padded), via a summed-area table."""
+        pad = size // 2
+        padded = np.pad(a, pad, mode='edge')
+        sat = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1))
+        sat[1:, 1:] = padded.cumsum(0).cumsum(1)
+        rows, cols = a.shape
+        total = (sat[size:size + rows, size:size + cols] - sat[:rows, size:size + cols]
+                 - sat[size:size + rows, :cols] + sat[:rows, :cols])
+        return total / (size * size)
+
+    @classmethod
+    def _load(cls):
+        base = cls.grid_dir()
+        with open(os.path.join(base, 'grid.json')) as f:
+            bounds = json.load(f)
+        elevation_path = os.path.join(base, 'elevation.npy')
+        drainage_path = os.path.join(base, 'drainage.npy')
+        elevation = np.load(elevation_path, mmap_mode='r')
+        drainage = np.load(drainage_path, mmap_mode='r')
+        if elevation.shape != drainage.shape:
+            raise ValueError("elevation and drainage grids must have the same shape")
+
+        # Terrain factor: cells below their neighbourhood collect runoff (>1), ridges shed it (<1)
+        source_mtime = max(os.path.getmtime(elevation_path), os.path.getmtime(drainage_path))
+        # Named after the grid directory and its files' mtime, so an edited grid gets a new file
+        grid_key = hashlib.sha1(os.path.abspath(base).encode()).hexdigest()[:12]
+        terrain_path = os.path.join(cls.cache_dir(), f"terrain_{grid_key}_{int(source_mtime * 1e9)}.npy")
+        if not os.path.exists(terrain_path):
+            elev = np.asarray(elevation, dtype=float)
+            depression = cls._box_mean(elev, cls.TERRAIN_WINDOW) - elev
+            spread = depression.std() or 1.0
+            os.makedirs(cls.cache_dir(), exist_ok=True)
+            # Write-then-rename so concurrent workers never map a half-written file
+            tmp = f"{terrain_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                np.save(f, np.clip(1 + depression / spread, 0.2, 3.0).astype(np.float32))
+            os.replace(tmp, terrain_path)
+            for name in os.listdir(cls.cache_dir()): # derived from an older version of this grid
+                if name.startswith(f"terrain_{grid_key}_") and name.endswith('.npy') and name != os.path.basename(terrain_path):
+                    try:
+                        os.remove(os.path.join(cls.cache_dir(), name))
+                    except FileNotFoundError:
+                        pass
+        terrain = np.load(terrain_path, mmap_mode='r')
+
+        rows, cols = elevation.shape
+        cls._grid = {
+            "bounds": bounds,
+            "shape": (rows, cols),
+            "drainage": drainage,
+            "terrain": terrain,
+            "cell_lat": (bounds["max_lat"] - bounds["min_lat"]) / rows,
+            "cell_lon": (bounds["max_lon"] - bounds["min_lon"]) / cols,
+        }
+        cls.grid_id = int(source_mtime)
+        print(f"[Flood Model] Loaded {rows}x{cols} grid from {base}.")
+
+    @classmethod
+    def available(cls):
+        if not cls.grid_dir():
+            return False
+        if cls._grid is None:
+            with cls._lock:
+                if cls._grid is None:
+                    try:
+                        cls._load()
+                    except Exception as e:
+                        print(f"[Flood Model] Could not load grid: {e}")
+                        return False
+        return True
+
+    @classmethod
+    def risk_grid(cls, rain_intensity):
+        """Per-cell flood risk (0-100) for one rain_intensity (%)."""
+        g = cls._grid
+        return cls._risk(rain_intensity, g["drainage"], g["terrain"])
+
+    @classmethod
+    def _risk(cls, rain_intensity, drainage, terrain):
+        rainfall = rain_intensity / 100.0 * cls.RAIN_MM_AT_FULL_INTENSITY * cls.STORM_HOURS
+        runoff = np.maximum(0.0, rainfall - drainage * cls.STORM_HOURS)
+        ponding = runoff * terrain
+        return 100.0 * (1 - np.exp(-ponding / cls.PONDING_SCALE_MM))
+
+    @classmethod
+    def zone_risk(cls, latitudes, longitudes, rain_values):
+        """
+        Flood risk per zone and rain level, shape (zones, rains).
+        Each zone averages the cells within ZONE_RADIUS_KM of its centroid (a square
+        window); only those windows are read from the memory-mapped rasters, and every
+        rain level is scored against them in one pass.
+        NaN where the grid is unavailable or the zone lies outside it.
+        """
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        rain_values = np.atleast_1d(np.asarray(rain_values, dtype=float))
+        out = np.full((len(latitudes), len(rain_values)), np.nan)
+        if not cls.available() or not len(latitudes):
+            return out
+
+        g = cls._grid
+        b = g["bounds"]
+        rows, cols = g["shape"]
+        inside = ((latitudes >= b["min_lat"]) & (latitudes < b["max_lat"])
+                  & (longitudes >= b["min_lon"]) & (longitudes < b["max_lon"]))
+        r = ((latitudes - b["min_lat"]) / g["cell_lat"]).astype(int)
+        c = ((longitudes - b["min_lon"]) / g["cell_lon"]).astype(int)
+        half_r = max(0, int(cls.ZONE_RADIUS_KM / 111.0 / g["cell_lat"]))
+        half_c = max(0, int(cls.ZONE_RADIUS_KM / (111.0 * np.cos(np.radians(b["min_lat"]))) / g["cell_lon"]))
+        r0, r1 = np.clip(r - half_r, 0, rows), np.clip(r + half_r + 1, 0, rows)
+        c0, c1 = np.clip(c - half_c, 0, cols), np.clip(c + half_c + 1, 0, cols)
+
+        rain_col = rain_values[:, None]
+        for i in np.flatnonzero(inside):
+            window = np.s_[r0[i]:r1[i], c0[i]:c1[i]]
+            drainage = np.asarray(g["drainage"][window], dtype=float).ravel()
+            terrain = np.asarray(g["terrain"][window], dtype=float).ravel()
+            out[i] = cls._risk(rain_col, drainage, terrain).mean(axis=1)
+        return out
+
+    @classmethod
+    def zone_risk_curve(cls, latitude, longitude, max_rain, levels=33):
+        """(rain_levels, risk) for one zone, for np.interp over many sampled rain values; None if unavailable."""
+        rain_levels = np.linspace(0.0, max(float(max_rain), 1.0), levels)
+        risk = cls.zone_risk([latitude], [longitude], rain_levels)[0]
+        if np.isnan(risk).any():
+            return None
+        return rain_levels, risk
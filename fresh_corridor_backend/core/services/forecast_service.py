@@ -0,0 +1,214 @@
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from core.models import Hospital, HospitalCapacityRollup, ServiceState
+from core.services.capacity_service import CapacityHistoryService
+
+class IcuForecastService:
+    """
+    Short-term ICU occupancy forecasts for every hospital.
+
+    Each hospital gets a damped Holt (level + trend) model over its hourly
+    HospitalCapacityRollup series. All hospitals and a small grid of smoothing
+    parameters are advanced together as (params x hospitals) NumPy arrays, and
+    every hospital uses the parameter pair with the lowest one-step-ahead error.
+
+    The state only moves forward: each update() consumes the hours completed since
+    the last one, so a new tick costs one step, not a refit. An hour counts as complete
+    once a compaction run that started after it ended has finished, and hours without
+    a rollup still step the model (with no reading). State is kept in the database
+    (ServiceState) so `compact_capacity` and the web workers advance the same model.
+    """
+    ALPHAS = (0.2, 0.5, 0.8) # level smoothing
+    BETAS = (0.05, 0.2, 0.5) # trend smoothing
+    PHI = 0.95 # trend damping, keeps long horizons from running away
+    FIT_WINDOW = timedelta(days=30) # history used when the model starts cold
+    HOUR = timedelta(hours=1)
+    MAX_HORIZON_HOURS = 48
+    STATE_KEY = 'icu_forecast:state'
+
+    _state = None
+    _state_saved_at = None # updated_at of the ServiceState row _state was last read from or written to
+    _predictions = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def _params(cls):
+        alpha, beta = np.meshgrid(cls.ALPHAS, cls.BETAS, indexing='ij')
+        return alpha.ravel()[:, None], beta.ravel()[:, None]
+
+    @classmethod
+    def _empty_state(cls):
+        g = len(cls.ALPHAS) * len(cls.BETAS)
+        return {
+            "hospital_ids": [],
+            "level": np.zeros((g, 0)),
+            "trend": np.zeros((g, 0)),
+            "sse": np.zeros((g, 0)),
+            "observations": np.zeros(0, dtype=np.int64),
+            "last_bucket": None,
+        }
+
+    @staticmethod
+    def _dump(state):
+        return {
+            "hospital_ids": state["hospital_ids"],
+            "level": state["level"].tolist(),
+            "trend": state["trend"].tolist(),
+            "sse": state["sse"].tolist(),
+            "observations": state["observations"].tolist(),
+            "last_bucket": state["last_bucket"].isoformat() if state["last_bucket"] else None,
+        }
+
+    @classmethod
+    def _load(cls, value):
+        g = len(cls.ALPHAS) * len(cls.BETAS)
+        return {
+            "hospital_ids": value["hospital_ids"],
+            "level": np.array(value["level"], dtype=float).reshape(g, -1),
+            "trend": np.array(value["trend"], dtype=float).reshape(g, -1),
+            "sse": np.array(value["sse"], dtype=float).reshape(g, -1),
+            "observations": np.array(value["observations"], dtype=np.int64),
+            "last_bucket": datetime.fromisoformat(value["last_bucket"]) if value["last_bucket"] else None,
+        }
+
+    @classmethod
+    def _stored_state(cls):
+        """The state saved by any process, or None when it is what we already hold."""
+        rows = ServiceState.objects.filter(key=cls.STATE_KEY)
+        if cls._state_saved_at is not None:
+            rows = rows.filter(updated_at__gt=cls._state_saved_at)
+        row = rows.values_list('value', 'updated_at').first()
+        if row is None:
+            return None
+        cls._state_saved_at = row[1]
+        return cls._load(row[0])
+
+    @classmethod
+    def _grow(cls, state, hospital_ids):
+        """Adds zeroed model columns for hospitals seen for the first time."""
+        new = [h for h in hospital_ids if h not in set(state["hospital_ids"])]
+        if new:
+            g = state["level"].shape[0]
+            pad = np.zeros((g, len(new)))
+            state["hospital_ids"] = state["hospital_ids"] + new
+            state["level"] = np.hstack([state["level"], pad])
+            state["trend"] = np.hstack([state["trend"], pad])
+            state["sse"] = np.hstack([state["sse"], pad])
+            state["observations"] = np.concatenate([state["observations"], np.zeros(len(new), dtype=np.int64)])
+
+    @classmethod
+    def _step(cls, state, y):
+        """One hour for every model: y holds each hospital's occupied ICU beds (NaN = no reading)."""
+        alpha, beta = cls._params()
+        level, trend, n = state["level"], state["trend"], state["observations"]
+        seen = ~np.isnan(y)
+        first = seen & (n == 0)
+
+        predicted = level + cls.PHI * trend
+        error = np.where(seen, y - predicted, 0.0)
+        # Skip the first two readings: the error is meaningless before a trend exists
+        state["sse"] += np.where(seen & (n >= 2), error ** 2, 0.0)
+        new_level = np.where(seen, predicted + alpha * error, predicted)
+        new_trend = np.where(seen & (n >= 1), beta * (new_level - level) + (1 - beta) * cls.PHI * trend, cls.PHI * trend)
+
+        state["level"] = np.where(first, np.nan_to_num(y), new_level)
+        state["trend"] = np.where(first, 0.0, new_trend)
+        state["observations"] = n + seen
+
+    @classmethod
+    def update(cls):
+        """Advances the models through every complete hour not consumed yet."""
+        with cls._lock:
+            # Continue from whichever copy (ours or another process's) has seen more hours
+            candidates = [s for s in (cls._state, cls._stored_state()) if s is not None]
+            state = max(candidates, key=lambda s: s["last_bucket"].timestamp() if s["last_bucket"] else 0,
+                        default=None) or cls._empty_state()
+
+            # Only hours that ended before the last compaction run started are final
+            compacted = CapacityHistoryService.compacted_through()
+            if compacted is not None:
+                last_complete = compacted.replace(minute=0, second=0, microsecond=0) - cls.HOUR
+                since = state["last_bucket"] or last_complete - cls.FIT_WINDOW
+                rows = []
+                if since < last_complete:
+                    rows = list(HospitalCapacityRollup.objects.filter(
+                        resolution='1h', bucket_start__gt=since, bucket_start__lte=last_complete
+                    ).order_by('bucket_start').values_list('hospital_id', 'bucket_start', 'icu_occupied_avg'))
+                # Continue right after the last consumed hour (a cold start begins at the first reading);
+                # hours nobody logged still advance the models, without an observation
+                first = state["last_bucket"] + cls.HOUR if state["last_bucket"] else (rows[0][1] if rows else None)
+                if first is not None and first <= last_complete:
+                    cls._grow(state, sorted({r[0] for r in rows}))
+                    column = {h: i for i, h in enumerate(state["hospital_ids"])}
+                    y = np.full((int((last_complete - first) / cls.HOUR) + 1, len(column)), np.nan)
+                    for hospital_id, bucket, occupied in rows:
+                        y[int((bucket - first) / cls.HOUR), column[hospital_id]] = occupied
+                    for t in range(len(y)):
+                        cls._step(state, y[t])
+                    state["last_bucket"] = last_complete
+                    row, _ = ServiceState.objects.update_or_create(key=cls.STATE_KEY, defaults={'value': cls._dump(state)})
+                    cls._state_saved_at = row.updated_at
+
+            cls._state = state
+            return state
+
+    @classmethod
+    def forecast(cls, horizon_hours=24):
+        """
+        Per hospital: predicted occupied ICU beds for each hour up to horizon_hours and the
+        first hour at which the ICU is predicted full. Cached until the next hourly tick.
+        """
+        horizon_hours = int(horizon_hours)
+        if not 1 <= horizon_hours <= cls.MAX_HORIZON_HOURS:
+            raise ValueError(f"hours must be between 1 and {cls.MAX_HORIZON_HOURS}")
+
+        state = cls.update()
+        key = (state["last_bucket"], horizon_hours)
+        if key in cls._predictions:
+            return cls._predictions[key]
+        if any(k[0] != state["last_bucket"] for k in cls._predictions):
+            cls._predictions = {} # a new hour arrived, older predictions are stale
+
+        hospitals = {pk: (name, total, occupied) for pk, name, total, occupied in
+                     Hospital.objects.values_list('pk', 'name', 'total_beds_icu', 'occupied_beds_icu')}
+        ids = [h for h in state["hospital_ids"] if h in hospitals]
+        columns = [state["hospital_ids"].index(h) for h in ids]
+        results = []
+        if columns:
+            cols = np.array(columns)
+            best = np.argmin(state["sse"][:, cols], axis=0)
+            level = state["level"][best, cols]
+            trend = state["trend"][best, cols]
+            # Damped trend: h-step forecast = level + (phi + phi^2 + ... + phi^h) * trend
+            steps = np.cumsum(cls.PHI ** np.arange(1, horizon_hours + 1))
+            totals = np.array([hospitals[h][1] for h in ids], dtype=float)
+            path = np.clip(level[:, None] + steps[None, :] * trend[:, None], 0, totals[:, None])
+            full = path >= totals[:, None] - 0.5
+            hours_to_full = np.where(full.any(axis=1), full.argmax(axis=1) + 1, -1)
+
+            alpha, beta = cls._params()
+            for i, hospital_id in enumerate(ids):
+                name, total, occupied = hospitals[hospital_id]
+                results.append({
+                    "hospital_id": hospital_id,
+                    "name": name,
+                    "icu_total": total,
+                    "icu_occupied_now": occupied,
+                    "predicted_icu_occupied": [round(float(v), 1) for v in path[i]],
+                    "hours_until_full": int(hours_to_full[i]) if hours_to_full[i] > 0 else None,
+                    "model": {
+                        "alpha": float(alpha[best[i], 0]),
+                        "beta": float(beta[best[i], 0]),
+                        "hours_of_history": int(state["observations"][cols[i]]),
+                    },
+                })
+        results.sort(key=lambda r: (r["hours_until_full"] is None, r["hours_until_full"] or 0))
+
+        payload = {
+            "as_of": state["last_bucket"].isoformat() if state["last_bucket"] else None,
+            "horizon_hours": horizon_hours,
+            "hospitals": results,
+        }
+        cls._predictions[key] = payload
+        return payload
@@ -0,0 +1,124 @@
+import threading
+import numpy as np
+from django.db.models import Sum
+from core.models import CityZone, WeatherLog, AgriSupply
+from core.serializers import CityZoneSerializer
+from core.utils import latest_for_zone, haversine_many
+from core.services.cache_service import ScenarioCache
+from core.services.hospital_index import HospitalIndex
+
+class HealthDesertService:
+    """
+    Scores every zone for "health desert" conditions: low income, poor air,
+    far from the nearest hospital and little fresh food nearby.
+
+    The per-zone features (income, latest AQI, nearest-hospital distance from the
+    HospitalIndex, zone-to-zone distances and food supply per zone) are computed in
+    one pass and kept in memory until core.signals bumps the 'health_deserts' (zones,
+    weather, supply) or 'hospitals' version. Thresholds are applied to the cached
+    arrays on every request, so tuning them never triggers a recompute.
+    """
+    VERSION_SCOPE = 'health_deserts'
+    INCOME_SCORES = {'Low': 1.0, 'Medium': 0.5, 'High': 0.0}
+    DEFAULTS = {
+        'income': 'Low', # comma-separated tiers that can be flagged
+        'aqi_threshold': 100, # 'Poor' air
+        'max_hospital_km': 5, # catchment radius of the nearest hospital
+        'food_radius_km': 5, # supply logged from zones within this distance counts as local
+        'min_food_kg': 1,
+    }
+    # Weights of the 0-100 desert score
+    WEIGHTS = {'income': 0.25, 'aqi': 0.3, 'hospital': 0.25, 'food': 0.2}
+    FOOD_SCALE_KG = 500 # food access is halved at this much local supply
+
+    _features = None
+    _version = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def features(cls):
+        version = (ScenarioCache.data_version(cls.VERSION_SCOPE), ScenarioCache.data_version(HospitalIndex.VERSION_SCOPE))
+        if cls._features is None or cls._version != version:
+            with cls._lock:
+                if cls._features is None or cls._version != version:
+                    cls._features = cls._compute_features()
+                    cls._version = version
+        return cls._features
+
+    @classmethod
+    def _compute_features(cls):
+        zones = list(CityZone.objects.order_by('pk').annotate(
+            aqi=latest_for_zone(WeatherLog, 'air_quality_index')
+        ))
+        supply = dict(
+            AgriSupply.objects.values('origin_zone').annotate(total=Sum('quantity_kg'))
+            .values_list('origin_zone', 'total')
+        )
+        lat = np.array([z.latitude for z in zones], dtype=float)
+        lon = np.array([z.longitude for z in zones], dtype=float)
+
+        nearest = []
+        for z in zones:
+            hit = HospitalIndex.nearest(z.latitude, z.longitude, 1)
+            nearest.append(hit[0][1] if hit else np.inf)
+
+        return {
+            "zones": CityZoneSerializer(zones, many=True).data,
+            "income_tier": [z.average_income_tier for z in zones],
+            "aqi": np.array([np.nan if z.aqi is None else z.aqi for z in zones], dtype=float),
+            "hospital_km": np.array(nearest, dtype=float),
+            "supply_kg": np.array([supply.get(z.pk) or 0.0 for z in zones], dtype=float),
+            # Zone x zone distances, for food within any radius
+            "distance_km": np.array([haversine_many(a, b, lat, lon) for a, b in zip(lat, lon)]).reshape(len(zones), len(zones)),
+        }
+
+    @classmethod
+    def evaluate(cls, params=None):
+        """
+        All zones with their desert score (0-100) and factors, worst first.
+        params: overrides of DEFAULTS. A zone is flagged (is_desert) when its income tier
+        is listed, AQI exceeds aqi_threshold and it either has under min_food_kg of food
+        within food_radius_km or no hospital within max_hospital_km.
+        """
+        p = {**cls.DEFAULTS, **{k: v for k, v in (params or {}).items() if k in cls.DEFAULTS}}
+        tiers = {t.strip() for t in str(p['income']).split(',') if t.strip()}
+        aqi_threshold = float(p['aqi_threshold'])
+        max_hospital_km = float(p['max_hospital_km'])
+        food_radius_km = float(p['food_radius_km'])
+        min_food_kg = float(p['min_food_kg'])
+
+        f = cls.features()
+        if not f["zones"]:
+            return []
+
+        income = np.array([cls.INCOME_SCORES.get(t, 0.5) for t in f["income_tier"]])
+        aqi = f["aqi"]
+        food_kg = (f["distance_km"] <= food_radius_km) @ f["supply_kg"]
+        hospital_km = f["hospital_km"]
+
+        components = {
+            'income': income,
+            'aqi': np.clip((np.nan_to_num(aqi, nan=50) - 50) / 250, 0, 1),
+            'hospital': np.clip(hospital_km / max(2 * max_hospital_km, 1e-9), 0, 1),
+            'food': 1 / (1 + food_kg / cls.FOOD_SCALE_KG),
+        }
+        score = 100 * sum(cls.WEIGHTS[k] * v for k, v in components.items())
+
+        eligible = np.array([t in tiers for t in f["income_tier"]])
+        no_food = food_kg < min_food_kg
+        no_hospital = hospital_km > max_hospital_km
+        is_desert = eligible & (np.nan_to_num(aqi, nan=-np.inf) > aqi_threshold) & (no_food | no_hospital)
+
+        results = []
+        for i in np.argsort(-score, kind='stable'):
+            results.append({
+                **f["zones"][i],
+                'desert_score': round(float(score[i]), 1),
+                'is_desert': bool(is_desert[i]),
+                'factors': {
+                    'aqi': None if np.isnan(aqi[i]) else int(aqi[i]),
+                    'nearest_hospital_km': None if np.isinf(hospital_km[i]) else round(float(hospital_km[i]), 2),
+                    'food_supply_kg': round(float(food_kg[i]), 1),
+                }
+            })
+        return results
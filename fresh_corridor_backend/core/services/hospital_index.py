@@ -0,0 +1,296 @@
+import heapq
+import math
+import threading
+import time
+import numpy as np
+from django.db.models import Max
+from core.models import Hospital, HospitalCapacityLog
+from core.services.cache_service import ScenarioCache
+
+class HospitalIndex:
+    """
+    In-memory KD-tree over hospital locations for radius and k-nearest queries.
+
+    Points are lat/lon mapped onto 3D unit vectors, where straight-line (chord)
+    distance grows monotonically with great-circle distance, so the tree can use
+    plain axis-aligned boxes with no wrap-around or pole special cases.
+    Hospitals sit at their zone's coordinates.
+
+    The tree is rebuilt lazily when the 'hospitals' data version changes;
+    core.signals bumps it when a hospital is added, removed or moved to another
+    zone, or a zone is saved.
+
+    Live capacity (free ICU / general beds, oxygen) is kept in arrays aligned with
+    the tree, along with the maximum of each value under every node, so filtered
+    searches skip whole subtrees with no qualifying hospital. Saves in this process
+    are applied right away; saves elsewhere (e.g. simulate_health) bump the
+    'hospital_capacity' version, and at most every CAPACITY_RELOAD_INTERVAL seconds
+    the HospitalCapacityLog rows written since the last sync are replayed, so only
+    hospitals that changed are touched. Updates swap in new capacity arrays under the
+    index lock, so a query always reads one consistent snapshot.
+    """
+    LEAF_SIZE = 16
+    EARTH_RADIUS_KM = 6371.0
+    VERSION_SCOPE = 'hospitals'
+    CAPACITY_SCOPE = 'hospital_capacity'
+    CAPACITY_RELOAD_INTERVAL = 1.0 # seconds
+    CAPACITY_FIELDS = ('total_beds_icu', 'occupied_beds_icu', 'total_beds_general',
+                       'occupied_beds_general', 'oxygen_supply_level')
+
+    _tree = None
+    _version = None
+    _capacity_version = None
+    _capacity_checked_at = 0.0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _unit_vectors(lat, lon):
+        lat, lon = np.radians(lat), np.radians(lon)
+        return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    @classmethod
+    def _chord(cls, km):
+        """Squared chord length matching a surface distance (inf when unbounded)."""
+        if km is None:
+            return math.inf
+        return (2 * math.sin(min(km / cls.EARTH_RADIUS_KM, math.pi) / 2)) ** 2
+
+    @classmethod
+    def _km(cls, chord_sq):
+        return 2 * cls.EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, np.sqrt(chord_sq) / 2))
+
+    @staticmethod
+    def _capacity_row(total_icu, occupied_icu, total_general, occupied_general, oxygen):
+        """(free ICU beds, free general beds, oxygen %) as stored in the capacity arrays."""
+        return (max(0, total_icu - occupied_icu), max(0, total_general - occupied_general), oxygen)
+
+    # --- Build ---
+
+    @classmethod
+    def _build(cls):
+        # Read first: a save racing the build is replayed by the next sync
+        log_pk = HospitalCapacityLog.objects.aggregate(m=Max('pk'))['m'] or 0
+        rows = list(Hospital.objects.order_by('pk').values_list(
+            'pk', 'zone__latitude', 'zone__longitude', *cls.CAPACITY_FIELDS
+        ))
+        ids = np.array([r[0] for r in rows], dtype=np.int64)
+        points = cls._unit_vectors(np.array([r[1] for r in rows], dtype=float),
+                                   np.array([r[2] for r in rows], dtype=float)).reshape(-1, 3)
+        capacity = np.array([cls._capacity_row(*r[3:]) for r in rows], dtype=float).reshape(-1, 3)
+
+        # Nodes are stored in flat lists; leaves own a contiguous [lo, hi) slice of the
+        # reordered points, so a leaf scan is a single vectorized distance computation.
+        lo_, hi_, left_, right_, parent_, box_min, box_max = [], [], [], [], [], [], []
+
+        def build(lo, hi, parent=-1):
+            node = len(lo_)
+            lo_.append(lo); hi_.append(hi); left_.append(-1); right_.append(-1); parent_.append(parent)
+            segment = points[lo:hi]
+            box_min.append(segment.min(axis=0) if hi > lo else np.zeros(3))
+            box_max.append(segment.max(axis=0) if hi > lo else np.zeros(3))
+            if hi - lo > cls.LEAF_SIZE:
+                dim = int(np.argmax(box_max[node] - box_min[node]))
+                mid = (lo + hi) // 2
+                order = lo + np.argpartition(segment[:, dim], mid - lo)
+                points[lo:hi], ids[lo:hi], capacity[lo:hi] = points[order], ids[order], capacity[order]
+                left_[node] = build(lo, mid, node)
+                right_[node] = build(mid, hi, node)
+            return node
+
+        build(0, len(ids))
+        tree = {
+            "log_pk": log_pk, # newest HospitalCapacityLog row reflected in "capacity"
+            "ids": ids,
+            "position": {int(h): i for i, h in enumerate(ids)},
+            "points": points,
+            "lo": lo_, "hi": hi_, "left": left_, "right": right_, "parent": parent_,
+            "box_min": np.array(box_min), "box_max": np.array(box_max),
+            "capacity": capacity,
+            "node_max": np.zeros((len(lo_), 3)),
+            "leaf_of": np.zeros(len(ids), dtype=np.int64), # position -> leaf node
+        }
+        for node, left in enumerate(left_):
+            if left < 0:
+                tree["leaf_of"][lo_[node]:hi_[node]] = node
+        cls._recompute_node_max(tree)
+        return tree
+
+    @staticmethod
+    def _recompute_node_max(tree):
+        """Per-node capacity maxima, bottom-up (children always have higher node numbers)."""
+        node_max, capacity = tree["node_max"], tree["capacity"]
+        for node in range(len(node_max) - 1, -1, -1):
+            left = tree["left"][node]
+            if left < 0:
+                lo, hi = tree["lo"][node], tree["hi"][node]
+                node_max[node] = capacity[lo:hi].max(axis=0) if hi > lo else 0
+            else:
+                node_max[node] = np.maximum(node_max[left], node_max[tree["right"][node]])
+
+    @classmethod
+    def tree(cls):
+        """The current tree, rebuilt first if hospitals changed since it was built."""
+        version = ScenarioCache.data_version(cls.VERSION_SCOPE)
+        if cls._tree is None or cls._version != version:
+            with cls._lock:
+                if cls._tree is None or cls._version != version:
+                    cls._tree = cls._build()
+                    cls._version = version
+                    cls._capacity_version = ScenarioCache.data_version(cls.CAPACITY_SCOPE)
+        return cls._tree
+
+    # --- Capacity sync ---
+
+    @staticmethod
+    def _with_capacity(tree, changes):
+        """Copy of `tree` with {position: capacity row} applied and the maxima above those positions fixed."""
+        capacity, node_max = tree["capacity"].copy(), tree["node_max"].copy()
+        dirty = set()
+        for pos, row in changes.items():
+            capacity[pos] = row
+            node = int(tree["leaf_of"][pos])
+            while node >= 0 and node not in dirty: # an ancestor already marked has its own ancestors marked
+                dirty.add(node)
+                node = tree["parent"][node]
+        # Children always have higher node numbers than their parent, so they are fixed first
+        for node in sorted(dirty, reverse=True):
+            left = tree["left"][node]
+            if left < 0:
+                node_max[node] = capacity[tree["lo"][node]:tree["hi"][node]].max(axis=0)
+            else:
+                node_max[node] = np.maximum(node_max[left], node_max[tree["right"][node]])
+        return {**tree, "capacity": capacity, "node_max": node_max}
+
+    @classmethod
+    def update_capacity(cls, hospital):
+        """Applies one saved Hospital's bed counts (called from core.signals)."""
+        with cls._lock:
+            tree = cls._tree
+            pos = tree["position"].get(hospital.pk) if tree is not None else None
+            if pos is None:
+                return
+            row = cls._capacity_row(*(getattr(hospital, f) for f in cls.CAPACITY_FIELDS))
+            cls._tree = cls._with_capacity(tree, {pos: row})
+
+    @classmethod
+    def _synced_tree(cls):
+        """The current tree, after replaying bed counts other processes have saved since the last check."""
+        tree = cls.tree()
+        now = time.time()
+        if now - cls._capacity_checked_at < cls.CAPACITY_RELOAD_INTERVAL:
+            return tree
+        cls._capacity_checked_at = now
+        version = ScenarioCache.data_version(cls.CAPACITY_SCOPE)
+        if version == cls._capacity_version:
+            return tree
+        with cls._lock:
+            tree = cls._tree
+            rows = HospitalCapacityLog.objects.filter(pk__gt=tree["log_pk"]).order_by('pk').values_list(
+                'pk', 'hospital_id', *cls.CAPACITY_FIELDS
+            )
+            changes, log_pk = {}, tree["log_pk"]
+            for pk, hospital_id, *values in rows:
+                log_pk = pk
+                pos = tree["position"].get(hospital_id)
+                if pos is not None: # hospitals added since the build come with a version bump and a rebuild
+                    changes[pos] = cls._capacity_row(*values) # the newest row per hospital wins
+            if changes:
+                tree = cls._with_capacity(tree, changes)
+            cls._tree = {**tree, "log_pk": log_pk}
+            cls._capacity_version = version
+            return cls._tree
+
+    # --- Queries ---
+
+    @classmethod
+    def _search(cls, tree, q, k, max_chord_sq, node_ok=None, point_mask=None):
+        """
+        Best-first traversal: nodes are visited in order of their box's distance to q and
+        the walk stops once the next box is farther than the k-th best hit (or the radius).
+        node_ok(node) can skip whole subtrees; point_mask(lo, hi) filters a leaf's points.
+        Returns [(chord_sq, position)] nearest first.
+        """
+        best = [] # max-heap via negated distances, holds at most k hits
+        bound = max_chord_sq
+        heap = [(0.0, 0)]
+        while heap:
+            box_d, node = heapq.heappop(heap)
+            if box_d > bound:
+                break
+            left = tree["left"][node]
+            if left < 0:
+                lo, hi = tree["lo"][node], tree["hi"][node]
+                d = ((tree["points"][lo:hi] - q) ** 2).sum(axis=1)
+                ok = d <= bound
+                if point_mask is not None:
+                    ok &= point_mask(lo, hi)
+                for pos in np.flatnonzero(ok):
+                    item = (-float(d[pos]), lo + int(pos))
+                    if k is None or len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                if k is not None and len(best) == k:
+                    bound = min(bound, -best[0][0])
+                continue
+            for child in (left, tree["right"][node]):
+                if node_ok is not None and not node_ok(child):
+                    continue
+                gap = np.maximum(0.0, np.maximum(tree["box_min"][child] - q, q - tree["box_max"][child]))
+                child_d = float((gap ** 2).sum())
+                if child_d <= bound:
+                    heapq.heappush(heap, (child_d, child))
+        return sorted((-d, pos) for d, pos in best)
+
+    @classmethod
+    def nearest(cls, lat, lon, k=None, radius_km=None):
+        """
+        [(hospital_id, distance_km)] nearest first: the k closest (all when k is None),
+        optionally limited to radius_km.
+        """
+        tree = cls.tree()
+        if not len(tree["ids"]) or (k is not None and k <= 0):
+            return []
+        q = cls._unit_vectors(np.array([lat], dtype=float), np.array([lon], dtype=float))[0]
+        hits = cls._search(tree, q, k, cls._chord(radius_km))
+        return [(int(tree["ids"][pos]), float(cls._km(d))) for d, pos in hits]
+
+    @classmethod
+    def within(cls, lat, lon, radius_km):
+        return cls.nearest(lat, lon, None, radius_km)
+
+    @classmethod
+    def distance_matrix(cls, lat, lon):
+        """
+        Surface distance in km from each (lat[i], lon[i]) to every hospital, with live
+        capacity synced first. Returns (tree, distances); columns follow tree["ids"]
+        and tree["capacity"].
+        """
+        tree = cls._synced_tree()
+        q = cls._unit_vectors(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)).reshape(-1, 3)
+        chord_sq = np.maximum(0.0, 2 - 2 * (q @ tree["points"].T))
+        return tree, cls._km(chord_sq)
+
+    @classmethod
+    def nearest_available(cls, lat, lon, k=5, min_icu=1, min_general=0, min_oxygen=0, radius_km=None):
+        """
+        [(hospital_id, distance_km, free_icu, free_general, oxygen)] for the k closest hospitals
+        with at least min_icu free ICU beds, min_general free general beds and min_oxygen % oxygen.
+        """
+        tree = cls._synced_tree()
+        if not len(tree["ids"]) or k <= 0:
+            return []
+        need = np.array([min_icu, min_general, min_oxygen], dtype=float)
+        node_max, capacity = tree["node_max"], tree["capacity"]
+        if (node_max[0] < need).any():
+            return []
+        q = cls._unit_vectors(np.array([lat], dtype=float), np.array([lon], dtype=float))[0]
+        hits = cls._search(
+            tree, q, k, cls._chord(radius_km),
+            node_ok=lambda node: (node_max[node] >= need).all(),
+            point_mask=lambda lo, hi: (capacity[lo:hi] >= need).all(axis=1),
+        )
+        return [
+            (int(tree["ids"][pos]), float(cls._km(d)), int(capacity[pos][0]), int(capacity[pos][1]), int(capacity[pos][2]))
+            for d, pos in hits
+        ]
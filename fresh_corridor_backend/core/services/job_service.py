@@ -0,0 +1,187 @@
+import json
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import connection
+from django.utils import timezone
+from core.models import CityZone, SimulationJob
+from core.services.simulation_service import SimulationService
+
+class JobService:
+    """
+    Database-backed queue for long simulations.
+
+    The API only inserts a 'queued' SimulationJob row and returns its id; the
+    `simulation_worker` management command claims rows with a conditional UPDATE
+    (so several workers never run the same job), executes them on a thread pool
+    and writes progress and the JSON result back to the row for polling.
+    """
+    KINDS = [k for k, _ in SimulationJob.KIND_CHOICES]
+    BATCH_ZONES_PER_STEP = 25 # batch sweeps are run in zone slices to report progress
+    STALE_AFTER = timedelta(hours=1) # 'running' jobs older than this are assumed orphaned
+    REQUEUE_INTERVAL = 60 # seconds between the worker's checks for orphaned jobs
+
+    @staticmethod
+    def submit(kind, params):
+        if kind not in JobService.KINDS:
+            raise ValueError(f"kind must be one of {', '.join(JobService.KINDS)}")
+        if kind == 'batch':
+            JobService._check_batch_size(params)
+        else:
+            try:
+                zone_exists = CityZone.objects.filter(pk=int(params.get('zone_id'))).exists()
+            except (TypeError, ValueError):
+                zone_exists = False
+            if not zone_exists:
+                raise ValueError("zone_id must reference an existing zone")
+        return SimulationJob.objects.create(kind=kind, params=json.dumps(params))
+
+    @staticmethod
+    def _check_batch_size(params):
+        """
+        Rejects a batch whose whole zone x rain x traffic grid exceeds MAX_BATCH_CELLS at
+        submit time; the worker runs it in slices, which would each pass the limit alone.
+        """
+        zones = params.get('zones', 'all')
+        if zones != 'all' and not isinstance(zones, list):
+            raise ValueError("zones must be a list of ids or 'all'")
+        try:
+            axes = [np.atleast_1d(np.asarray(params.get(name, [0]), dtype=float)) for name in ('rain_intensity', 'traffic_load')]
+        except (TypeError, ValueError):
+            axes = None
+        if axes is None or any(axis.ndim != 1 for axis in axes):
+            raise ValueError("rain_intensity and traffic_load must be flat lists of numbers")
+        try:
+            zone_count = CityZone.objects.count() if zones == 'all' else CityZone.objects.filter(pk__in=zones).count()
+        except (TypeError, ValueError):
+            raise ValueError("zones must be a list of ids or 'all'")
+        cells = zone_count * axes[0].size * axes[1].size
+        if cells > SimulationService.MAX_BATCH_CELLS:
+            raise ValueError(f"Grid too large ({cells} cells, max {SimulationService.MAX_BATCH_CELLS})")
+
+    @staticmethod
+    def status_payload(job):
+        payload = {
+            "job_id": job.pk,
+            "kind": job.kind,
+            "status": job.status,
+            "progress": round(job.progress, 3),
+            "created_at": job.created_at.isoformat(),
+            "started_at": job.started_at.isoformat() if job.started_at else None,
+            "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        }
+        if job.status == 'done':
+            payload["result"] = json.loads(job.result)
+        elif job.status == 'failed':
+            payload["error"] = job.error
+        return payload
+
+    # --- Worker side ---
+
+    @staticmethod
+    def claim_next():
+        """Atomically moves the oldest queued job to 'running'; returns it or None."""
+        for pk in SimulationJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True)[:10]:
+            claimed = SimulationJob.objects.filter(pk=pk, status='queued').update(
+                status='running', started_at=timezone.now()
+            )
+            if claimed:
+                return SimulationJob.objects.get(pk=pk)
+        return None
+
+    @staticmethod
+    def requeue_stale(exclude=()):
+        """Puts jobs left 'running' by a crashed worker back in the queue (except the ids in exclude)."""
+        return SimulationJob.objects.filter(
+            status='running', started_at__lt=timezone.now() - JobService.STALE_AFTER
+        ).exclude(pk__in=list(exclude)).update(status='queued', progress=0.0, started_at=None)
+
+    @staticmethod
+    def _set_progress(job_id, fraction):
+        SimulationJob.objects.filter(pk=job_id, status='running').update(progress=min(1.0, fraction))
+
+    @staticmethod
+    def _execute(job):
+        params = json.loads(job.params)
+        progress = lambda fraction: JobService._set_progress(job.pk, fraction)
+
+        if job.kind == 'what_if':
+            return SimulationService.run_what_if_simulation(params['zone_id'], params)
+
+        if job.kind == 'monte_carlo':
+            return SimulationService.run_monte_carlo_simulation(params['zone_id'], params, progress)
+
+        if job.kind == 'timeline':
+            hours = int(params.get('hours', 24))
+            steps = []
+            for step in SimulationService.run_timeline(params['zone_id'], params, hours):
+                steps.append(step)
+                progress(len(steps) / (hours + 1))
+            return {"status": "success", "zone_id": params['zone_id'], "steps": steps}
+
+        # batch: same result shape as run_batch_simulation, computed in zone slices
+        zones = params.get('zones', 'all')
+        existing = CityZone.objects.order_by('pk')
+        if zones != 'all':
+            existing = existing.filter(pk__in=zones)
+        # Unknown ids are dropped up front, as the sync endpoint does, so no slice comes up empty
+        zone_ids = list(existing.values_list('pk', flat=True))
+        if not zone_ids:
+            return {"status": "error", "message": "No matching zones"}
+        step = JobService.BATCH_ZONES_PER_STEP
+        merged = None
+        for start in range(0, len(zone_ids), step):
+            part = SimulationService.run_batch_simulation(
+                zone_ids[start:start + step], params.get('rain_intensity', [0]), params.get('traffic_load', [0])
+            )
+            if part['status'] != 'success':
+                return part
+            if merged is None:
+                merged = part
+            else:
+                for name in ('zones', 'traffic_congestion_level', 'ambulance_response_time_min', 'flood_risk_probability'):
+                    merged[name].extend(part[name])
+                merged['shape'][0] += part['shape'][0]
+            progress((start + step) / len(zone_ids))
+        return merged
+
+    @staticmethod
+    def run_job(job):
+        try:
+            result = JobService._execute(job)
+            if result.get('status') == 'error':
+                raise ValueError(result.get('message'))
+            SimulationJob.objects.filter(pk=job.pk).update(
+                status='done', progress=1.0, result=json.dumps(result), finished_at=timezone.now()
+            )
+        except Exception as e:
+            SimulationJob.objects.filter(pk=job.pk).update(
+                status='failed', error=str(e), finished_at=timezone.now()
+            )
+        finally:
+            connection.close()
+
+    @staticmethod
+    def work(workers=2, poll_interval=1.0, once=False):
+        """
+        Worker loop: keeps up to `workers` jobs running in threads, polling the table
+        when idle. once=True drains the current queue and returns.
+        """
+        running = {} # future -> job id
+        requeued_at = 0.0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                running = {f: pk for f, pk in running.items() if not f.done()}
+                # Also catches jobs orphaned by another worker that crashed while this one runs
+                if time.time() - requeued_at >= JobService.REQUEUE_INTERVAL:
+                    JobService.requeue_stale(exclude=running.values())
+                    requeued_at = time.time()
+                job = JobService.claim_next() if len(running) < workers else None
+                if job is not None:
+                    print(f"[Job Worker] Running {job}")
+                    running[pool.submit(JobService.run_job, job)] = job.pk
+                    continue
+                if once and not running:
+                    return
+                time.sleep(poll_interval)
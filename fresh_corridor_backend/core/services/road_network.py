@@ -0,0 +1,315 @@
+import heapq
+import json
+import os
+import threading
+import time
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from core.models import CityZone, Hospital, TrafficStats, RealTimeTraffic
+from core.utils import haversine_many, latest_for_zone
+
+class RoadNetwork:
+    """
+    Hospital -> zone travel times over a local road graph.
+
+    The graph is an OSM extract converted to JSON at settings.ROAD_GRAPH_PATH:
+        {"nodes": [[node_id, lat, lon], ...],
+         "edges": [[from_id, to_id, length_m, speed_kmh, oneway], ...]}
+    (speed_kmh and oneway are optional.)
+
+    Edge times are slowed down by the congestion of the zone they run through, then
+    shortest paths from every hospital are precomputed into a matrix by
+    `manage.py refresh_road_times --loop`, which publishes it to settings.ROAD_MATRIX_PATH.
+    Web workers never run the search: they reload that file when it changes and queries
+    only read the matrix, so they stay O(1). Until a matrix has been published (or when
+    no graph is configured) callers get None and use their fallback.
+    """
+    REWEIGHT_INTERVAL = 300 # seconds between congestion reweights
+    MAX_BACKOFF = 3600 # seconds between retries while builds keep failing
+    CONGESTION_SLOWDOWN = 0.7 # full congestion leaves 30% of free-flow speed
+    DEFAULT_SPEED_KMH = 30
+    DISPATCH_TIME_MIN = 4 # call handling + crew turnout before the ambulance starts driving
+    LOCAL_LEG_MIN = 3 # free-flow drive from the zone's centroid node to an address inside the zone
+    LIVE_ZONE_RADIUS_KM = 5 # TomTom readings farther than this from every zone centroid belong to no zone
+    LIVE_MAX_AGE = timedelta(minutes=30) # older TomTom readings no longer count as live
+
+    _graph = None
+    _matrix = None
+    _matrix_mtime = None
+    _lock = threading.Lock()
+    _graph_lock = threading.Lock()
+    build_id = None # changes with every rebuilt matrix (used in cache keys)
+
+    # --- Graph loading ---
+
+    @classmethod
+    def graph_path(cls):
+        return getattr(settings, 'ROAD_GRAPH_PATH', None)
+
+    @classmethod
+    def matrix_path(cls):
+        return str(settings.ROAD_MATRIX_PATH)
+
+    @classmethod
+    def _load_graph(cls):
+        with open(cls.graph_path()) as f:
+            raw = json.load(f)
+
+        node_ids = [n[0] for n in raw["nodes"]]
+        index = {node_id: i for i, node_id in enumerate(node_ids)}
+        coords = np.radians(np.array([[n[1], n[2]] for n in raw["nodes"]], dtype=float))
+
+        src, dst, length, speed = [], [], [], []
+        for e in raw["edges"]:
+            if e[0] not in index or e[1] not in index:
+                continue
+            u, v = index[e[0]], index[e[1]]
+            kmh = float(e[3]) if len(e) > 3 and e[3] else cls.DEFAULT_SPEED_KMH
+            oneway = bool(e[4]) if len(e) > 4 else False
+            src.append(u); dst.append(v); length.append(float(e[2])); speed.append(kmh)
+            if not oneway:
+                src.append(v); dst.append(u); length.append(float(e[2])); speed.append(kmh)
+
+        src, dst = np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64)
+        # Free-flow minutes per edge
+        free_flow = np.array(length) / 1000.0 / np.array(speed) * 60.0
+        cls._graph = {
+            "lat": coords[:, 0],
+            "lon": coords[:, 1],
+            "src": src,
+            "dst": dst,
+            "free_flow": free_flow,
+        }
+        print(f"[Road Network] Loaded {len(node_ids)} nodes, {len(src)} directed edges.")
+
+    # --- Geometry helpers ---
+
+    @classmethod
+    def _nearest_node(cls, lat, lon):
+        """Index of the graph node closest to a point (degrees)."""
+        g = cls._graph
+        lat, lon = np.radians(lat), np.radians(lon)
+        a = np.sin((g["lat"] - lat) / 2) ** 2 + np.cos(lat) * np.cos(g["lat"]) * np.sin((g["lon"] - lon) / 2) ** 2
+        return int(np.argmin(a))
+
+    @classmethod
+    def _nearest_zone_per_node(cls, zone_lat, zone_lon, chunk=20_000):
+        """For every graph node, the position of the closest zone centroid."""
+        g = cls._graph
+        zlat, zlon = np.radians(zone_lat)[None, :], np.radians(zone_lon)[None, :]
+        out = np.empty(len(g["lat"]), dtype=np.int64)
+        for start in range(0, len(out), chunk):
+            nlat = g["lat"][start:start + chunk, None]
+            nlon = g["lon"][start:start + chunk, None]
+            a = np.sin((zlat - nlat) / 2) ** 2 + np.cos(nlat) * np.cos(zlat) * np.sin((zlon - nlon) / 2) ** 2
+            out[start:start + chunk] = np.argmin(a, axis=1)
+        return out
+
+    # --- Shortest paths ---
+
+    @staticmethod
+    def _csr(src, dst, weights, n_nodes):
+        order = np.argsort(src, kind='stable')
+        indptr = np.searchsorted(src[order], np.arange(n_nodes + 1)).tolist()
+        return indptr, dst[order].tolist(), weights[order].tolist()
+
+    @staticmethod
+    def _dijkstra(indptr, indices, weights, source, targets):
+        """Single-source Dijkstra that stops once every target node is settled."""
+        dist = {source: 0.0}
+        remaining = set(targets)
+        heap = [(0.0, source)]
+        settled = set()
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if u in settled:
+                continue
+            settled.add(u)
+            remaining.discard(u)
+            for i in range(indptr[u], indptr[u + 1]):
+                v = indices[i]
+                nd = d + weights[i]
+                if nd < dist.get(v, float('inf')):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return {t: dist.get(t, float('inf')) for t in targets}
+
+    # --- Precompute ---
+
+    @classmethod
+    def zone_for_point(cls, lat, lon):
+        """Id of the zone whose centroid is nearest to a point, or None beyond LIVE_ZONE_RADIUS_KM."""
+        zones = list(CityZone.objects.values_list('pk', 'latitude', 'longitude'))
+        if not zones:
+            return None
+        km = haversine_many(lat, lon, [z[1] for z in zones], [z[2] for z in zones])
+        nearest = int(np.argmin(km))
+        return zones[nearest][0] if km[nearest] <= cls.LIVE_ZONE_RADIUS_KM else None
+
+    @classmethod
+    def _zone_congestion(cls, zone_ids):
+        """Current congestion (0-1) per zone from TrafficStats and recent TomTom readings in the zone."""
+        live = RealTimeTraffic.objects.filter(
+            zone=OuterRef('pk'), timestamp__gte=timezone.now() - cls.LIVE_MAX_AGE
+        ).order_by('-pk').values('congestion_score')[:1]
+        rows = CityZone.objects.filter(pk__in=zone_ids).annotate(
+            stats_congestion=latest_for_zone(TrafficStats, 'congestion_level'),
+            stats_closed=latest_for_zone(TrafficStats, 'is_road_closed'),
+            live_score=Subquery(live),
+        ).values_list('pk', 'stats_congestion', 'stats_closed', 'live_score')
+        congestion = {}
+        for pk, stats, closed, live in rows:
+            value = max(stats or 0.0, (live or 0.0) / 100.0)
+            congestion[pk] = 1.0 if closed else min(1.0, value)
+        return np.array([congestion.get(z, 0.0) for z in zone_ids])
+
+    @classmethod
+    def _travel_minutes(cls, weights, hospital_nodes, zone_nodes):
+        """hospital x zone shortest-path minutes over edges weighted by `weights`."""
+        g = cls._graph
+        n_nodes = len(g["lat"])
+        sources, targets = sorted(set(hospital_nodes)), sorted(set(zone_nodes))
+        times = {}
+        if len(sources) <= len(targets):
+            indptr, indices, w = cls._csr(g["src"], g["dst"], weights, n_nodes)
+            for s in sources:
+                for t, d in cls._dijkstra(indptr, indices, w, s, targets).items():
+                    times[(s, t)] = d
+        else:
+            # Fewer distinct zone nodes: search backwards from each zone over reversed edges
+            indptr, indices, w = cls._csr(g["dst"], g["src"], weights, n_nodes)
+            for t in targets:
+                for s, d in cls._dijkstra(indptr, indices, w, t, sources).items():
+                    times[(s, t)] = d
+        return np.array([[times[(h, z)] for z in zone_nodes] for h in hospital_nodes])
+
+    @classmethod
+    def build(cls):
+        """Reweights the graph by current congestion and publishes a new hospital x zone matrix."""
+        with cls._graph_lock:
+            if cls._graph is None:
+                cls._load_graph()
+        g = cls._graph
+
+        zones = list(CityZone.objects.order_by('pk').values_list('pk', 'latitude', 'longitude'))
+        hospitals = list(Hospital.objects.order_by('pk').values_list('pk', 'zone_id'))
+        zone_ids = [z[0] for z in zones]
+        zone_lat = np.array([z[1] for z in zones], dtype=float)
+        zone_lon = np.array([z[2] for z in zones], dtype=float)
+        if not zones or not hospitals:
+            return
+
+        # Slow every edge down by the congestion of the zone its start node belongs to
+        node_zone = cls._nearest_zone_per_node(zone_lat, zone_lon)
+        congestion = cls._zone_congestion(zone_ids)
+        weights = g["free_flow"] / (1 - cls.CONGESTION_SLOWDOWN * congestion[node_zone[g["src"]]])
+
+        zone_nodes = [cls._nearest_node(lat, lon) for lat, lon in zip(zone_lat, zone_lon)]
+        zone_pos = {z: i for i, z in enumerate(zone_ids)}
+        hospital_nodes = [zone_nodes[zone_pos[zone_id]] for _, zone_id in hospitals] # hospitals sit at their zone centroid
+
+        # A hospital shares its zone's centroid node, so the graph alone gives 0 minutes to its own
+        # zone (and to zones snapped to the same node); no trip is shorter than the local leg
+        local_leg = cls.LOCAL_LEG_MIN / (1 - cls.CONGESTION_SLOWDOWN * congestion)
+        minutes = np.maximum(cls._travel_minutes(weights, hospital_nodes, zone_nodes), local_leg)
+
+        cls._save_matrix(
+            hospital_ids=np.array([h[0] for h in hospitals], dtype=np.int64),
+            zone_ids=np.array(zone_ids, dtype=np.int64),
+            minutes=minutes,
+            build_id=np.array(int(time.time() * 1000)),
+        )
+        print(f"[Road Network] Travel-time matrix rebuilt ({len(hospitals)} hospitals x {len(zones)} zones).")
+
+    @classmethod
+    def _save_matrix(cls, **arrays):
+        path = cls.matrix_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path) # readers never see a half-written file
+
+    @classmethod
+    def _sync_matrix(cls):
+        """Reloads the published matrix when refresh_road_times has written a new one (one stat() otherwise)."""
+        path = cls.matrix_path()
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == cls._matrix_mtime:
+            return
+        with cls._lock:
+            if mtime == cls._matrix_mtime:
+                return
+            cls._matrix_mtime = mtime # a broken file is reported once, not re-read on every request
+            try:
+                with np.load(path, allow_pickle=False) as data:
+                    hospital_ids = data["hospital_ids"].tolist()
+                    zone_ids = data["zone_ids"].tolist()
+                    minutes = data["minutes"]
+                    build_id = int(data["build_id"])
+            except (OSError, KeyError, ValueError) as e:
+                print(f"[Road Network] Ignoring unreadable matrix: {e}")
+                return
+            nearest = np.argmin(minutes, axis=0)
+            cls._matrix = {
+                "hospital_ids": hospital_ids,
+                "zone_index": {z: i for i, z in enumerate(zone_ids)},
+                "minutes": minutes,
+                "nearest_hospital": nearest,
+                "nearest_minutes": minutes[nearest, np.arange(len(zone_ids))],
+            }
+            cls.build_id = build_id
+
+    @classmethod
+    def ensure_fresh(cls):
+        """True when a travel-time matrix is available, after picking up a newer published one."""
+        if not cls.graph_path():
+            return False
+        cls._sync_matrix()
+        return cls._matrix is not None
+
+    # --- Queries (read the precomputed matrix only) ---
+
+    @classmethod
+    def response_time_min(cls, zone_id):
+        """Dispatch + travel time from the nearest hospital under current congestion, or None."""
+        if not cls.ensure_fresh():
+            return None
+        m = cls._matrix
+        idx = m["zone_index"].get(int(zone_id))
+        if idx is None or not np.isfinite(m["nearest_minutes"][idx]):
+            return None
+        return cls.DISPATCH_TIME_MIN + float(m["nearest_minutes"][idx])
+
+    @classmethod
+    def response_times_min(cls, zone_ids):
+        """Vector version of response_time_min; NaN where unknown."""
+        out = np.full(len(zone_ids), np.nan)
+        if not cls.ensure_fresh():
+            return out
+        m = cls._matrix
+        for i, zone_id in enumerate(zone_ids):
+            idx = m["zone_index"].get(zone_id)
+            if idx is not None:
+                out[i] = m["nearest_minutes"][idx]
+        out[~np.isfinite(out)] = np.nan
+        return cls.DISPATCH_TIME_MIN + out
+
+    @classmethod
+    def hospital_times(cls, zone_id):
+        """[(hospital_id, minutes)] to one zone, fastest first; None if unavailable."""
+        if not cls.ensure_fresh():
+            return None
+        m = cls._matrix
+        idx = m["zone_index"].get(int(zone_id))
+        if idx is None:
+            return None
+        column = m["minutes"][:, idx]
+        order = np.argsort(column)
+        return [(m["hospital_ids"][i], float(column[i])) for i in order if np.isfinite(column[i])]
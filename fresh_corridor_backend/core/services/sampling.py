@@ -0,0 +1,16 @@
+import numpy as np
+
+# Kept free of Django imports so process-pool workers can load it without app setup.
+
+def draw_perturbations(seed_seq, size, base_congestion, rain_increase, traffic_increase,
+                       congestion_spread, rain_spread, traffic_spread):
+    """
+    Draws `size` normal perturbations around the scenario inputs.
+    Returns (congestion, rain, traffic) arrays; congestion is clipped to 0-1
+    and rain intensity can't go negative.
+    """
+    rng = np.random.default_rng(seed_seq)
+    congestion = np.clip(rng.normal(base_congestion, congestion_spread, size), 0.0, 1.0)
+    rain = np.maximum(0.0, rng.normal(rain_increase, rain_spread, size))
+    traffic = rng.normal(traffic_increase, traffic_spread, size)
+    return congestion, rain, traffic
@@ -1,85 +1,222 @@
-from core.models import CityZone, WeatherLog, TrafficStats, HealthStats, Hospital
+import os
+import math
+import threading
+import multiprocessing
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from django.db.models import Sum
+from django.utils import timezone
+from core.models import CityZone, WeatherLog, TrafficStats, Hospital, ZoneResilience
+from core.utils import latest_for_zone
+from core.services.sampling import draw_perturbations
+from core.services.cache_service import ScenarioCache
+from core.services.road_network import RoadNetwork
+from core.services.flood_model import FloodModel
 
 class SimulationService:
+    # Baseline ambulance response time (minutes) before congestion delays
+    BASE_RESPONSE_TIME_MIN = 15
+    # Default congestion when a zone has no TrafficStats yet
+    DEFAULT_CONGESTION = 0.3
+    # Upper bound on zones x rain x traffic cells evaluated by a single batch call
+    MAX_BATCH_CELLS = 1_000_000
+
+    # Monte Carlo settings. Draws are generated in fixed-size chunks, each with its own
+    # child seed, so a given seed gives identical results with or without the pool.
+    MONTE_CARLO_CHUNK = 250_000
+    MONTE_CARLO_POOL_THRESHOLD = 1_000_000 # below this, pool start-up costs more than it saves
+    MAX_MONTE_CARLO_SAMPLES = 5_000_000
+    MONTE_CARLO_PERCENTILES = (50, 90, 99)
+    # Workers are started with forkserver (spawn where unavailable), never fork: forking
+    # a threaded server copies whatever locks other request threads hold at that moment.
+    MONTE_CARLO_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    _pool = None
+    _pool_lock = threading.Lock()
+
+    # Time-stepped simulation settings
+    MAX_TIMELINE_HOURS = 72
+    RAIN_DECAY_PER_HOUR = 0.6 # share of rain intensity left each hour after the storm ends
+    DRAINAGE_PER_HOUR = 0.08 # ground saturation drained per hour
+    ICU_DISCHARGE_RATE = 0.03 # share of occupied ICU beds freed per hour
+
+    @staticmethod
+    def refresh_resilience(zone_id):
+        """
+        Recomputes and stores the materialized ZoneResilience row for one zone.
+        Called from core.signals whenever the zone, its hospitals or its weather change.
+        """
+        zone = CityZone.objects.get(pk=zone_id)
+        aqi_val = WeatherLog.objects.filter(zone=zone).order_by('-pk').values_list('air_quality_index', flat=True).first()
+        beds = Hospital.objects.filter(zone=zone).aggregate(
+            total=Sum('total_beds_icu'), occupied=Sum('occupied_beds_icu')
+        )
+
+        # 1. AQI Score (0-100, higher is better)
+        # AQI > 300 is 0 score, AQI < 50 is 100 score.
+        aqi_val = aqi_val if aqi_val is not None else 150
+        aqi_score = max(0, min(100, 100 - ((aqi_val - 50) * 0.4)))
+
+        # 2. Medical Capacity Score
+        # Based on ICU bed availability
+        total_beds = beds['total'] or 0
+        occupied_beds = beds['occupied'] or 0
+        if total_beds > 0:
+            occupancy_rate = occupied_beds / total_beds
+            medical_score = max(0, min(100, (1 - occupancy_rate) * 100))
+        else:
+            medical_score = 0
+
+        # 3. Nutrition/Supply Score (Mocked for now as we don't have deep supply stats yet)
+        # Default to medium-high unless it's a "Low Income" area, then lower.
+        nutrition_score = 40 if zone.average_income_tier == 'Low' else 85
+
+        # Overall Resilience Metric
+        overall_score = (aqi_score * 0.4) + (medical_score * 0.4) + (nutrition_score * 0.2)
+
+        resilience, _ = ZoneResilience.objects.update_or_create(
+            zone=zone,
+            defaults={
+                'aqi_score': aqi_score,
+                'medical_capacity_score': medical_score,
+                'nutrition_access_score': nutrition_score,
+                'overall_resilience_score': overall_score,
+            }
+        )
+        return resilience
+
+    @staticmethod
+    def _resilience_payload(resilience):
+        return {
+            "zone_id": resilience.zone_id,
+            "zone_name": resilience.zone.name,
+            "overall_resilience_score": round(resilience.overall_resilience_score, 1),
+            "metrics": {
+                "aqi_score": round(resilience.aqi_score, 1),
+                "medical_capacity_score": round(resilience.medical_capacity_score, 1),
+                "nutrition_access_score": round(resilience.nutrition_access_score)
+            },
+            "updated_at": resilience.updated_at.isoformat()
+        }
+
     @staticmethod
     def calculate_resilience_metrics(zone_id):
+        """Serves the materialized score, computing it on first access for a zone."""
+        key = ScenarioCache.key('resilience', zone_id)
+        cached = ScenarioCache.get(key)
+        if cached is not None:
+            return cached
+
         try:
-            zone = CityZone.objects.get(pk=zone_id)
-            weather = WeatherLog.objects.filter(zone=zone).last()
-            health = HealthStats.objects.filter(zone=zone).last()
-            hospitals = Hospital.objects.filter(zone=zone)
-            
-            # 1. AQI Score (0-100, higher is better)
-            # AQI > 300 is 0 score, AQI < 50 is 100 score.
-            aqi_val = weather.air_quality_index if weather else 150
-            aqi_score = max(0, min(100, 100 - ((aqi_val - 50) * 0.4)))
-            
-            # 2. Medical Capacity Score
-            # Based on ICU bed availability
-            total_beds = sum(h.total_beds_icu for h in hospitals)
-            occupied_beds = sum(h.occupied_beds_icu for h in hospitals)
-            if total_beds > 0:
-                occupancy_rate = occupied_beds / total_beds
-                medical_score = max(0, min(100, (1 - occupancy_rate) * 100))
-            else:
-                medical_score = 0
-                
-            # 3. Nutrition/Supply Score (Mocked for now as we don't have deep supply stats yet)
-            # Default to medium-high unless it's a "Low Income" area, then lower.
-            nutrition_score = 40 if zone.average_income_tier == 'Low' else 85
-            
-            # Overall Resilience Metric
-            overall_score = (aqi_score * 0.4) + (medical_score * 0.4) + (nutrition_score * 0.2)
-            
-            return {
-                "zone_name": zone.name,
-                "overall_resilience_score": round(overall_score, 1),
-                "metrics": {
-                    "aqi_score": round(aqi_score, 1),
-                    "medical_capacity_score": round(medical_score, 1),
-                    "nutrition_access_score": nutrition_score
-                }
-            }
-        except CityZone.DoesNotExist:
-            return None
+            resilience = ZoneResilience.objects.select_related('zone').get(zone_id=zone_id)
+        except ZoneResilience.DoesNotExist:
+            try:
+                resilience = SimulationService.refresh_resilience(zone_id)
+            except CityZone.DoesNotExist:
+                return None
+        result = SimulationService._resilience_payload(resilience)
+        ScenarioCache.set(key, result)
+        return result
+
+    @staticmethod
+    def resilience_leaderboard(limit=None):
+        """All zones ranked by resilience, read from the materialized table in one query."""
+        rows = ZoneResilience.objects.select_related('zone').order_by('-overall_resilience_score')
+        if limit:
+            rows = rows[:limit]
+        return [SimulationService._resilience_payload(r) for r in rows]
+
+    @staticmethod
+    def _delay_factor(congestion):
+        # Congestion > 0.5 adds up to a 2x multiplier on response times
+        return np.where(congestion > 0.5, 1 + (congestion - 0.5) * 2, 1.0)
+
+    @staticmethod
+    def response_baselines(zone_ids, observed_congestion):
+        """
+        Ambulance response time per zone under the observed congestion: road-network travel
+        time from the nearest hospital over the live-reweighted graph when available, else
+        BASE_RESPONSE_TIME_MIN with the observed delay applied. Pass the same congestion to
+        project_scenarios as observed_congestion so only the scenario's extra delay is added.
+        """
+        road_times = RoadNetwork.response_times_min(list(zone_ids))
+        flat = SimulationService.BASE_RESPONSE_TIME_MIN * SimulationService._delay_factor(np.clip(observed_congestion, 0.0, 1.0))
+        return np.where(np.isnan(road_times), flat, road_times)
+
+    @staticmethod
+    def project_scenarios(base_congestion, latitude, rain_increase, traffic_increase, base_time=None, flood_risk=None,
+                          observed_congestion=None):
+        """
+        Core what-if formulas. Works on plain floats or on NumPy arrays that
+        broadcast against each other, so single runs and grid sweeps share one model.
+        base_time: response time, default 15 min; uncongested unless observed_congestion is given.
+        observed_congestion: congestion already reflected in base_time (see response_baselines).
+        flood_risk: raster flood risk from FloodModel; NaN/None falls back to the rain threshold rule.
+        Returns (congestion 0-1, ambulance response time in minutes, flood risk %).
+        """
+        # 1. Traffic Congestion Prediction
+        # Rain adds 0.5% congestion per 1% rain intensity
+        # User input adds directly to load
+        predicted_congestion = base_congestion + (rain_increase * 0.005) + (traffic_increase * 0.01)
+        predicted_congestion = np.clip(predicted_congestion, 0.0, 1.0)
+
+        # 2. Ambulance Response Time Delay
+        # Baseline 15 mins (or road travel time). Congestion > 0.5 adds up to a 2x multiplier.
+        if base_time is None:
+            base_time = SimulationService.BASE_RESPONSE_TIME_MIN
+        predicted_response_time = base_time * SimulationService._delay_factor(predicted_congestion)
+        if observed_congestion is not None:
+            # Live road times already carry today's delay; only the scenario's extra congestion adds to it
+            predicted_response_time = predicted_response_time / SimulationService._delay_factor(np.clip(observed_congestion, 0.0, 1.0))
+
+        # 3. Flood Risk
+        # Simple threshold: If Rain > 80%, high risk.
+        flood_risk_prob = np.minimum(100, rain_increase * 0.8)
+        # Mock: South zones more prone
+        flood_risk_prob = flood_risk_prob + np.where(latitude < 28.5, 10, 0)
+        if flood_risk is not None:
+            flood_risk_prob = np.where(np.isnan(flood_risk), flood_risk_prob, flood_risk)
+
+        return predicted_congestion, predicted_response_time, flood_risk_prob
 
     @staticmethod
     def run_what_if_simulation(zone_id, modifiers):
         """
         modifiers: dict with keys like 'rain_intensity', 'traffic_load' (percentage increases)
+        Pass 'mode': 'monte_carlo' to get percentile bands instead of a single estimate.
         """
+        if modifiers.get('mode') == 'monte_carlo':
+            return SimulationService.run_monte_carlo_simulation(zone_id, modifiers)
+
         try:
-            zone = CityZone.objects.get(pk=zone_id)
-            current_traffic = TrafficStats.objects.filter(zone=zone).last()
-            
             rain_increase = float(modifiers.get('rain_intensity', 0))
             traffic_increase = float(modifiers.get('traffic_load', 0))
+
+            # Repeat scenarios are served from cache until the zone's data changes
+            key = ScenarioCache.key('what_if', zone_id, {
+                'rain_intensity': rain_increase, 'traffic_load': traffic_increase,
+                'road': RoadNetwork.build_id, 'flood': FloodModel.grid_id
+            })
+            cached = ScenarioCache.get(key)
+            if cached is not None:
+                return cached
+
+            zone = CityZone.objects.get(pk=zone_id)
+            current_traffic = TrafficStats.objects.filter(zone=zone).last()
             
             # --- Simulation Logic ---
-            
-            # 1. Traffic Congestion Prediction
-            base_congestion = current_traffic.congestion_level if current_traffic else 0.3
-            # Rain adds 0.5% congestion per 1% rain intensity
-            # User input adds directly to load
-            predicted_congestion = base_congestion + (rain_increase * 0.005) + (traffic_increase * 0.01)
-            predicted_congestion = min(1.0, max(0.0, predicted_congestion))
-            
-            # 2. Ambulance Response Time Delay
-            # Baseline 15 mins. Congestion > 0.7 adds exponential delay.
-            base_time = 15
-            delay_factor = 1.0
-            if predicted_congestion > 0.5:
-                delay_factor = 1 + (predicted_congestion - 0.5) * 2 # up to 2x multiplier
-                
-            predicted_response_time = base_time * delay_factor
-            
-            # 3. Flood Risk
-            # Simple threshold: If Rain > 80%, high risk.
-            flood_risk_prob = min(100, rain_increase * 0.8)
-            if zone.latitude < 28.5: # Mock: South zones more prone
-                flood_risk_prob += 10
-            
-            return {
+            base_congestion = current_traffic.congestion_level if current_traffic else SimulationService.DEFAULT_CONGESTION
+            base_time = float(SimulationService.response_baselines([zone.pk], base_congestion)[0])
+            raster_risk = FloodModel.zone_risk([zone.latitude], [zone.longitude], [rain_increase])[0, 0]
+            congestion, response_time, flood_risk = SimulationService.project_scenarios(
+                base_congestion, zone.latitude, rain_increase, traffic_increase, base_time, raster_risk,
+                observed_congestion=base_congestion
+            )
+            predicted_congestion = float(congestion)
+            predicted_response_time = float(response_time)
+            flood_risk_prob = float(flood_risk)
+
+            result = {
                 "status": "success",
                 "scenarios": {
                     "traffic_congestion_level": round(predicted_congestion, 2),
@@ -92,6 +229,255 @@ class SimulationService:
                     "🚑 Ambulance Delays Likely" if predicted_response_time > 20 else None
                 ]
             }
+            ScenarioCache.set(key, result)
+            return result
             
         except Exception as e:
             return {"status": "error", "message": str(e)}
+
+    @staticmethod
+    def run_batch_simulation(zone_ids, rain_values, traffic_values):
+        """
+        Evaluates every zone x rain_intensity x traffic_load combination in one pass.
+        zone_ids: list of CityZone ids, or None for all zones.
+        Zones and their latest congestion are loaded with a single query and the
+        formulas run as broadcast NumPy operations over that snapshot.
+        """
+        try:
+            rain = np.atleast_1d(np.asarray(rain_values, dtype=float))
+            traffic = np.atleast_1d(np.asarray(traffic_values, dtype=float))
+            if rain.ndim != 1 or traffic.ndim != 1:
+                raise ValueError("rain_intensity and traffic_load must be flat lists of numbers")
+
+            zones = CityZone.objects.order_by('pk')
+            if zone_ids is not None:
+                zones = zones.filter(pk__in=zone_ids)
+            rows = list(
+                zones.annotate(base_congestion=latest_for_zone(TrafficStats, 'congestion_level'))
+                .values_list('pk', 'name', 'latitude', 'base_congestion', 'longitude')
+            )
+            if not rows:
+                raise ValueError("No matching zones")
+
+            cells = len(rows) * rain.size * traffic.size
+            if cells > SimulationService.MAX_BATCH_CELLS:
+                raise ValueError(f"Grid too large ({cells} cells, max {SimulationService.MAX_BATCH_CELLS})")
+
+            latitude = np.array([r[2] for r in rows], dtype=float)
+            longitude = np.array([r[4] for r in rows], dtype=float)
+            base_congestion = np.array(
+                [SimulationService.DEFAULT_CONGESTION if r[3] is None else r[3] for r in rows], dtype=float
+            )
+
+            base_time = SimulationService.response_baselines([r[0] for r in rows], base_congestion)
+
+            # Axes: zone x rain x traffic
+            congestion, response_time, _ = SimulationService.project_scenarios(
+                base_congestion[:, None, None], latitude[:, None, None],
+                rain[None, :, None], traffic[None, None, :], base_time[:, None, None],
+                observed_congestion=base_congestion[:, None, None]
+            )
+            # Flood risk does not depend on traffic load, so it is only zone x rain
+            _, _, flood_risk = SimulationService.project_scenarios(
+                base_congestion[:, None], latitude[:, None], rain[None, :], 0.0,
+                flood_risk=FloodModel.zone_risk(latitude, longitude, rain)
+            )
+
+            return {
+                "status": "success",
+                "zones": [{"id": r[0], "name": r[1]} for r in rows],
+                "rain_intensity": rain.tolist(),
+                "traffic_load": traffic.tolist(),
+                "shape": [len(rows), rain.size, traffic.size],
+                "traffic_congestion_level": np.round(congestion, 2).tolist(),
+                "ambulance_response_time_min": np.round(response_time, 1).tolist(),
+                "flood_risk_probability": np.round(flood_risk, 1).tolist()
+            }
+
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    @classmethod
+    def _get_pool(cls):
+        with cls._pool_lock:
+            if cls._pool is None:
+                cls._pool = ProcessPoolExecutor(
+                    max_workers=os.cpu_count() or 1,
+                    mp_context=multiprocessing.get_context(cls.MONTE_CARLO_START_METHOD),
+                )
+            return cls._pool
+
+    @staticmethod
+    def run_monte_carlo_simulation(zone_id, modifiers, progress=None):
+        """
+        Uncertainty mode for the what-if model.
+        modifiers: same keys as run_what_if_simulation plus
+            'samples' (default 10000), 'seed' (optional, for reproducible runs) and
+            'congestion_spread' / 'rain_spread' / 'traffic_spread' (std devs of the draws).
+        progress: optional callback taking the fraction of sample chunks drawn (used by job workers).
+        Returns the deterministic scenario plus P50/P90/P99 bands for each output.
+        """
+        try:
+            rain_increase = float(modifiers.get('rain_intensity', 0))
+            traffic_increase = float(modifiers.get('traffic_load', 0))
+            samples = int(modifiers.get('samples', 10_000))
+            seed = modifiers.get('seed')
+            seed = int(seed) if seed is not None else None
+            spreads = (
+                float(modifiers.get('congestion_spread', 0.1)),
+                float(modifiers.get('rain_spread', 15)),
+                float(modifiers.get('traffic_spread', 10)),
+            )
+            if not 0 < samples <= SimulationService.MAX_MONTE_CARLO_SAMPLES:
+                raise ValueError(f"samples must be between 1 and {SimulationService.MAX_MONTE_CARLO_SAMPLES}")
+
+            # Only seeded runs are reproducible, so only those are cached
+            key = None
+            if seed is not None:
+                key = ScenarioCache.key('monte_carlo', zone_id, {
+                    'rain_intensity': rain_increase, 'traffic_load': traffic_increase,
+                    'samples': samples, 'seed': seed, 'spreads': spreads,
+                    'road': RoadNetwork.build_id, 'flood': FloodModel.grid_id
+                })
+                cached = ScenarioCache.get(key)
+                if cached is not None:
+                    return cached
+
+            zone = CityZone.objects.get(pk=zone_id)
+            current_traffic = TrafficStats.objects.filter(zone=zone).last()
+
+            base_congestion = current_traffic.congestion_level if current_traffic else SimulationService.DEFAULT_CONGESTION
+            base_time = float(SimulationService.response_baselines([zone.pk], base_congestion)[0])
+
+            # --- Sampling ---
+            chunk = SimulationService.MONTE_CARLO_CHUNK
+            sizes = [min(chunk, samples - start) for start in range(0, samples, chunk)]
+            seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+            args = [(sd, size, base_congestion, rain_increase, traffic_increase, *spreads)
+                    for sd, size in zip(seeds, sizes)]
+
+            if samples >= SimulationService.MONTE_CARLO_POOL_THRESHOLD and len(args) > 1:
+                pool = SimulationService._get_pool()
+                results = pool.map(draw_perturbations, *zip(*args))
+            else:
+                results = (draw_perturbations(*a) for a in args)
+            draws = []
+            for d in results:
+                draws.append(d)
+                if progress:
+                    progress(len(draws) / len(args))
+
+            congestion = np.concatenate([d[0] for d in draws])
+            rain = np.concatenate([d[1] for d in draws])
+            traffic = np.concatenate([d[2] for d in draws])
+
+            # Raster risk is evaluated on a few rain levels and interpolated for every draw
+            raster_risk = None
+            curve = FloodModel.zone_risk_curve(zone.latitude, zone.longitude, rain.max())
+            if curve is not None:
+                raster_risk = np.interp(rain, *curve)
+
+            outputs = dict(zip(
+                ("traffic_congestion_level", "ambulance_response_time_min", "flood_risk_probability"),
+                SimulationService.project_scenarios(congestion, zone.latitude, rain, traffic, base_time, raster_risk,
+                                                    observed_congestion=base_congestion)
+            ))
+
+            bands = {}
+            for name, values in outputs.items():
+                pct = np.percentile(values, SimulationService.MONTE_CARLO_PERCENTILES)
+                bands[name] = {f"p{p}": round(float(v), 2) for p, v in zip(SimulationService.MONTE_CARLO_PERCENTILES, pct)}
+
+            deterministic = SimulationService.run_what_if_simulation(
+                zone_id, {'rain_intensity': rain_increase, 'traffic_load': traffic_increase}
+            )
+            response_p90 = bands["ambulance_response_time_min"]["p90"]
+            flood_p90 = bands["flood_risk_probability"]["p90"]
+
+            result = {
+                "status": "success",
+                "mode": "monte_carlo",
+                "samples": samples,
+                "seed": seed,
+                "scenarios": deterministic["scenarios"],
+                "percentiles": bands,
+                "alerts": [
+                    "⚠️ High Flood Risk Detected (P90)" if flood_p90 > 70 else None,
+                    "🚑 Ambulance Delays Likely (P90)" if response_p90 > 20 else None
+                ]
+            }
+            if key:
+                ScenarioCache.set(key, result)
+            return result
+
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+    @staticmethod
+    def run_timeline(zone_id, modifiers, hours=24):
+        """
+        Rolls the what-if scenario forward hour by hour.
+        modifiers: 'rain_intensity', 'traffic_load' (as in run_what_if_simulation) and
+            'rain_duration_hours' (default 6) after which the rain tapers off.
+        Loads everything up front (raises CityZone.DoesNotExist / ValueError) and
+        returns a generator yielding one dict per hour, so callers can stream steps.
+        """
+        hours = int(hours)
+        if not 1 <= hours <= SimulationService.MAX_TIMELINE_HOURS:
+            raise ValueError(f"hours must be between 1 and {SimulationService.MAX_TIMELINE_HOURS}")
+
+        zone = CityZone.objects.get(pk=zone_id)
+        current_traffic = TrafficStats.objects.filter(zone=zone).last()
+        beds = Hospital.objects.filter(zone=zone).aggregate(
+            total=Sum('total_beds_icu'), occupied=Sum('occupied_beds_icu')
+        )
+
+        rain_increase = float(modifiers.get('rain_intensity', 0))
+        traffic_increase = float(modifiers.get('traffic_load', 0))
+        rain_duration = float(modifiers.get('rain_duration_hours', 6))
+        base_congestion = current_traffic.congestion_level if current_traffic else SimulationService.DEFAULT_CONGESTION
+        base_time = float(SimulationService.response_baselines([zone.pk], base_congestion)[0])
+        icu_total = beds['total'] or 0
+        flood_curve = FloodModel.zone_risk_curve(zone.latitude, zone.longitude, rain_increase)
+        start = timezone.now().replace(minute=0, second=0, microsecond=0)
+
+        def steps():
+            saturation = 0.0 # 0-1 ground saturation, builds up with rain
+            icu_occupied = float(beds['occupied'] or 0)
+
+            for hour in range(hours + 1):
+                ts = start + timedelta(hours=hour)
+
+                # Rain holds for the storm duration, then decays
+                rain = rain_increase if hour < rain_duration else rain_increase * SimulationService.RAIN_DECAY_PER_HOUR ** (hour - rain_duration + 1)
+                # Rush hours (~9h and ~18h) add load, nights remove it
+                rush = 20 * (math.exp(-((ts.hour - 9) ** 2) / 4) + math.exp(-((ts.hour - 18) ** 2) / 4)) - 10
+                raster_risk = float(np.interp(rain, *flood_curve)) if flood_curve is not None else None
+                congestion, response_time, flood_risk = SimulationService.project_scenarios(
+                    base_congestion, zone.latitude, rain, traffic_increase + rush, base_time, raster_risk,
+                    observed_congestion=base_congestion
+                )
+
+                # Saturated ground turns later rain into more flooding
+                saturation = min(1.0, max(0.0, saturation + rain * 0.01 - SimulationService.DRAINAGE_PER_HOUR))
+                flood_risk = min(100.0, float(flood_risk) + saturation * 30)
+
+                # ICU load: baseline admissions scaled by flooding and traffic (trauma), minus discharges
+                if hour > 0:
+                    admissions = icu_total * 0.005 * (1 + flood_risk / 50 + float(congestion))
+                    icu_occupied += admissions - icu_occupied * SimulationService.ICU_DISCHARGE_RATE
+                    icu_occupied = min(float(icu_total), max(0.0, icu_occupied))
+
+                yield {
+                    "hour": hour,
+                    "timestamp": ts.isoformat(),
+                    "rain_intensity": round(rain, 1),
+                    "traffic_congestion_level": round(float(congestion), 2),
+                    "ambulance_response_time_min": round(float(response_time), 1),
+                    "flood_risk_probability": round(flood_risk, 1),
+                    "icu_occupied": round(icu_occupied),
+                    "icu_total": icu_total,
+                    "icu_occupancy_rate": round(icu_occupied / icu_total, 2) if icu_total else None
+                }
+
+        return steps()
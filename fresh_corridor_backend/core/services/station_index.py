@@ -0,0 +1,183 @@
+import base64
+import math
+import threading
+import numpy as np
+from core.utils import haversine_many
+
+class StationIndex:
+    """
+    Spatial and attribute index over the current CPCB station snapshot.
+
+    Built once per snapshot (AQIService.fetched_at): stations are sorted by latitude
+    so a bbox or radius is one searchsorted band plus a vectorized longitude test,
+    AQI is a float array for range filters and state / city map to position arrays.
+    Queries only touch these arrays; the station dicts are picked at the end.
+
+    Pages are addressed with an opaque cursor tied to the snapshot, so a refresh
+    between pages is reported instead of silently skipping or repeating stations.
+    """
+    MAX_LIMIT = 1000
+    EARTH_RADIUS_KM = 6371.0
+
+    _index = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _build(cls, stations, token):
+        def number(v):
+            try:
+                return float(v)
+            except (TypeError, ValueError):
+                return np.nan
+
+        lat = np.array([number(s.get('lat')) for s in stations], dtype=float)
+        lon = np.array([number(s.get('lon')) for s in stations], dtype=float)
+        order = np.argsort(lat, kind='stable') # NaN coordinates sort last and never match
+        by_state, by_city = {}, {}
+        for i, s in enumerate(stations):
+            by_state.setdefault(str(s.get('state') or '').lower(), []).append(i)
+            by_city.setdefault(str(s.get('city') or '').lower(), []).append(i)
+        return {
+            "token": token,
+            "stations": stations,
+            "lat": lat,
+            "lon": lon,
+            "aqi": np.array([number(s.get('aqi')) for s in stations], dtype=float),
+            "order": order,
+            "sorted_lat": lat[order],
+            "by_state": {k: np.array(v) for k, v in by_state.items()},
+            "by_city": {k: np.array(v) for k, v in by_city.items()},
+        }
+
+    @classmethod
+    def index(cls):
+        from core.services.aqi_service import AQIService
+
+        stations = AQIService.get_stations() # a new snapshot is a new list
+        if cls._index is None or cls._index["stations"] is not stations:
+            with cls._lock:
+                if cls._index is None or cls._index["stations"] is not stations:
+                    cls._index = cls._build(stations, f"{AQIService.fetched_at:.6f}:{len(stations)}")
+        return cls._index
+
+    # --- Parameters ---
+
+    @staticmethod
+    def _floats(value, n, name):
+        try:
+            parts = [float(v) for v in value.split(',')]
+        except ValueError:
+            parts = []
+        if len(parts) != n:
+            raise ValueError(f"{name} must be {n} comma-separated numbers")
+        return parts
+
+    @classmethod
+    def _encode_cursor(cls, token, offset):
+        return base64.urlsafe_b64encode(f"{token}|{offset}".encode()).decode().rstrip('=')
+
+    @classmethod
+    def _decode_cursor(cls, cursor, token):
+        try:
+            saved, offset = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode().rsplit('|', 1)
+            offset = int(offset)
+        except ValueError:
+            raise ValueError("cursor is not valid")
+        if saved != token:
+            raise ValueError("cursor belongs to an older station snapshot; start again without it")
+        return offset
+
+    # --- Query ---
+
+    @classmethod
+    def _band(cls, index, min_lat, max_lat):
+        """Positions with min_lat <= lat <= max_lat, from the latitude-sorted order."""
+        lo = np.searchsorted(index["sorted_lat"], min_lat, side='left')
+        hi = np.searchsorted(index["sorted_lat"], max_lat, side='right')
+        return index["order"][lo:hi]
+
+    @classmethod
+    def query(cls, params):
+        """
+        Stations matching every given filter:
+          bbox=min_lat,min_lon,max_lat,max_lon; lat, long and radius (km, nearest first);
+          min_aqi / max_aqi; state / city (comma-separated, case-insensitive);
+          limit (1-MAX_LIMIT) and cursor for paging.
+        Returns (stations, total matches, next cursor or None). Raises ValueError on bad input.
+        """
+        index = cls.index()
+        positions = None # None = every station
+        distance = None
+
+        if params.get('bbox'):
+            min_lat, min_lon, max_lat, max_lon = cls._floats(params['bbox'], 4, 'bbox')
+            positions = cls._band(index, min_lat, max_lat)
+            lon = index["lon"][positions]
+            # A box may cross the antimeridian (min_lon > max_lon)
+            inside = (lon >= min_lon) & (lon <= max_lon) if min_lon <= max_lon else (lon >= min_lon) | (lon <= max_lon)
+            positions = positions[inside]
+
+        if params.get('radius'):
+            try:
+                lat, lon, radius = float(params['lat']), float(params['long']), float(params['radius'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError("radius needs numeric lat, long and radius (km)")
+            dlat = math.degrees(radius / cls.EARTH_RADIUS_KM)
+            band = cls._band(index, lat - dlat, lat + dlat)
+            positions = band if positions is None else np.intersect1d(positions, band)
+            km = haversine_many(lat, lon, index["lat"][positions], index["lon"][positions])
+            near = km <= radius
+            order = np.argsort(km[near], kind='stable')
+            positions, distance = positions[near][order], km[near][order]
+
+        for name, table in (('state', 'by_state'), ('city', 'by_city')):
+            if params.get(name):
+                keys = [v.strip().lower() for v in params[name].split(',') if v.strip()]
+                hits = np.concatenate([index[table].get(k, np.array([], dtype=np.int64)) for k in keys] or [np.array([], dtype=np.int64)])
+                keep = np.isin(positions, hits) if positions is not None else None
+                positions = np.unique(hits) if positions is None else positions[keep]
+                if distance is not None:
+                    distance = distance[keep]
+
+        if params.get('min_aqi') or params.get('max_aqi'):
+            try:
+                low = float(params.get('min_aqi') or -np.inf)
+                high = float(params.get('max_aqi') or np.inf)
+            except ValueError:
+                raise ValueError("min_aqi and max_aqi must be numbers")
+            if positions is None:
+                positions = np.arange(len(index["stations"]))
+            aqi = index["aqi"][positions]
+            keep = (aqi >= low) & (aqi <= high) # unknown AQI (NaN) never matches
+            positions = positions[keep]
+            if distance is not None:
+                distance = distance[keep]
+
+        if positions is None:
+            positions = np.arange(len(index["stations"]))
+        elif distance is None:
+            positions = np.sort(positions) # snapshot order, stable across pages
+        total = len(positions)
+
+        offset, next_cursor = 0, None
+        if params.get('limit'):
+            limit = int(params['limit'])
+            if not 1 <= limit <= cls.MAX_LIMIT:
+                raise ValueError(f"limit must be between 1 and {cls.MAX_LIMIT}")
+            if params.get('cursor'):
+                offset = cls._decode_cursor(params['cursor'], index["token"])
+            end = offset + limit
+            if end < total:
+                next_cursor = cls._encode_cursor(index["token"], end)
+            positions = positions[offset:end]
+            if distance is not None:
+                distance = distance[offset:end]
+        elif params.get('cursor'):
+            raise ValueError("cursor needs limit")
+
+        stations = index["stations"]
+        if distance is None:
+            page = [stations[i] for i in positions]
+        else:
+            page = [{**stations[i], "distance_km": round(float(d), 2)} for i, d in zip(positions, distance)]
+        return page, total, next_cursor
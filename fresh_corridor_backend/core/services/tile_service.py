@@ -0,0 +1,322 @@
+import math
+import os
+import shutil
+import struct
+import threading
+import zlib
+import numpy as np
+from django.conf import settings
+from core.models import CityZone, WeatherLog, HealthStats
+from core.utils import latest_for_zone
+from core.services.cache_service import ScenarioCache
+
+class HeatmapTiles:
+    """
+    Slippy-map (z/x/y, Web Mercator) heat tiles for the health map.
+
+    Each tile is an inverse-distance-weighted surface over the point readings of a
+    layer: zone HealthStats for 'resp_cases'; zone WeatherLogs plus live CPCB
+    stations for 'aqi'. Tiles are rendered on first request, written as PNGs under
+    settings.TILE_CACHE_DIR and evicted least-recently-used beyond MAX_CACHED_TILES.
+    When a reading changes, only tiles within INFLUENCE_KM of it are deleted, on a
+    background thread so the save that triggered it never walks the cache directory.
+    """
+    TILE_SIZE = 256
+    GRID_SIZE = 64 # IDW is evaluated on this grid and bilinearly upsampled
+    MAX_ZOOM = 16
+    INFLUENCE_KM = 15 # points farther than this don't colour a pixel
+    IDW_POWER = 2
+    MAX_CACHED_TILES = 10_000
+    MAX_ALPHA = 170
+    MAX_POINT_INVALIDATIONS = 50 # beyond this many changed points, drop the whole layer
+
+    # Full-scale value per layer, mapped onto the CPCB AQI colour bands
+    LAYERS = {'aqi': 500, 'resp_cases': 200}
+    COLOR_STOPS = [0, 50, 100, 200, 300, 400, 500]
+    COLORS = np.array([
+        (0, 176, 80), (0, 176, 80), (146, 208, 80), (255, 255, 0),
+        (255, 153, 0), (255, 0, 0), (192, 0, 0),
+    ], dtype=float)
+
+    _cached_count = None
+    _evict_lock = threading.Lock()
+    _pending = [] # (layer, lat, lon) readings whose nearby tiles still have to be deleted
+    _pending_lock = threading.Lock()
+    _invalidator = None
+
+    @classmethod
+    def cache_dir(cls):
+        return str(getattr(settings, 'TILE_CACHE_DIR', settings.BASE_DIR / '.cache' / 'tiles'))
+
+    # --- Geometry ---
+
+    @staticmethod
+    def _tile_lat(y, n):
+        return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * y / n))))
+
+    @classmethod
+    def tile_bounds(cls, z, x, y):
+        """(min_lat, min_lon, max_lat, max_lon) of a tile."""
+        n = 2 ** z
+        return (float(cls._tile_lat(y + 1, n)), x / n * 360 - 180, float(cls._tile_lat(y, n)), (x + 1) / n * 360 - 180)
+
+    @classmethod
+    def _tile_range(cls, z, lat, lon, km):
+        """Inclusive x and y tile ranges at zoom z touched by a circle of `km` around a point."""
+        n = 2 ** z
+        dlat = km / 111.0
+        dlon = km / (111.0 * max(0.01, math.cos(math.radians(lat))))
+
+        def tx(lo):
+            return min(n - 1, max(0, int((lo + 180) / 360 * n)))
+
+        def ty(la):
+            la = math.radians(max(-85.05, min(85.05, la)))
+            return min(n - 1, max(0, int((1 - math.asinh(math.tan(la)) / math.pi) / 2 * n)))
+
+        return (tx(lon - dlon), tx(lon + dlon)), (ty(lat + dlat), ty(lat - dlat))
+
+    # --- Data ---
+
+    @classmethod
+    def _points(cls, layer):
+        """(lat, lon, value) arrays of every reading feeding a layer."""
+        model, field = (HealthStats, 'respiratory_cases_active') if layer == 'resp_cases' else (WeatherLog, 'air_quality_index')
+        rows = list(CityZone.objects.annotate(value=latest_for_zone(model, field))
+                    .filter(value__isnull=False).values_list('latitude', 'longitude', 'value'))
+        if layer == 'aqi':
+            from core.services.aqi_service import AQIService
+            # get_stations() picks up a snapshot another worker just fetched, so a tile that
+            # fetch invalidated is never re-rendered from this worker's older copy; it never
+            # blocks a tile on the feed itself
+            for st in AQIService.get_stations():
+                try:
+                    rows.append((float(st['lat']), float(st['lon']), float(st['aqi'])))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        points = np.array(rows, dtype=float).reshape(-1, 3)
+        return points[:, 0], points[:, 1], points[:, 2]
+
+    # --- Rendering ---
+
+    @classmethod
+    def _upsample(cls, grid):
+        """Bilinear GRID_SIZE -> TILE_SIZE resize."""
+        g, t = cls.GRID_SIZE, cls.TILE_SIZE
+        pos = np.clip((np.arange(t) + 0.5) * g / t - 0.5, 0, g - 1)
+        i0 = np.floor(pos).astype(int)
+        i1 = np.minimum(i0 + 1, g - 1)
+        f = pos - i0
+        rows = grid[i0] * (1 - f)[:, None] + grid[i1] * f[:, None]
+        return rows[:, i0] * (1 - f)[None, :] + rows[:, i1] * f[None, :]
+
+    @classmethod
+    def render(cls, layer, z, x, y):
+        """RGBA array (TILE_SIZE x TILE_SIZE x 4) for one tile."""
+        min_lat, min_lon, max_lat, max_lon = cls.tile_bounds(z, x, y)
+        g = cls.GRID_SIZE
+        frac = (np.arange(g) + 0.5) / g
+        n = 2 ** z
+        lats = cls._tile_lat(y + frac, n) # north to south, like image rows
+        lons = min_lon + frac * (max_lon - min_lon)
+
+        plat, plon, pval = cls._points(layer)
+        # Only points that can reach the tile
+        margin_lat = cls.INFLUENCE_KM / 111.0
+        margin_lon = margin_lat / max(0.01, math.cos(math.radians((min_lat + max_lat) / 2)))
+        near = ((plat >= min_lat - margin_lat) & (plat <= max_lat + margin_lat)
+                & (plon >= min_lon - margin_lon) & (plon <= max_lon + margin_lon))
+        plat, plon, pval = plat[near], plon[near], pval[near]
+
+        rgba = np.zeros((cls.TILE_SIZE, cls.TILE_SIZE, 4), dtype=np.uint8)
+        if not len(pval):
+            return rgba
+
+        value = np.zeros((g, g))
+        reach = np.zeros((g, g))
+        cos_lat = np.cos(np.radians(lats))
+        rows_per_chunk = max(1, 200_000 // (g * len(pval))) # bounds the pixels x points matrices
+        for r0 in range(0, g, rows_per_chunk):
+            r1 = min(g, r0 + rows_per_chunk)
+            # Pixels x points distances (equirectangular km, fine within INFLUENCE_KM)
+            dy = (lats[r0:r1, None, None] - plat[None, None, :]) * 111.0
+            dx = (lons[None, :, None] - plon[None, None, :]) * 111.0 * cos_lat[r0:r1, None, None]
+            dist = np.sqrt(dx ** 2 + dy ** 2)
+            weights = np.where(dist <= cls.INFLUENCE_KM, 1.0 / np.maximum(dist, 0.05) ** cls.IDW_POWER, 0.0)
+            total = weights.sum(axis=2)
+            value[r0:r1] = np.where(total > 0, (weights * pval).sum(axis=2) / np.maximum(total, 1e-12), 0.0)
+            # Fade out towards the edge of the nearest point's influence
+            reach[r0:r1] = np.clip(1 - dist.min(axis=2) / cls.INFLUENCE_KM, 0.0, 1.0)
+
+        value = cls._upsample(value)
+        reach = cls._upsample(reach)
+
+        scaled = np.clip(value / cls.LAYERS[layer], 0, 1) * cls.COLOR_STOPS[-1]
+        for channel in range(3):
+            rgba[..., channel] = np.interp(scaled, cls.COLOR_STOPS, cls.COLORS[:, channel]).astype(np.uint8)
+        rgba[..., 3] = (np.sqrt(reach) * cls.MAX_ALPHA).astype(np.uint8)
+        return rgba
+
+    @staticmethod
+    def encode_png(rgba):
+        """Minimal PNG encoder (8-bit RGBA, no filtering) so no imaging library is needed."""
+        height, width, _ = rgba.shape
+        raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, -1)], axis=1).tobytes()
+
+        def chunk(tag, data):
+            return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xFFFFFFFF)
+
+        return (b'\x89PNG\r\n\x1a\n'
+                + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+                + chunk(b'IDAT', zlib.compress(raw, 6))
+                + chunk(b'IEND', b''))
+
+    # --- Disk cache ---
+
+    @classmethod
+    def _path(cls, layer, z, x, y):
+        return os.path.join(cls.cache_dir(), layer, str(z), str(x), f"{y}.png")
+
+    @classmethod
+    def get_tile(cls, layer, z, x, y):
+        """PNG bytes for a tile, from disk when cached. Raises ValueError on bad coordinates."""
+        if layer not in cls.LAYERS:
+            raise ValueError(f"layer must be one of {', '.join(cls.LAYERS)}")
+        if not 0 <= z <= cls.MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError(f"tile out of range (zoom 0-{cls.MAX_ZOOM})")
+
+        path = cls._path(layer, z, x, y)
+        try:
+            with open(path, 'rb') as f:
+                png = f.read()
+            os.utime(path) # mtime doubles as last-access time for LRU eviction
+            return png
+        except FileNotFoundError:
+            pass
+
+        version = ScenarioCache.data_version(f"tiles:{layer}")
+        png = cls.encode_png(cls.render(layer, z, x, y))
+        # Skip the write if readings changed mid-render; the next request renders afresh
+        if ScenarioCache.data_version(f"tiles:{layer}") == version:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(png)
+            os.replace(tmp, path)
+            cls._after_write()
+        return png
+
+    @classmethod
+    def _cached_files(cls):
+        for root, _, files in os.walk(cls.cache_dir()):
+            for name in files:
+                if name.endswith('.png'):
+                    yield os.path.join(root, name)
+
+    @classmethod
+    def _after_write(cls):
+        with cls._evict_lock:
+            if cls._cached_count is None:
+                cls._cached_count = sum(1 for _ in cls._cached_files())
+            else:
+                cls._cached_count += 1
+            if cls._cached_count <= cls.MAX_CACHED_TILES:
+                return
+            # Evict down to 90% of the cap, least recently used first
+            files = []
+            for path in cls._cached_files():
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    continue
+            files.sort()
+            excess = len(files) - int(cls.MAX_CACHED_TILES * 0.9)
+            for _, path in files[:max(0, excess)]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            cls._cached_count = len(files) - max(0, excess)
+
+    # --- Invalidation ---
+
+    @classmethod
+    def invalidate_point(cls, layer, lat, lon):
+        """
+        Queues deletion of the cached tiles (any zoom) within INFLUENCE_KM of a changed
+        reading. The layer version is bumped right away, so renders already in flight
+        are not written back.
+        """
+        ScenarioCache.bump(f"tiles:{layer}")
+        with cls._pending_lock:
+            cls._pending.append((layer, lat, lon))
+            if cls._invalidator is None:
+                # Not a daemon: a management command that saved readings waits for it on exit
+                cls._invalidator = threading.Thread(target=cls._drain_invalidations, name='tile-invalidation')
+                cls._invalidator.start()
+
+    @classmethod
+    def _drain_invalidations(cls):
+        while True:
+            with cls._pending_lock:
+                if not cls._pending:
+                    cls._invalidator = None
+                    return
+                batch, cls._pending = cls._pending, []
+            for point in dict.fromkeys(batch): # bulk saves repeat the same zones
+                try:
+                    cls._delete_near(*point)
+                except OSError as e: # e.g. clear_layer removed the directory mid-walk
+                    print(f"[Heatmap Tiles] Invalidation near {point} failed: {e}")
+
+    @classmethod
+    def _delete_near(cls, layer, lat, lon):
+        layer_dir = os.path.join(cls.cache_dir(), layer)
+        if not os.path.isdir(layer_dir):
+            return
+        for z_name in os.listdir(layer_dir):
+            if not z_name.isdigit():
+                continue
+            (x0, x1), (y0, y1) = cls._tile_range(int(z_name), lat, lon, cls.INFLUENCE_KM)
+            z_dir = os.path.join(layer_dir, z_name)
+            for x_name in os.listdir(z_dir):
+                if not (x_name.isdigit() and x0 <= int(x_name) <= x1):
+                    continue
+                x_dir = os.path.join(z_dir, x_name)
+                for y_name in os.listdir(x_dir):
+                    stem = y_name.split('.')[0]
+                    if stem.isdigit() and y0 <= int(stem) <= y1 and y_name.endswith('.png'):
+                        try:
+                            os.remove(os.path.join(x_dir, y_name))
+                            with cls._evict_lock:
+                                if cls._cached_count:
+                                    cls._cached_count -= 1
+                        except FileNotFoundError:
+                            pass
+
+    @classmethod
+    def invalidate_stations(cls, old_stations, new_stations):
+        """After a CPCB refresh, invalidates tiles around stations whose AQI appeared, changed or vanished."""
+        def readings(stations):
+            out = {}
+            for st in stations:
+                try:
+                    out[(float(st['lat']), float(st['lon']))] = st.get('aqi')
+                except (KeyError, TypeError, ValueError):
+                    continue
+            return out
+
+        old, new = readings(old_stations), readings(new_stations)
+        changed = [p for p in set(old) | set(new) if old.get(p) != new.get(p)]
+        if len(changed) > cls.MAX_POINT_INVALIDATIONS:
+            cls.clear_layer('aqi')
+            return
+        for point in changed:
+            cls.invalidate_point('aqi', *point)
+
+    @classmethod
+    def clear_layer(cls, layer):
+        ScenarioCache.bump(f"tiles:{layer}")
+        shutil.rmtree(os.path.join(cls.cache_dir(), layer), ignore_errors=True)
+        with cls._evict_lock:
+            cls._cached_count = None # recounted on the next write
@@ -0,0 +1,151 @@
+import threading
+
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, post_migrate
+from django.dispatch import receiver
+from .models import CityZone, WeatherLog, Hospital, TrafficStats, HealthStats, AgriSupply, HospitalCapacityLog
+from .services.simulation_service import SimulationService
+from .services.cache_service import ScenarioCache
+from .services.hospital_index import HospitalIndex
+from .services.tile_service import HeatmapTiles
+
+# Note: QuerySet.update() and bulk_create() bypass these handlers;
+# run `manage.py refresh_resilience` after bulk imports.
+#
+# Handlers only mark work as pending; it runs once per transaction on commit, so a
+# loop of saves inside transaction.atomic() (e.g. simulate_health) recomputes each
+# dirty zone and bumps each scope once. Outside a transaction it runs right away.
+
+_pending = threading.local()
+
+def _batch():
+    """This thread's work waiting for the next commit."""
+    batch = getattr(_pending, 'batch', None)
+    if batch is None:
+        batch = _pending.batch = {
+            'resilience': set(), 'scopes': set(), 'tiles': set(), 'points': set(), 'capacity': {},
+        }
+    return batch
+
+def _schedule():
+    # Registered on every call (not once per batch) because a rolled-back savepoint drops
+    # its callbacks; the extra ones find the batch already flushed and return.
+    transaction.on_commit(_flush)
+
+def _flush():
+    batch = _pending.__dict__.pop('batch', None)
+    if not batch:
+        return
+    for zone_id in batch['resilience']:
+        _refresh_resilience(zone_id)
+    for hospital in batch['capacity'].values():
+        HospitalIndex.update_capacity(hospital)
+    # Bumps run after the resilience refresh so a new version never serves the old score
+    for scope in batch['scopes']:
+        ScenarioCache.bump(scope)
+    zone_ids = {zone_id for _, zone_id in batch['tiles']}
+    coords = {pk: (lat, lon) for pk, lat, lon in
+              CityZone.objects.filter(pk__in=zone_ids).values_list('pk', 'latitude', 'longitude')}
+    points = batch['points'] | {(layer, *coords[zone_id]) for layer, zone_id in batch['tiles'] if zone_id in coords}
+    for layer, lat, lon in points:
+        HeatmapTiles.invalidate_point(layer, lat, lon)
+
+def _refresh_resilience(zone_id):
+    try:
+        SimulationService.refresh_resilience(zone_id)
+    except CityZone.DoesNotExist:
+        pass
+
+def _mark_zone(zone_id, resilience=True):
+    batch = _batch()
+    if resilience:
+        batch['resilience'].add(zone_id)
+    batch['scopes'].add(f"zone:{zone_id}")
+    _schedule()
+
+def _bump(*scopes):
+    _batch()['scopes'].update(scopes)
+    _schedule()
+
+def _invalidate_tiles(layer, zone_id):
+    _batch()['tiles'].add((layer, zone_id))
+    _schedule()
+
+def _deleted_with_zone(origin):
+    """True when a row is removed by a cascading CityZone delete (nothing left to refresh)."""
+    return getattr(origin, 'model', type(origin)) is CityZone
+
+@receiver(post_save, sender=CityZone)
+def zone_saved(sender, instance, **kwargs):
+    _mark_zone(instance.pk)
+    _bump('hospitals', # hospitals are located at their zone's coordinates
+          'epidemiology', 'health_deserts')
+
+@receiver(post_delete, sender=CityZone)
+def zone_deleted(sender, instance, **kwargs):
+    _bump('epidemiology', 'health_deserts')
+    _batch()['points'].update((layer, instance.latitude, instance.longitude) for layer in HeatmapTiles.LAYERS)
+
+@receiver([post_save, post_delete], sender=WeatherLog)
+def weather_changed(sender, instance, **kwargs):
+    if _deleted_with_zone(kwargs.get('origin')):
+        return
+    _bump('epidemiology', 'health_deserts')
+    _invalidate_tiles('aqi', instance.zone_id)
+    _mark_zone(instance.zone_id)
+
+@receiver([post_save, post_delete], sender=Hospital)
+def hospital_changed(sender, instance, **kwargs):
+    if _deleted_with_zone(kwargs.get('origin')):
+        _bump('hospitals')
+        return
+    _mark_zone(instance.zone_id)
+    previous_zone_id = getattr(instance, '_loaded_zone_id', None)
+    moved = previous_zone_id and previous_zone_id != instance.zone_id
+    if moved:
+        _mark_zone(previous_zone_id)
+    if moved or kwargs.get('created', True): # post_delete has no 'created'
+        _bump('hospitals') # rebuilds HospitalIndex
+    else:
+        _batch()['capacity'][instance.pk] = instance # last save wins
+        _bump('hospital_capacity') # other processes reload bed counts
+    instance._loaded_zone_id = instance.zone_id
+
+@receiver(post_save, sender=Hospital)
+def log_capacity(sender, instance, **kwargs):
+    # History for charts and forecasting; compacted by `manage.py compact_capacity`
+    HospitalCapacityLog.objects.create(
+        hospital=instance,
+        occupied_beds_icu=instance.occupied_beds_icu,
+        total_beds_icu=instance.total_beds_icu,
+        occupied_beds_general=instance.occupied_beds_general,
+        total_beds_general=instance.total_beds_general,
+        oxygen_supply_level=instance.oxygen_supply_level,
+    )
+
+@receiver([post_save, post_delete], sender=TrafficStats)
+@receiver([post_save, post_delete], sender=HealthStats)
+def zone_stats_changed(sender, instance, **kwargs):
+    _mark_zone(instance.zone_id, resilience=False)
+    if sender is HealthStats:
+        _bump('epidemiology')
+        _invalidate_tiles('resp_cases', instance.zone_id)
+
+@receiver([post_save, post_delete], sender=AgriSupply)
+def supply_changed(sender, instance, **kwargs):
+    _bump('health_deserts')
+
+@receiver(post_migrate)
+def backfill_resilience(sender, apps=global_apps, **kwargs):
+    # Zones created before ZoneResilience existed (or bulk-imported) have no score yet;
+    # give them one after every migrate so the leaderboard never silently skips them.
+    # flush (e.g. between TransactionTestCase tests) sends the signal without `apps`.
+    if sender.name != 'core':
+        return
+    try:
+        apps.get_model('core', 'ZoneResilience')
+    except LookupError: # migrated back to before the table existed
+        return
+    for zone_id in CityZone.objects.filter(resilience__isnull=True).values_list('pk', flat=True):
+        _refresh_resilience(zone_id)
@@ -0,0 +1,51 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core.services.aqi_engine import AQIEngine
+from core.services.aqi_grid import AQIGrid
+from core.services.aqi_service import AQIService
+
+
+@override_settings(AQI_SNAPSHOT_PATH=os.path.join(tempfile.gettempdir(), 'core-tests-missing', 'aqi.json.gz'))
+class AqiAtTests(SimpleTestCase):
+    """Point and batch lookups against an in-memory snapshot (no feed, no refresher thread)."""
+
+    def setUp(self):
+        saved = {name: getattr(AQIService, name) for name in ('STATIONS', 'version', 'fetched_at')}
+        self.addCleanup(lambda: [setattr(AQIService, name, value) for name, value in saved.items()])
+        self.addCleanup(setattr, AQIGrid, '_grid', None)
+        patcher = mock.patch.object(AQIService, 'ensure_refresher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        AQIService.STATIONS = [
+            {"name": "A", "lat": 28.60, "lon": 77.20, "aqi": 100},
+            {"name": "B", "lat": 28.70, "lon": 77.10, "aqi": 300},
+        ]
+        AQIService.version, AQIService.fetched_at = 7, 1000.0
+        AQIGrid._grid = None
+
+    def test_point(self):
+        response = self.client.get('/api/aqi/at', {"lat": 28.6, "lon": 77.2})
+        self.assertEqual(response.status_code, 200)
+        point = response.json()
+        self.assertEqual((point["source"], point["version"]), ("grid", 7))
+        self.assertAlmostEqual(point["aqi"], 100, delta=15) # on top of station A
+        self.assertEqual(point["category"], AQIEngine.category(point["aqi"]))
+
+    def test_batch(self):
+        points = [{"lat": 28.65, "lon": 77.15}, {"lat": 19.07, "lon": 72.87}]
+        response = self.client.post('/api/aqi/at/batch', {"points": points}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        inside, far = response.json()["points"]
+        self.assertTrue(100 < inside["aqi"] < 300)
+        self.assertEqual((far["aqi"], far["source"]), (None, None)) # no station within SEARCH_KM
+
+    def test_rejects_bad_input(self):
+        for params in ({"lat": 28.6}, {"lat": "north", "lon": 77.2}, {"lat": 95, "lon": 77.2}):
+            self.assertEqual(self.client.get('/api/aqi/at', params).status_code, 400, params)
+        for body in ({"points": []}, {"points": [{"lat": 28.6}]}, [1, 2]):
+            response = self.client.post('/api/aqi/at/batch', body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
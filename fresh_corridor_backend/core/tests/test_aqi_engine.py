@@ -0,0 +1,50 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from core.services.aqi_engine import AQIEngine
+
+
+class AQIEngineTests(SimpleTestCase):
+    def _concentrations(self, **values):
+        row = np.full((1, len(AQIEngine.POLLUTANTS)), np.nan)
+        for pollutant, value in values.items():
+            row[0, AQIEngine.POLLUTANTS.index(pollutant)] = value
+        return row
+
+    def test_breakpoints_map_to_band_edges(self):
+        for col, pollutant in enumerate(AQIEngine.POLLUTANTS):
+            points = np.array(AQIEngine.BREAKPOINTS[pollutant], dtype=float)
+            concentrations = np.full((len(points), len(AQIEngine.POLLUTANTS)), np.nan)
+            concentrations[:, col] = points
+            np.testing.assert_allclose(AQIEngine.sub_indices(concentrations)[:, col], AQIEngine.SUB_INDEX)
+            # Linear between breakpoints, capped at 500 above the last one
+            middle = np.full((2, len(AQIEngine.POLLUTANTS)), np.nan)
+            middle[:, col] = [(points[2] + points[3]) / 2, points[-1] * 2]
+            np.testing.assert_allclose(AQIEngine.sub_indices(middle)[:, col], [150, 500])
+
+    def test_compute_takes_the_highest_sub_index(self):
+        aqi, dominant, _ = AQIEngine.compute(self._concentrations(pm25=90, pm10=100, no2=80))
+        self.assertEqual((aqi[0], AQIEngine.POLLUTANTS[dominant[0]]), (200, 'pm25'))
+        aqi, dominant, _ = AQIEngine.compute(self._concentrations(pm25=45, pm10=50, o3=748))
+        self.assertEqual((aqi[0], AQIEngine.POLLUTANTS[dominant[0]]), (400, 'o3'))
+
+    def test_minimum_data_rule(self):
+        # Fewer than three pollutants, or no PM2.5 / PM10 among them: no AQI
+        for values in ({'pm25': 60, 'no2': 40}, {'no2': 40, 'so2': 40, 'co': 1.0}):
+            aqi, dominant, _ = AQIEngine.compute(self._concentrations(**values))
+            self.assertTrue(np.isnan(aqi[0]))
+            self.assertEqual(dominant[0], -1)
+
+    def test_categories(self):
+        cases = {0: 'Good', 50: 'Good', 51: 'Satisfactory', 100: 'Satisfactory', 101: 'Moderate',
+                 200: 'Moderate', 201: 'Poor', 300: 'Poor', 301: 'Very Poor', 400: 'Very Poor', 401: 'Severe', 500: 'Severe'}
+        for aqi, name in cases.items():
+            self.assertEqual(AQIEngine.category(aqi), name, aqi)
+        self.assertIsNone(AQIEngine.category(float('nan')))
+
+    def test_feed_pollutant_ids(self):
+        rows = AQIEngine.concentrations([[{"indexId": "PM2.5", "avg": "61"}, {"id": "OZONE", "avg": 12},
+                                          {"indexId": "Benzene", "avg": 3}, {"indexId": "NO2", "avg": "NA"}]])
+        expected = self._concentrations(pm25=61, o3=12)
+        np.testing.assert_array_equal(np.isnan(rows), np.isnan(expected))
+        np.testing.assert_allclose(rows[~np.isnan(rows)], expected[~np.isnan(expected)])
@@ -0,0 +1,61 @@
+import time
+from itertools import product
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from core.services.assignment_service import PatientAssignmentService
+
+
+class AssignmentSolverTests(SimpleTestCase):
+    @staticmethod
+    def _problem(n, m, seed, clustered):
+        """Patients (clustered around one point or spread out) x hospitals, plus the unassigned column."""
+        rng = np.random.default_rng(seed)
+        h_lat, h_lon = rng.uniform(28.3, 28.9, m), rng.uniform(76.9, 77.5, m)
+        if clustered:
+            p_lat, p_lon = rng.normal(28.6, 0.02, n), rng.normal(77.2, 0.02, n)
+        else:
+            p_lat, p_lon = rng.uniform(28.3, 28.9, n), rng.uniform(76.9, 77.5, n)
+        km = np.hypot((p_lat[:, None] - h_lat) * 111.0, (p_lon[:, None] - h_lon) * 97.6)
+        cost = np.hstack([km, np.full((n, 1), km.max() + 1.0)])
+        return cost, np.concatenate([rng.integers(2, 20, m), [n]])
+
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        for _ in range(200):
+            n, m = int(rng.integers(1, 7)), int(rng.integers(1, 4))
+            cost = np.hstack([rng.uniform(0, 10, (n, m)), np.full((n, 1), 11.0)])
+            capacity = np.concatenate([rng.integers(0, 3, m), [n]])
+            column, _ = PatientAssignmentService._solve(cost, capacity)
+            self.assertTrue((np.bincount(column, minlength=m + 1) <= capacity).all())
+            best = min(
+                cost[np.arange(n), list(a)].sum()
+                for a in product(range(m + 1), repeat=n)
+                if (np.bincount(a, minlength=m + 1) <= capacity).all()
+            )
+            self.assertAlmostEqual(cost[np.arange(n), column].sum(), best, places=9)
+
+    def test_warm_start_keeps_the_optimum(self):
+        # Above COARSEN_ABOVE the solver starts from sampled prices; the total must not move
+        cost, capacity = self._problem(400, 30, 3, clustered=True)
+        column, _ = PatientAssignmentService._solve(cost, capacity)
+        with mock.patch.object(PatientAssignmentService, 'COARSEN_ABOVE', 10 ** 9):
+            cold, _ = PatientAssignmentService._solve(cost, capacity)
+        rows = np.arange(len(cost))
+        self.assertTrue((np.bincount(column, minlength=len(capacity)) <= capacity).all())
+        self.assertAlmostEqual(cost[rows, column].sum(), cost[rows, cold].sum(), places=6)
+
+    def test_largest_batch_within_time_budget(self):
+        # The target is one second for MAX_PATIENTS x hundreds of hospitals (about half
+        # that on a dev machine); the assertion leaves 2x headroom for slow CI runners
+        # and still catches a return to the multi-second solver
+        cost, capacity = self._problem(PatientAssignmentService.MAX_PATIENTS, 300, 1, clustered=True)
+        elapsed = []
+        for _ in range(3): # best of three, so one slow scheduler tick doesn't fail the run
+            started = time.perf_counter()
+            column, _ = PatientAssignmentService._solve(cost, capacity)
+            elapsed.append(time.perf_counter() - started)
+        self.assertTrue((np.bincount(column, minlength=len(capacity)) <= capacity).all())
+        self.assertLess(min(elapsed), 2.0)
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import CityZone, Hospital, HospitalCapacityLog
+from core.services.capacity_service import CapacityHistoryService
+
+
+class CapacityHistoryTests(TestCase):
+    def setUp(self):
+        zone = CityZone.objects.create(name="Z", latitude=28.6, longitude=77.2)
+        self.hospital = Hospital.objects.create(name="H", zone=zone, total_beds_icu=30, occupied_beds_icu=0)
+        HospitalCapacityLog.objects.all().delete()
+        # Twelve saves (each logs a row), moved back to one every 10 minutes over the last two hours
+        self.now = timezone.now().replace(second=0, microsecond=0)
+        for step in range(12):
+            self.hospital.occupied_beds_icu = step
+            self.hospital.save()
+        for step, pk in enumerate(HospitalCapacityLog.objects.order_by('pk').values_list('pk', flat=True)):
+            HospitalCapacityLog.objects.filter(pk=pk).update(timestamp=self.now - timedelta(minutes=115 - step * 10))
+        CapacityHistoryService.compact()
+
+    def _history(self, **params):
+        response = self.client.get(f'/api/health/{self.hospital.pk}/capacity_history/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_resolutions(self):
+        start = (self.now - timedelta(hours=2)).isoformat()
+        end = self.now.isoformat()
+        raw = self._history(start=start, end=end, resolution='raw')
+        self.assertEqual([p["icu_occupied_avg"] for p in raw["points"]], list(range(12)))
+
+        minutes = self._history(start=start, end=end)
+        self.assertEqual(minutes["resolution"], '1m') # two hours of raw rows is past RAW_MAX_WINDOW
+        self.assertEqual(sum(p["samples"] for p in minutes["points"]), 12)
+
+        hours = self._history(start=start, end=end, resolution='1h')
+        self.assertEqual(sum(p["samples"] for p in hours["points"]), 12)
+        self.assertEqual(max(p["icu_occupied_max"] for p in hours["points"]), 11)
+
+    @override_settings(CACHES={name: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'} for name in ('default', 'shared')})
+    def test_watermark_survives_a_cache_flush(self):
+        compacted = CapacityHistoryService.compacted_through()
+        self.assertLessEqual(compacted, timezone.now())
+        caches['shared'].clear() # the shared cache culls old entries when it fills up
+        self.assertEqual(CapacityHistoryService.compacted_through(), compacted)
+
+    def test_rejects_bad_ranges(self):
+        for params in ({"start": "yesterday"}, {"start": "2024-13-45T00:00"},
+                       {"start": self.now.isoformat(), "end": (self.now - timedelta(hours=1)).isoformat()},
+                       {"resolution": "5m"}):
+            response = self.client.get(f'/api/health/{self.hospital.pk}/capacity_history/', params)
+            self.assertEqual(response.status_code, 400, params)
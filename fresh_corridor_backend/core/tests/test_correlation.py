@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.models import CityZone, HealthStats, WeatherLog
+from core.services.correlation_service import LagCorrelationService
+
+# Results are cached per day in the shared cache; keep them away from the real one
+LOCAL_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests-default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests-shared'},
+}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class AqiCorrelationTests(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, LagCorrelationService, '_results', {})
+        LagCorrelationService._results = {}
+        self.zone = CityZone.objects.create(name="Z", latitude=28.6, longitude=77.2)
+        # Cases follow AQI two days later
+        today = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        aqi = [100 + (day * 37) % 150 for day in range(30)]
+        for day in range(30):
+            when = today - timedelta(days=30 - day)
+            log = WeatherLog.objects.create(zone=self.zone, temperature_c=30, precipitation_mm=0,
+                                            wind_speed_kmh=5, visibility_km=4, air_quality_index=aqi[day])
+            stats = HealthStats.objects.create(zone=self.zone, respiratory_cases_active=aqi[day - 2] // 5 if day >= 2 else 0)
+            WeatherLog.objects.filter(pk=log.pk).update(timestamp=when)
+            HealthStats.objects.filter(pk=stats.pk).update(timestamp=when)
+
+    def test_finds_the_lag(self):
+        response = self.client.get('/api/health/aqi_correlation/', {"days": 25, "max_lag": 5, "zone": self.zone.pk})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result["lags"], [0, 1, 2, 3, 4, 5])
+        (zone,) = result["zones"]
+        self.assertEqual(zone["best_lag_days"], 2)
+        self.assertGreater(zone["best_r"], 0.99)
+
+    def test_rejects_bad_windows(self):
+        for params in ({"days": 3}, {"days": "many"}, {"max_lag": 99}):
+            self.assertEqual(self.client.get('/api/health/aqi_correlation/', params).status_code, 400, params)
@@ -0,0 +1,52 @@
+import json
+
+from django.test import SimpleTestCase
+
+from core.services.cpcb_parser import CPCBFeedParser
+
+
+class CPCBFeedParserTests(SimpleTestCase):
+    FEED = {
+        "states": [
+            {"stateId": "Delhi", "citiesInState": [
+                {"cityId": "Delhi", "stationsInCity": [
+                    {"stationName": "Anand Vihar, Delhi - DPCC", "latitude": "28.647", "longitude": "77.316",
+                     "airQualityIndexValue": 312, "lastUpdate": "18-10-2026 10:00:00",
+                     "pollutants": [{"indexId": "PM2.5", "avg": 141.5, "min": 90, "max": 210},
+                                    {"indexId": "NO2", "avg": 38.25, "min": 11, "max": 60}]},
+                    {"stationName": "R K Puram \"Sector\" पूसा", "lat": 28.563, "lon": 77.186,
+                     "pollutants": []},
+                ]},
+            ]},
+            {"stateId": "Maharashtra", "citiesInState": [
+                {"cityId": "Mumbai", "stationsInCity": [
+                    {"stationName": "Colaba", "latitude": 18.91, "lng": 72.82, "airQualityIndexValue": 1.5e2,
+                     "pollutants": [{"indexId": "OZONE", "avg": -1}]},
+                    {"note": "no coordinates, not a station", "values": [1, 2, 3]},
+                ]},
+            ]},
+        ],
+    }
+
+    def _parse(self, chunks):
+        return list(CPCBFeedParser.iter_stations(chunks))
+
+    def test_output_is_identical_at_every_chunk_size(self):
+        data = json.dumps(self.FEED, ensure_ascii=False, indent=1).encode('utf-8')
+        whole = self._parse([data])
+        self.assertEqual([s["stationName"] for s, _ in whole],
+                         ["Anand Vihar, Delhi - DPCC", 'R K Puram "Sector" पूसा', "Colaba"])
+        self.assertEqual(whole[0][1], {"stateId": "Delhi", "cityId": "Delhi"})
+        self.assertEqual(whole[0][0]["pollutants"][1], {"indexId": "NO2", "avg": 38.25, "min": 11, "max": 60})
+        self.assertEqual(whole[2][0]["airQualityIndexValue"], 150.0)
+        for size in (1, 2, 3, 5, 7, 16, 64, 4096):
+            chunks = [data[i:i + size] for i in range(0, len(data), size)]
+            self.assertEqual(self._parse(chunks), whole, f"chunk size {size}")
+        # Text chunks (already decoded) parse the same way
+        text = data.decode('utf-8')
+        self.assertEqual(self._parse([text[i:i + 3] for i in range(0, len(text), 3)]), whole)
+
+    def test_rejects_truncated_feed(self):
+        data = json.dumps(self.FEED).encode('utf-8')
+        with self.assertRaises(ValueError):
+            self._parse([data[:len(data) // 2]])
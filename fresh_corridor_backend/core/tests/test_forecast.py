@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+import numpy as np
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import CityZone, Hospital, HospitalCapacityRollup, ServiceState
+from core.services.capacity_service import CapacityHistoryService
+from core.services.forecast_service import IcuForecastService
+
+
+class IcuForecastTests(TestCase):
+    def setUp(self):
+        for name in ('_state', '_state_saved_at', '_predictions'):
+            self.addCleanup(setattr, IcuForecastService, name, getattr(IcuForecastService, name))
+        IcuForecastService._state, IcuForecastService._state_saved_at, IcuForecastService._predictions = None, None, {}
+        zone = CityZone.objects.create(name="Z", latitude=28.6, longitude=77.2)
+        self.hospital = Hospital.objects.create(name="H", zone=zone, total_beds_icu=40, occupied_beds_icu=30)
+        self.now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        # ICU filling by one bed an hour over the last day
+        HospitalCapacityRollup.objects.bulk_create([HospitalCapacityRollup(
+            hospital=self.hospital, resolution='1h', bucket_start=self.now - timedelta(hours=t), samples=60,
+            icu_occupied_avg=30 - t, icu_occupied_max=30 - t, icu_total=40, general_occupied_avg=0,
+            general_occupied_max=0, general_total=100, oxygen_avg=100, oxygen_min=100,
+        ) for t in range(24, 0, -1)])
+        ServiceState.objects.create(key=CapacityHistoryService.WATERMARK_KEY,
+                                    value=(self.now + timedelta(minutes=5)).isoformat())
+
+    def test_forecast_endpoint(self):
+        response = self.client.get('/api/health/forecast/', {"hours": 24})
+        self.assertEqual(response.status_code, 200)
+        (hospital,) = response.json()["hospitals"]
+        self.assertEqual(len(hospital["predicted_icu_occupied"]), 24)
+        self.assertIsNotNone(hospital["hours_until_full"])
+        self.assertEqual(self.client.get('/api/health/forecast/', {"hours": 100}).status_code, 400)
+
+    def test_other_processes_resume_from_the_stored_state(self):
+        state = IcuForecastService.update()
+        self.assertEqual(state["last_bucket"], self.now - timedelta(hours=1))
+        # A fresh process (no in-memory state) continues from the database row, not from scratch
+        IcuForecastService._state, IcuForecastService._state_saved_at = None, None
+        resumed = IcuForecastService.update()
+        self.assertEqual(resumed["last_bucket"], state["last_bucket"])
+        np.testing.assert_array_equal(resumed["observations"], state["observations"])
+        np.testing.assert_allclose(resumed["level"], state["level"])
+        np.testing.assert_allclose(resumed["sse"], state["sse"])
@@ -0,0 +1,31 @@
+from django.test import TransactionTestCase
+
+from core.models import CityZone, TrafficStats
+from core.services.job_service import JobService
+
+
+class SimulationJobTests(TransactionTestCase):
+    """Submit through the API, run with the worker loop, poll the result (worker threads need real commits)."""
+
+    def setUp(self):
+        self.zone = CityZone.objects.create(name="Z", latitude=28.6, longitude=77.2)
+        TrafficStats.objects.create(zone=self.zone, congestion_level=0.4)
+
+    def test_submit_run_and_poll(self):
+        response = self.client.post('/api/planner/jobs/', {"kind": "what_if", "zone_id": self.zone.pk,
+                                                            "rain_intensity": 50}, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()["job_id"]
+        self.assertEqual(self.client.get(f'/api/planner/jobs/{job_id}/').json()["status"], "queued")
+
+        JobService.work(workers=1, poll_interval=0.05, once=True)
+        status = self.client.get(f'/api/planner/jobs/{job_id}/').json()
+        self.assertEqual((status["status"], status["progress"]), ("done", 1.0))
+        self.assertEqual(status["result"]["status"], "success")
+
+    def test_rejects_bad_submissions(self):
+        for body in ({"kind": "what_if", "zone_id": 999}, {"kind": "what_if", "zone_id": [1]},
+                     {"kind": "nope", "zone_id": self.zone.pk}, ["what_if"]):
+            response = self.client.post('/api/planner/jobs/', body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(self.client.get('/api/planner/jobs/12345/').status_code, 404)
@@ -0,0 +1,63 @@
+import numpy as np
+from django.test import TestCase
+
+from core.models import CityZone, Hospital, HospitalCapacityLog
+from core.services.cache_service import ScenarioCache
+from core.services.hospital_index import HospitalIndex
+
+
+class NearestAvailableTests(TestCase):
+    def setUp(self):
+        self.addCleanup(setattr, HospitalIndex, '_tree', None)
+        HospitalIndex._tree = None
+        for i, occupied in enumerate([30, 10, 0]): # nearest first from (28.6, 77.2); the nearest is full
+            zone = CityZone.objects.create(name=f"Z{i}", latitude=28.6 + i / 10, longitude=77.2)
+            Hospital.objects.create(name=f"H{i}", zone=zone, total_beds_icu=30, occupied_beds_icu=occupied)
+
+    def _names(self, **params):
+        response = self.client.get('/api/health/nearest_available/', {"lat": 28.6, "long": 77.2, **params})
+        self.assertEqual(response.status_code, 200)
+        return [h["name"] for h in response.json()]
+
+    def test_skips_hospitals_without_free_beds(self):
+        self.assertEqual(self._names(k=2), ["H1", "H2"])
+        self.assertEqual(self._names(k=5, min_icu=25), ["H2"])
+        self.assertEqual(self._names(k=5, radius=15), ["H1"])
+
+        # A save in this process is reflected in the very next query after it commits
+        hospital = Hospital.objects.get(name="H0")
+        hospital.occupied_beds_icu = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            hospital.save()
+        self.assertEqual(self._names(k=1), ["H0"])
+
+    def test_saves_from_other_processes_are_replayed(self):
+        self.assertEqual(self._names(k=1), ["H1"])
+        # What another process leaves behind: the row, its log entry and a version bump (no local signal)
+        Hospital.objects.filter(name="H0").update(occupied_beds_icu=0)
+        HospitalCapacityLog.objects.create(hospital=Hospital.objects.get(name="H0"), occupied_beds_icu=0,
+                                           total_beds_icu=30, occupied_beds_general=0, total_beds_general=100,
+                                           oxygen_supply_level=100)
+        ScenarioCache.bump(HospitalIndex.CAPACITY_SCOPE)
+        HospitalIndex._capacity_checked_at = 0.0
+        self.assertEqual(self._names(k=1), ["H0"])
+
+    def test_partial_updates_keep_node_maxima_exact(self):
+        zones = list(CityZone.objects.all())
+        rng = np.random.default_rng(5)
+        Hospital.objects.bulk_create([
+            Hospital(name=f"B{i}", zone=zones[i % len(zones)], total_beds_icu=30, occupied_beds_icu=int(rng.integers(0, 31)))
+            for i in range(200)
+        ])
+        ScenarioCache.bump(HospitalIndex.VERSION_SCOPE)
+        tree = HospitalIndex.tree()
+        positions = rng.choice(len(tree["ids"]), 20, replace=False)
+        updated = HospitalIndex._with_capacity(tree, {int(p): (float(rng.integers(0, 5)), 1.0, 50.0) for p in positions})
+        expected = {**updated, "node_max": np.zeros_like(updated["node_max"])}
+        HospitalIndex._recompute_node_max(expected)
+        np.testing.assert_array_equal(updated["node_max"], expected["node_max"])
+        self.assertFalse(np.shares_memory(updated["capacity"], tree["capacity"])) # queries holding `tree` are unaffected
+
+    def test_rejects_bad_parameters(self):
+        for params in ({"lat": 28.6}, {"lat": 28.6, "long": 77.2, "k": "many"}):
+            self.assertEqual(self.client.get('/api/health/nearest_available/', params).status_code, 400, params)
@@ -0,0 +1,56 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+
+from core.models import CityZone, Hospital, WeatherLog
+from core.services.cache_service import ScenarioCache
+from core.services.simulation_service import SimulationService
+
+
+class ResilienceLeaderboardTests(TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, (aqi, occupied) in enumerate([(300, 28), (60, 5), (150, 15)]):
+                zone = CityZone.objects.create(name=f"Z{i}", latitude=28.5 + i / 10, longitude=77.1)
+                WeatherLog.objects.create(zone=zone, temperature_c=30, precipitation_mm=0, wind_speed_kmh=5,
+                                          visibility_km=4, air_quality_index=aqi)
+                Hospital.objects.create(name=f"H{i}", zone=zone, total_beds_icu=30, occupied_beds_icu=occupied)
+
+    def test_ranks_every_zone_from_the_materialized_table(self):
+        response = self.client.get('/api/planner/resilience_leaderboard/')
+        self.assertEqual(response.status_code, 200)
+        ranking = response.json()
+        self.assertEqual([z["zone_name"] for z in ranking], ["Z1", "Z2", "Z0"])
+        scores = [z["overall_resilience_score"] for z in ranking]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+        # New readings move the ranking without any recompute on the request path
+        with self.captureOnCommitCallbacks(execute=True):
+            WeatherLog.objects.create(zone=CityZone.objects.get(name="Z0"), temperature_c=30, precipitation_mm=0,
+                                      wind_speed_kmh=5, visibility_km=4, air_quality_index=20)
+            Hospital.objects.filter(name="H0").update(occupied_beds_icu=0)
+            Hospital.objects.get(name="H0").save()
+        top = self.client.get('/api/planner/resilience_leaderboard/', {'limit': 1}).json()
+        self.assertEqual([z["zone_name"] for z in top], ["Z0"])
+
+    def test_rejects_bad_limit(self):
+        for limit in ('0', '-3', 'ten'):
+            response = self.client.get('/api/planner/resilience_leaderboard/', {'limit': limit})
+            self.assertEqual(response.status_code, 400, limit)
+
+    def test_saves_in_one_transaction_recompute_each_zone_once(self):
+        hospitals = list(Hospital.objects.all())
+        refresh = mock.patch.object(SimulationService, 'refresh_resilience', wraps=SimulationService.refresh_resilience)
+        bump = mock.patch.object(ScenarioCache, 'bump', wraps=ScenarioCache.bump)
+        with refresh as refreshed, bump as bumped, self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                for _ in range(3):
+                    for hospital in hospitals:
+                        hospital.occupied_beds_icu += 1
+                        hospital.save()
+            self.assertFalse(refreshed.called) # nothing happens before commit
+        self.assertEqual(sorted(c.args[0] for c in refreshed.call_args_list), sorted(h.zone_id for h in hospitals))
+        scopes = [c.args[0] for c in bumped.call_args_list]
+        self.assertEqual(len(scopes), len(set(scopes)))
+        self.assertIn('hospital_capacity', scopes)
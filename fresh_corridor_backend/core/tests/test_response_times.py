@@ -0,0 +1,23 @@
+import numpy as np
+from django.test import SimpleTestCase
+
+from core.services.simulation_service import SimulationService
+
+
+class ResponseTimeTests(SimpleTestCase):
+    def test_live_road_time_is_not_delayed_twice(self):
+        observed = np.array([0.2, 0.7, 0.9])
+        live = np.array([9.5, 12.9, 20.0]) # road times already reflecting `observed`
+        _, response, _ = SimulationService.project_scenarios(observed, 28.6, 0.0, 0.0, live, observed_congestion=observed)
+        np.testing.assert_allclose(response, live)
+        # Extra load only adds the delay of the extra congestion
+        _, response, _ = SimulationService.project_scenarios(observed, 28.6, 0.0, 20.0, live, observed_congestion=observed)
+        expected = live * SimulationService._delay_factor(np.clip(observed + 0.2, 0, 1)) / SimulationService._delay_factor(observed)
+        np.testing.assert_allclose(response, expected)
+
+    def test_flat_fallback_matches_the_uncongested_model(self):
+        observed = np.array([0.2, 0.7, 0.9])
+        base = SimulationService.BASE_RESPONSE_TIME_MIN * SimulationService._delay_factor(observed)
+        _, with_observed, _ = SimulationService.project_scenarios(observed, 28.6, 30.0, 10.0, base, observed_congestion=observed)
+        _, uncongested, _ = SimulationService.project_scenarios(observed, 28.6, 30.0, 10.0)
+        np.testing.assert_allclose(with_observed, uncongested)
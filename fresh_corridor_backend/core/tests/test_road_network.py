@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import CityZone, RealTimeTraffic, TrafficStats
+from core.services.road_network import RoadNetwork
+
+
+class LiveCongestionTests(TestCase):
+    def setUp(self):
+        self.near = CityZone.objects.create(name="Near", latitude=28.60, longitude=77.20)
+        self.far = CityZone.objects.create(name="Far", latitude=28.90, longitude=77.50)
+        TrafficStats.objects.create(zone=self.near, congestion_level=0.2)
+
+    def _reading(self, lat, lon, score, age=timedelta(0)):
+        reading = RealTimeTraffic.objects.create(
+            zone_id=RoadNetwork.zone_for_point(lat, lon), latitude=lat, longitude=lon,
+            current_speed=20, free_flow_speed=50, current_travel_time=120, free_flow_travel_time=60,
+            congestion_score=score, confidence=90, road_class='FRC2', road_closure=False,
+        )
+        RealTimeTraffic.objects.filter(pk=reading.pk).update(timestamp=timezone.now() - age)
+        return reading
+
+    def test_readings_are_tagged_with_the_nearest_zone(self):
+        self.assertEqual(self._reading(28.61, 77.21, 10).zone_id, self.near.pk)
+        self.assertIsNone(self._reading(19.07, 72.87, 10).zone_id) # no zone within LIVE_ZONE_RADIUS_KM
+
+    def test_recent_readings_raise_congestion(self):
+        zone_ids = [self.near.pk, self.far.pk]
+        self.assertEqual(RoadNetwork._zone_congestion(zone_ids).tolist(), [0.2, 0.0])
+        self._reading(28.61, 77.21, 90, age=RoadNetwork.LIVE_MAX_AGE * 2)
+        self.assertEqual(RoadNetwork._zone_congestion(zone_ids).tolist(), [0.2, 0.0]) # too old to count
+        self._reading(28.61, 77.21, 60)
+        self.assertEqual(RoadNetwork._zone_congestion(zone_ids).tolist(), [0.6, 0.0])
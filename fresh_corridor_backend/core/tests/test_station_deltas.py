@@ -0,0 +1,55 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core.services.aqi_service import AQIService
+
+
+@override_settings(AQI_SNAPSHOT_PATH=os.path.join(tempfile.gettempdir(), 'core-tests-missing', 'aqi.json.gz'))
+class StationDeltaTests(SimpleTestCase):
+    """Versioned deltas over an in-memory snapshot (no feed, no refresher thread)."""
+
+    def setUp(self):
+        saved = {name: getattr(AQIService, name) for name in ('STATIONS', 'version', 'fetched_at', '_deltas')}
+        self.addCleanup(lambda: [setattr(AQIService, name, value) for name, value in saved.items()])
+        patcher = mock.patch.object(AQIService, 'ensure_refresher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        AQIService.STATIONS, AQIService.version, AQIService.fetched_at = [], 0, 1000.0
+        AQIService._deltas = {"history_from": 0, "stations": {}, "removed": []}
+
+    @staticmethod
+    def _station(name, aqi, lat=28.6, lon=77.2, live_ts='t0'):
+        return {"name": name, "city": "Delhi", "state": "Delhi", "lat": lat, "lon": lon, "aqi": aqi, "live_ts": live_ts}
+
+    def _publish(self, stations):
+        AQIService.STATIONS = AQIService._apply_versions(stations)
+        AQIService.fetched_at += 600
+        return AQIService.version
+
+    def test_changes_since(self):
+        v1 = self._publish([self._station("A", 100), self._station("B", 200)])
+        v2 = self._publish([self._station("A", 100, live_ts='t1'), self._station("B", 250), self._station("C", 50)])
+        delta = AQIService.changes_since(v1)
+        self.assertFalse(delta["full"])
+        self.assertEqual(delta["version"], v2)
+        self.assertEqual([s["name"] for s in delta["added"]], ["C"])
+        self.assertEqual([s["name"] for s in delta["changed"]], ["B"]) # A only has a new timestamp
+        self.assertEqual(delta["removed"], [])
+
+        v3 = self._publish([self._station("B", 250), self._station("C", 50)])
+        delta = AQIService.changes_since(v2)
+        self.assertEqual((delta["added"], delta["changed"]), ([], []))
+        self.assertEqual(delta["removed"], [AQIService.station_key(self._station("A", 0))])
+        self.assertEqual(AQIService.changes_since(v3)["removed"], [])
+        # Unknown future versions fall back to the full list
+        self.assertTrue(AQIService.changes_since(v3 + 5)["full"])
+
+    def test_old_versions_get_the_full_list(self):
+        with mock.patch.object(AQIService, 'DELTA_HISTORY', 2):
+            for aqi in (10, 20, 30, 40):
+                self._publish([self._station("A", aqi)])
+            self.assertTrue(AQIService.changes_since(1)["full"])
+            self.assertFalse(AQIService.changes_since(AQIService.version - 1)["full"])
@@ -0,0 +1,66 @@
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core.services.aqi_service import AQIService
+from core.services.station_index import StationIndex
+
+
+@override_settings(AQI_SNAPSHOT_PATH=os.path.join(tempfile.gettempdir(), 'core-tests-missing', 'aqi.json.gz'))
+class StationQueryTests(SimpleTestCase):
+    """Filters and cursor paging over an in-memory snapshot (no feed, no refresher thread)."""
+
+    def setUp(self):
+        saved = {name: getattr(AQIService, name) for name in ('STATIONS', 'fetched_at')}
+        self.addCleanup(lambda: [setattr(AQIService, name, value) for name, value in saved.items()])
+        self.addCleanup(setattr, StationIndex, '_index', None)
+        patcher = mock.patch.object(AQIService, 'ensure_refresher')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        AQIService.STATIONS, AQIService.fetched_at = [], 1000.0
+        StationIndex._index = None
+
+    @staticmethod
+    def _station(name, aqi, lat=28.6, lon=77.2, state="Delhi"):
+        return {"name": name, "city": state, "state": state, "lat": lat, "lon": lon, "aqi": aqi}
+
+    def _publish(self, stations):
+        AQIService.STATIONS = stations
+        AQIService.fetched_at += 600
+
+    def _names(self, params):
+        page, total, _ = StationIndex.query(params)
+        return sorted(s["name"] for s in page), total
+
+    def test_filters(self):
+        self._publish([self._station("A", 40, 28.50, 77.10), self._station("B", 180, 28.70, 77.30),
+                       self._station("C", 320, 19.07, 72.87, state="Maharashtra")])
+        self.assertEqual(self._names({"min_aqi": "100"}), (["B", "C"], 2))
+        self.assertEqual(self._names({"state": "delhi"}), (["A", "B"], 2))
+        self.assertEqual(self._names({"bbox": "28.4,77.0,28.6,77.2"}), (["A"], 1))
+        self.assertEqual(self._names({"lat": "28.70", "long": "77.30", "radius": "5"}), (["B"], 1))
+
+    def test_cursor_pages_cover_every_match_once(self):
+        self._publish([self._station(f"S{i}", i * 10, lat=28.0 + i / 100) for i in range(25)])
+        pages, cursor = [], None
+        while True:
+            params = {"limit": "7", "min_aqi": "30"}
+            if cursor:
+                params["cursor"] = cursor
+            page, total, cursor = StationIndex.query(params)
+            pages.append([s["name"] for s in page])
+            if cursor is None:
+                break
+        self.assertEqual(total, 22)
+        self.assertEqual([len(p) for p in pages], [7, 7, 7, 1])
+        self.assertEqual(sum(pages, []), [f"S{i}" for i in range(3, 25)])
+
+        # A cursor from an older snapshot is refused rather than skipping stations
+        _, _, stale = StationIndex.query({"limit": "5"})
+        self._publish([self._station("X", 1)])
+        with self.assertRaises(ValueError):
+            StationIndex.query({"limit": "5", "cursor": stale})
+        with self.assertRaises(ValueError):
+            StationIndex.query({"cursor": stale})
@@ -1,4 +1,7 @@
 import math
+import numpy as np
+from django.db.models import F, OuterRef, Subquery, Window
+from django.db.models.functions import RowNumber
 
 def haversine(lat1, lon1, lat2, lon2):
     """
@@ -15,3 +18,29 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * math.asin(math.sqrt(a)) 
     r = 6371 # Radius of earth in kilometers. Use 3956 for miles.
     return c * r
+
+def haversine_many(lat, lon, lats, lons):
+    """Vectorized haversine: km from one point to arrays of points (decimal degrees)."""
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+    a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(a)) * 6371
+
+def latest_for_zone(model, field, zone_ref='pk'):
+    """
+    Subquery returning `field` from the newest `model` row of the outer zone.
+    Mirrors `model.objects.filter(zone=zone).last()` (highest pk), but lets callers
+    annotate every zone in a single query instead of one lookup per zone.
+    """
+    return Subquery(
+        model.objects.filter(zone=OuterRef(zone_ref)).order_by('-pk').values(field)[:1]
+    )
+
+def latest_per_zone(queryset):
+    """
+    Narrows a per-zone log queryset (WeatherLog, TrafficStats, ...) to the newest row
+    of each zone with a ROW_NUMBER() window, i.e. `.last()` for every zone in one query.
+    """
+    return queryset.annotate(
+        zone_row=Window(RowNumber(), partition_by=F('zone'), order_by=F('pk').desc())
+    ).filter(zone_row=1)
@@ -1,3 +1,5 @@
+import json
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
 from rest_framework import viewsets
 from rest_framework.decorators import action
@@ -7,7 +9,7 @@ from .services.simulation_service import SimulationService
 from .serializers import (
     CityZoneSerializer, WeatherLogSerializer, HospitalSerializer, 
     TrafficStatsSerializer, AgriSupplySerializer, CitizenReportSerializer, HealthStatsSerializer,
-    LoginSerializer, SignupSerializer, UserSerializer
+    LoginSerializer, SignupSerializer, UserSerializer, HospitalDistanceSerializer
 )
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
@@ -129,6 +131,39 @@ class PlannerViewSet(viewsets.ModelViewSet):
             'hospitals': HospitalSerializer(hospitals, many=True).data
         })
 
+    @action(detail=False, methods=['get'], url_path='full_status')
+    def bulk_full_status(self, request):
+        """
+        Consolidated status for many zones in one response (four queries in total).
+        Filter with ?ids=1,2,3 or ?bbox=min_lat,min_lon,max_lat,max_lon; all zones otherwise.
+        """
+        from .utils import latest_per_zone
+
+        zones = CityZone.objects.order_by('pk')
+        try:
+            if 'ids' in request.query_params:
+                ids = [int(i) for i in request.query_params['ids'].split(',') if i]
+                zones = zones.filter(pk__in=ids)
+            if 'bbox' in request.query_params:
+                min_lat, min_lon, max_lat, max_lon = map(float, request.query_params['bbox'].split(','))
+                zones = zones.filter(latitude__range=(min_lat, max_lat), longitude__range=(min_lon, max_lon))
+        except ValueError:
+            return Response({"error": "ids must be integers and bbox must be min_lat,min_lon,max_lat,max_lon"}, status=400)
+
+        zones = list(zones)
+        weather = {w.zone_id: w for w in latest_per_zone(WeatherLog.objects.filter(zone__in=zones).select_related('zone'))}
+        traffic = {t.zone_id: t for t in latest_per_zone(TrafficStats.objects.filter(zone__in=zones).select_related('zone'))}
+        hospitals = {}
+        for h in Hospital.objects.filter(zone__in=zones).select_related('zone'):
+            hospitals.setdefault(h.zone_id, []).append(h)
+
+        return Response([{
+            'zone': CityZoneSerializer(zone).data,
+            'weather': WeatherLogSerializer(weather[zone.pk]).data if zone.pk in weather else None,
+            'traffic': TrafficStatsSerializer(traffic[zone.pk]).data if zone.pk in traffic else None,
+            'hospitals': HospitalSerializer(hospitals.get(zone.pk, []), many=True).data
+        } for zone in zones])
+
     @action(detail=True, methods=['get'])
     def resilience_metrics(self, request, pk=None):
         """Feature B: City Resilience Metrics"""
@@ -137,13 +172,126 @@ class PlannerViewSet(viewsets.ModelViewSet):
             return Response(metrics)
         return Response({"error": "Zone not found"}, status=404)
 
+    @action(detail=True, methods=['get'])
+    def travel_times(self, request, pk=None):
+        """Ambulance travel times from every hospital to this zone over the road network"""
+        from .services.road_network import RoadNetwork
+
+        zone = self.get_object()
+        times = RoadNetwork.hospital_times(zone.pk)
+        if times is None:
+            return Response({"error": "Road network not available yet"}, status=503)
+        return Response({
+            "zone_id": zone.pk,
+            "hospitals": [{"hospital_id": h, "minutes": round(m, 1)} for h, m in times]
+        })
+
+    @action(detail=False, methods=['get'])
+    def resilience_leaderboard(self, request):
+        """Citywide resilience ranking served from the materialized ZoneResilience table"""
+        limit = request.query_params.get('limit')
+        try:
+            limit = int(limit) if limit else None
+            if limit is not None and limit < 1:
+                raise ValueError(limit)
+        except ValueError:
+            return Response({"error": "limit must be a positive integer"}, status=400)
+        return Response(SimulationService.resilience_leaderboard(limit))
+
+    def _enqueue(self, kind, params):
+        """Queues a SimulationJob for the simulation_worker command and answers 202 with its id"""
+        from .services.job_service import JobService
+
+        try:
+            job = JobService.submit(kind, params)
+        except ValueError as e:
+            return Response({"status": "error", "message": str(e)}, status=400)
+        return Response(JobService.status_payload(job), status=202)
+
     @action(detail=True, methods=['post'])
     def simulate(self, request, pk=None):
-        """Core Feature: What-If Simulation"""
+        """Core Feature: What-If Simulation. Pass "async": true (a JSON boolean) to run it as a background job."""
         modifiers = request.data
+        if modifiers.get('async') is True:
+            zone = self.get_object()
+            kind = 'monte_carlo' if modifiers.get('mode') == 'monte_carlo' else 'what_if'
+            return self._enqueue(kind, {**modifiers, 'zone_id': zone.pk})
         result = SimulationService.run_what_if_simulation(pk, modifiers)
         return Response(result)
 
+    @action(detail=False, methods=['post'])
+    def simulate_batch(self, request):
+        """
+        Batch What-If: sweeps rain_intensity x traffic_load over many zones.
+        Body: {"zones": [1, 2] or "all", "rain_intensity": [0, 50, 100], "traffic_load": [0, 20]}
+        """
+        zones = request.data.get('zones', 'all')
+        zone_ids = None if zones == 'all' else zones
+        if zone_ids is not None and not isinstance(zone_ids, list):
+            return Response({"status": "error", "message": "zones must be a list of ids or 'all'"}, status=400)
+        if request.data.get('async') is True:
+            return self._enqueue('batch', {
+                'zones': zones,
+                'rain_intensity': request.data.get('rain_intensity', [0]),
+                'traffic_load': request.data.get('traffic_load', [0])
+            })
+
+        result = SimulationService.run_batch_simulation(
+            zone_ids,
+            request.data.get('rain_intensity', [0]),
+            request.data.get('traffic_load', [0])
+        )
+        if result['status'] != 'success':
+            return Response(result, status=400)
+        return Response(result)
+
+    @action(detail=True, methods=['get', 'post'])
+    def simulate_timeline(self, request, pk=None):
+        """
+        Time-stepped What-If: streams one JSON object per simulated hour.
+        NDJSON by default; pass ?stream=sse for server-sent events (EventSource uses GET).
+        """
+        zone = self.get_object()
+        modifiers = request.data if request.method == 'POST' else request.query_params
+        try:
+            steps = SimulationService.run_timeline(zone.pk, modifiers, modifiers.get('hours', 24))
+        except ValueError as e:
+            return Response({"status": "error", "message": str(e)}, status=400)
+
+        if request.query_params.get('stream') == 'sse':
+            body = (f"event: step\ndata: {json.dumps(step)}\n\n" for step in steps)
+            response = StreamingHttpResponse(body, content_type='text/event-stream')
+        else:
+            body = (json.dumps(step) + "\n" for step in steps)
+            response = StreamingHttpResponse(body, content_type='application/x-ndjson')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # let nginx pass steps through as they are produced
+        return response
+
+    @action(detail=False, methods=['post'])
+    def jobs(self, request):
+        """
+        Submit a long simulation as a background job; returns 202 with a job id to poll.
+        Body: {"kind": "what_if" | "monte_carlo" | "timeline" | "batch", "zone_id": 1, ...same params as the sync endpoint}
+        """
+        if not isinstance(request.data, dict):
+            return Response({"status": "error", "message": "body must be a JSON object"}, status=400)
+        kind = request.data.get('kind')
+        params = {k: v for k, v in request.data.items() if k != 'kind'}
+        return self._enqueue(kind, params)
+
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>\d+)')
+    def job_status(self, request, job_id=None):
+        """Poll a background job: status, progress (0-1) and the result once done"""
+        from .models import SimulationJob
+        from .services.job_service import JobService
+
+        try:
+            job = SimulationJob.objects.get(pk=job_id)
+        except SimulationJob.DoesNotExist:
+            return Response({"error": "Job not found"}, status=404)
+        return Response(JobService.status_payload(job))
+
 @api_view(['GET'])
 @permission_classes([AllowAny]) 
 def get_user_profile(request):
@@ -172,93 +320,267 @@ def get_user_profile(request):
 
 # --- Tab 2: Health View ---
 class HealthViewSet(viewsets.ModelViewSet):
-    queryset = Hospital.objects.all()
+    queryset = Hospital.objects.select_related('zone')
     serializer_class = HospitalSerializer
 
     def list(self, request, *args, **kwargs):
-        """Standard list, but with optional location filtering"""
+        """
+        Standard list, but with optional location filtering.
+        With lat/long: hospitals within ?radius km (default 50), nearest first, with distance_km.
+        ?k=N keeps only the N nearest.
+        """
         lat = request.query_params.get('lat')
         long = request.query_params.get('long')
-        radius = float(request.query_params.get('radius', 50)) # Default 50km
-
-        hospitals = list(self.get_queryset())
+        k = request.query_params.get('k')
 
         if lat and long:
-            from .utils import haversine
-            u_lat, u_long = float(lat), float(long)
-            
-            # Annotate with distance
-            for h in hospitals:
-                h.distance_km = haversine(u_lat, u_long, h.zone.latitude, h.zone.longitude)
-            
-            # Filter and Sort
-            hospitals = [h for h in hospitals if h.distance_km <= radius]
-            hospitals.sort(key=lambda x: x.distance_km)
-            
-            # Serialize (we need to pass many=True manually since we converted to list)
-            serializer = self.get_serializer(hospitals, many=True)
-            # Add distance to response if needed, but serializer fields are fixed. 
-            # ideally we'd add a custom field, but for now just returning sorted list is good.
+            from .services.hospital_index import HospitalIndex
+
+            try:
+                lat, long = float(lat), float(long)
+                radius = float(request.query_params.get('radius', 50)) # Default 50km
+                k = int(k) if k else None
+            except ValueError:
+                return Response({"error": "lat, long and radius must be numbers and k an integer"}, status=400)
+
+            # Radius / k-nearest search on the in-memory KD-tree, then one query for the rows
+            hits = HospitalIndex.nearest(lat, long, k, radius)
+            rows = self.get_queryset().in_bulk([h for h, _ in hits])
+            hospitals = []
+            for hospital_id, distance in hits:
+                if hospital_id in rows: # skip rows deleted since the index was built
+                    hospital = rows[hospital_id]
+                    hospital.distance_km = round(distance, 2)
+                    hospitals.append(hospital)
+
+            serializer = HospitalDistanceSerializer(hospitals, many=True, context=self.get_serializer_context())
             return Response(serializer.data)
 
         return super().list(request, *args, **kwargs)
 
+    @action(detail=True, methods=['get'])
+    def capacity_history(self, request, pk=None):
+        """
+        Bed occupancy history for charts.
+        ?start=&end= (ISO 8601, default: last 24 hours); ?resolution=raw|1m|1h|1d overrides the
+        automatic choice, which keeps the response to a few hundred points.
+        """
+        from datetime import timedelta
+        from django.utils import timezone
+        from django.utils.dateparse import parse_datetime
+        from .services.capacity_service import CapacityHistoryService
+
+        hospital = self.get_object()
+        params = request.query_params
+        try:
+            end = parse_datetime(params['end']) if params.get('end') else timezone.now()
+            start = parse_datetime(params['start']) if params.get('start') else (end - timedelta(hours=24) if end else None)
+        except ValueError: # well-formed but out of range, e.g. 2024-13-45T00:00
+            start = end = None
+        resolution = params.get('resolution')
+        if start is None or end is None or start >= end:
+            return Response({"error": "start and end must be ISO 8601 datetimes with start < end"}, status=400)
+        if resolution and resolution not in ('raw', '1m', '1h', '1d'):
+            return Response({"error": "resolution must be raw, 1m, 1h or 1d"}, status=400)
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        return Response(CapacityHistoryService.history(hospital.pk, start, end, resolution))
+
+    @action(detail=False, methods=['get'])
+    def forecast(self, request):
+        """
+        ICU occupancy forecast per hospital, soonest to fill first.
+        ?hours=24 (1-48) horizon; ?hospital=<id> for a single hospital.
+        """
+        from .services.forecast_service import IcuForecastService
+
+        try:
+            payload = IcuForecastService.forecast(request.query_params.get('hours', 24))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        hospital = request.query_params.get('hospital')
+        if hospital:
+            payload = {**payload, "hospitals": [h for h in payload["hospitals"] if str(h["hospital_id"]) == hospital]}
+        return Response(payload)
+
+    @action(detail=False, methods=['post'])
+    def assign_patients(self, request):
+        """
+        Assigns a batch of patients to hospitals with free beds, minimizing total travel distance.
+        Body: {"patients": [{"id": "p1", "lat": 28.6, "lon": 77.2, "acuity": "icu" | "general"}], "max_km": 25 (optional)}
+        At most PatientAssignmentService.MAX_PATIENTS (2000) patients per request.
+        """
+        from .services.assignment_service import PatientAssignmentService
+
+        try:
+            result = PatientAssignmentService.assign(request.data.get('patients'), request.data.get('max_km'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(result)
+
+    @action(detail=False, methods=['get'])
+    def nearest_available(self, request):
+        """
+        k nearest hospitals that can take a patient right now.
+        ?lat=&long= required; ?k=5, ?min_icu=1, ?min_general=0, ?min_oxygen=0 (%), ?radius= (km, optional)
+        """
+        from .services.hospital_index import HospitalIndex
+
+        params = request.query_params
+        try:
+            lat, long = float(params['lat']), float(params['long'])
+            hits = HospitalIndex.nearest_available(
+                lat, long,
+                k=int(params.get('k', 5)),
+                min_icu=int(params.get('min_icu', 1)),
+                min_general=int(params.get('min_general', 0)),
+                min_oxygen=float(params.get('min_oxygen', 0)),
+                radius_km=float(params['radius']) if params.get('radius') else None
+            )
+        except (KeyError, ValueError):
+            return Response({"error": "lat and long are required; k, min_icu, min_general, min_oxygen and radius must be numbers"}, status=400)
+
+        names = dict(Hospital.objects.filter(pk__in=[h[0] for h in hits]).values_list('pk', 'name'))
+        return Response([{
+            "hospital_id": hospital_id,
+            "name": names.get(hospital_id),
+            "distance_km": round(distance, 2),
+            "free_beds_icu": free_icu,
+            "free_beds_general": free_general,
+            "oxygen_supply_level": oxygen
+        } for hospital_id, distance, free_icu, free_general, oxygen in hits if hospital_id in names])
+
+    @staticmethod
+    def _epidemiology_collection():
+        """
+        GeoJSON FeatureCollection of the latest health + weather reading per zone.
+        Built with one annotated query and cached until core.signals bumps the
+        'epidemiology' version (new HealthStats / WeatherLog rows or zone edits).
+        """
+        from .services.cache_service import ScenarioCache
+        from .utils import latest_for_zone
+
+        key = ScenarioCache.scope_key('epidemiology', 'epidemiology')
+        collection = ScenarioCache.get(key)
+        if collection is not None:
+            return collection
+
+        rows = CityZone.objects.order_by('pk').annotate(
+            resp_cases=latest_for_zone(HealthStats, 'respiratory_cases_active'),
+            aqi=latest_for_zone(WeatherLog, 'air_quality_index'),
+            pollutant_details=latest_for_zone(WeatherLog, 'pollutant_details'),
+            temperature=latest_for_zone(WeatherLog, 'temperature_c'),
+        ).filter(resp_cases__isnull=False, aqi__isnull=False).values_list(
+            'name', 'latitude', 'longitude', 'resp_cases', 'aqi', 'pollutant_details', 'temperature'
+        )
+        collection = {
+            "type": "FeatureCollection",
+            "features": [{
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [longitude, latitude]},
+                "properties": {
+                    'zone_name': name,
+                    'latitude': latitude,
+                    'longitude': longitude,
+                    'resp_cases': resp_cases,
+                    'aqi': aqi,
+                    'pollutant_details': pollutant_details,
+                    'temperature': temperature,
+                }
+            } for name, latitude, longitude, resp_cases, aqi, pollutant_details, temperature in rows]
+        }
+        ScenarioCache.set(key, collection)
+        return collection
+
     @action(detail=False, methods=['get'])
     def epidemiology(self, request):
-        """Feature A: Epidemiological Heatmap (Resp Cases vs Pollution)"""
-        data = []
-        zones = CityZone.objects.all()
-        
+        """
+        Feature A: Epidemiological Heatmap (Resp Cases vs Pollution)
+        Sorted by distance when lat/long are given; ?output=geojson returns a FeatureCollection.
+        """
+        from .utils import haversine_many
+
+        collection = self._epidemiology_collection()
+        features = collection["features"]
+
         lat = request.query_params.get('lat')
         long = request.query_params.get('long')
-        
-        for zone in zones:
-            health_stats = HealthStats.objects.filter(zone=zone).last()
-            weather = WeatherLog.objects.filter(zone=zone).last()
-            
-            dist = 0
+
+        distances = [0] * len(features)
+        if lat and long and features:
+            dist = haversine_many(
+                float(lat), float(long),
+                [f["properties"]["latitude"] for f in features],
+                [f["properties"]["longitude"] for f in features]
+            )
+            # Sort by distance if location provided
+            order = dist.argsort(kind='stable')
+            features = [features[i] for i in order]
+            distances = [round(float(d), 2) for d in dist[order]]
+
+        if request.query_params.get('output') == 'geojson':
             if lat and long:
-                 from .utils import haversine
-                 dist = haversine(float(lat), float(long), zone.latitude, zone.longitude)
-
-            if health_stats and weather:
-                data.append({
-                    'zone_name': zone.name,
-                    'latitude': zone.latitude,
-                    'longitude': zone.longitude,
-                    'resp_cases': health_stats.respiratory_cases_active,
-                    'aqi': weather.air_quality_index,
-                    'pollutant_details': weather.pollutant_details,
-                    'temperature': weather.temperature_c,
-                    'distance_km': round(dist, 2)
-                })
-        
-        # Sort by distance if location provided
-        if lat and long:
-            data.sort(key=lambda x: x['distance_km'])
-            
-        return Response(data)
+                features = [
+                    {**f, "properties": {**f["properties"], 'distance_km': d}}
+                    for f, d in zip(features, distances)
+                ]
+            return Response({"type": "FeatureCollection", "features": features})
+
+        return Response([{**f["properties"], 'distance_km': d} for f, d in zip(features, distances)])
+
+    @action(detail=False, methods=['get'])
+    def aqi_correlation(self, request):
+        """
+        Lagged correlation between AQI and respiratory cases per zone (AQI leading by 0-14 days).
+        ?days=90 (19-365) window of complete days; ?max_lag=14; ?zone=<id> for a single zone.
+        """
+        from .services.correlation_service import LagCorrelationService
+
+        try:
+            result = LagCorrelationService.correlate(
+                request.query_params.get('days', LagCorrelationService.DEFAULT_DAYS),
+                request.query_params.get('max_lag', LagCorrelationService.MAX_LAG),
+                request.query_params.get('zone'),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(result)
+
+    @action(detail=False, methods=['get'], url_path=r'tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)')
+    def tiles(self, request, z=None, x=None, y=None):
+        """
+        Heat-map PNG tile (z/x/y, Web Mercator) for the health map.
+        ?layer=aqi (default, zones + CPCB stations) or ?layer=resp_cases
+        """
+        from .services.tile_service import HeatmapTiles
+
+        try:
+            png = HeatmapTiles.get_tile(request.query_params.get('layer', 'aqi'), int(z), int(x), int(y))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        response = HttpResponse(png, content_type='image/png')
+        response['Cache-Control'] = 'max-age=60'
+        return response
 
     @action(detail=False, methods=['get'])
     def health_deserts(self, request):
-        """Feature B: Health Desert Identifier (Low Income + Poor AQI + No Fresh Food)"""
-        deserts = []
-        zones = CityZone.objects.filter(average_income_tier='Low')
-        
-        for zone in zones:
-            weather = WeatherLog.objects.filter(zone=zone).last()
-            # Simple check: If no supply in last X days (mocked as count=0 for MVP)
-            has_supply = AgriSupply.objects.filter(origin_zone=zone).exists() # Note: Origin isn't destination, but simplified for MVP or assumes local market
-            
-            # Logic: Low Income (Filtered) + AQI > 150 (Poor) + No Supply
-            if weather and weather.air_quality_index > 100: # Threshold for 'Poor'
-                 # Note: Real logic finds supply DESTINED for zone, but we lack 'destination' in AgriSupply.
-                 # Assuming for MVP 'origin_zone' implies local availability or we check simple supply chain gap.
-                 # Let's assume we flag if NO farmer is logging from this zone (zero production/market activity)
-                 if not has_supply: 
-                     deserts.append(CityZoneSerializer(zone).data)
-        
-        return Response(deserts)
+        """
+        Feature B: Health Desert Identifier (Low Income + Poor AQI + No Fresh Food or Hospital nearby)
+        Tunable: ?income=Low,Medium &aqi_threshold=100 &max_hospital_km=5 &food_radius_km=5 &min_food_kg=1
+        Returns flagged zones, worst first, with desert_score and factors; ?all=true lists every zone.
+        """
+        from .services.health_desert_service import HealthDesertService
+
+        # AgriSupply has no destination, so supply logged from nearby zones stands in for local food access
+        try:
+            zones = HealthDesertService.evaluate(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        if request.query_params.get('all') != 'true':
+            zones = [z for z in zones if z['is_desert']]
+        return Response(zones)
 
 # --- Tab 3: Farmer View ---
 class FarmerViewSet(viewsets.ModelViewSet):
@@ -276,14 +598,86 @@ from .services.aqi_service import AQIService
 
 @api_view(['GET'])
 def get_stations_api(request):
-    """Proxy CPCB data from AQIService"""
-    # Optional: trigger refresh
+    """
+    Proxy CPCB data from AQIService.
+    Filters: ?bbox=min_lat,min_lon,max_lat,max_lon, ?lat=&long=&radius= (km, nearest first),
+    ?min_aqi=&max_aqi=, ?state=, ?city=. With ?limit= (and ?cursor= for later pages) the
+    response is {"count", "next_cursor", "stations"} instead of a plain list.
+    ?since=<version> polls for changes: {"version", "full", "added", "changed", "removed" (keys)},
+    or the whole list with full=true when that version is too old.
+    """
+    from .services.station_index import StationIndex
+
+    # Optional: ask for an early background refresh (throttled, the current snapshot is served meanwhile)
     if 'refresh' in request.query_params:
-        AQIService.fetch_live_data()
-    
-    stations = AQIService.get_stations()
+        AQIService.request_refresh()
+
+    if request.query_params.get('since'):
+        try:
+            return Response(AQIService.changes_since(request.query_params['since']))
+        except ValueError:
+            return Response({"error": "since must be a version number"}, status=400)
+
+    if not any(request.query_params.get(k) for k in ('bbox', 'radius', 'min_aqi', 'max_aqi', 'state', 'city', 'limit', 'cursor')):
+        return Response(AQIService.get_stations())
+    try:
+        stations, total, next_cursor = StationIndex.query(request.query_params)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    if request.query_params.get('limit'):
+        return Response({"count": total, "next_cursor": next_cursor, "stations": stations})
     return Response(stations)
 
+def _aqi_points(lat, lon):
+    """(snapshot version, point dicts); the version is the one of the grid actually read."""
+    from .services.aqi_engine import AQIEngine
+    from .services.aqi_grid import AQIGrid
+
+    grid = AQIGrid.grid()
+    aqi, source = AQIGrid.at(lat, lon, grid)
+    return grid["version"], [{
+        "lat": float(a),
+        "lon": float(b),
+        "aqi": None if v != v else round(float(v), 1),
+        "category": AQIEngine.category(float(v)),
+        "source": src,
+    } for a, b, v, src in zip(lat, lon, aqi, source)]
+
+@api_view(['GET'])
+def aqi_at_api(request):
+    """Interpolated AQI at a point: ?lat=&lon= (from the current station snapshot)."""
+    try:
+        lat, lon = float(request.query_params['lat']), float(request.query_params['lon'])
+    except KeyError:
+        return Response({"error": "lat and lon are required"}, status=400)
+    except ValueError:
+        return Response({"error": "lat and lon must be numbers"}, status=400)
+    try:
+        version, (point,) = _aqi_points([lat], [lon])
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response({**point, "version": version})
+
+@api_view(['POST'])
+def aqi_at_batch_api(request):
+    """Interpolated AQI at many points. Body: {"points": [{"lat": 28.6, "lon": 77.2}, ...]}"""
+    from .services.aqi_grid import AQIGrid
+
+    if not isinstance(request.data, dict):
+        return Response({"error": "body must be a JSON object with a points list"}, status=400)
+    points = request.data.get('points')
+    if not isinstance(points, list) or not points:
+        return Response({"error": "points must be a non-empty list"}, status=400)
+    if len(points) > AQIGrid.MAX_POINTS:
+        return Response({"error": f"at most {AQIGrid.MAX_POINTS} points per request"}, status=400)
+    try:
+        lat = [float(p['lat']) for p in points]
+        lon = [float(p['lon']) for p in points]
+        version, results = _aqi_points(lat, lon)
+    except (KeyError, TypeError, ValueError):
+        return Response({"error": "each point needs numeric lat and lon within range"}, status=400)
+    return Response({"version": version, "points": results})
+
 @api_view(['GET'])
 def get_simulated_weather(request):
     """
@@ -416,9 +810,12 @@ def get_traffic_data(request):
                 (1 - current_speed / free_flow_speed) * 100, 2
             )
 
-            # Store in database
+            # Store in database, tagged with its zone so RoadNetwork reweights by it
             try:
+                from .services.road_network import RoadNetwork
+
                 RealTimeTraffic.objects.create(
+                    zone_id=RoadNetwork.zone_for_point(float(lat), float(lon)),
                     latitude=float(lat),
                     longitude=float(lon),
                     current_speed=current_speed,
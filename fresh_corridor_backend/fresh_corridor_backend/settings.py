@@ -87,6 +87,44 @@ DATABASES = {
 }
 
 
+# Caches
+# 'default' is per-process memory for hot results; 'shared' is seen by every worker and
+# management command (e.g. the data versions that invalidate cached simulations).
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache' / 'shared',
+        # Holds a data-version token per zone plus a few global scopes (see ScenarioCache).
+        # The default limit (300) culls a random third of the entries, so keep it well
+        # above the number of zones; state that must survive goes in ServiceState instead.
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+
+# Road network (OSM extract converted to JSON, see core/services/road_network.py).
+# When unset, ambulance response times fall back to the flat 15-minute baseline.
+ROAD_GRAPH_PATH = os.getenv('ROAD_GRAPH_PATH')
+# Travel-time matrix published by `manage.py refresh_road_times --loop` (web workers only read it)
+ROAD_MATRIX_PATH = BASE_DIR / '.cache' / 'road_times.npz'
+
+# Flood raster directory (grid.json + elevation.npy + drainage.npy, see core/services/flood_model.py).
+# When unset, flood risk falls back to the rain-intensity threshold rule.
+FLOOD_GRID_DIR = os.getenv('FLOOD_GRID_DIR')
+# Terrain factor derived from the flood raster (the grid directory itself may be read-only)
+FLOOD_CACHE_DIR = BASE_DIR / '.cache' / 'flood'
+
+# Rendered health-map heat tiles (LRU-capped, see core/services/tile_service.py)
+TILE_CACHE_DIR = BASE_DIR / '.cache' / 'tiles'
+
+# Last CPCB station snapshot, loaded on worker start (see core/services/aqi_service.py)
+AQI_SNAPSHOT_PATH = BASE_DIR / '.cache' / 'aqi_stations.json.gz'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -5,7 +5,7 @@ from core.views import (
     PlannerViewSet, HealthViewSet, FarmerViewSet, CitizenViewSet, 
     dashboard, get_stations_api, traffic_monitor, get_traffic_data,
     auth_login, auth_signup, login_index, login_role, get_user_profile,
-    get_simulated_weather
+    get_simulated_weather, aqi_at_api, aqi_at_batch_api
 )
 
 router = DefaultRouter()
@@ -18,6 +18,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include(router.urls)),
     path('api/get_stations', get_stations_api, name='get_stations'),
+    path('api/aqi/at', aqi_at_api, name='aqi_at'),
+    path('api/aqi/at/batch', aqi_at_batch_api, name='aqi_at_batch'),
     path('api/traffic/', get_traffic_data, name='get_traffic_data'),
     path('api/weather/', get_simulated_weather, name='get_simulated_weather'),
     path('api/auth/login/', auth_login, name='auth_login'),